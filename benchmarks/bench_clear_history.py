@@ -0,0 +1,154 @@
+"""
+比較 /clear 收集待刪訊息時需要拉取的歷史頁數。
+
+以假的頻道模擬 discord.py 的 channel.history 分頁行為 (每頁最多 100 則、before/after 以 snowflake 界定)，
+並計算每種情境拉取的頁數與傳回的訊息數:
+- 舊版: 從最新訊息往下固定拉取 limit=1000 則，逐則比對直到遇到目標訊息，再過濾使用者
+- 新版: utils.Purger.collect_messages，以 after=目標訊息 / before=指令 為範圍，過濾後數量足夠即停止
+
+使用方式 (於專案根目錄執行):
+    python benchmarks/bench_clear_history.py
+    python benchmarks/bench_clear_history.py --messages 50000 --users 40 --page-latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import AsyncIterator, List, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from utils.Purger import collect_messages
+
+PAGE_SIZE = 100
+
+
+class FakeAuthor:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, author_id: int):
+        self.id = message_id
+        self.author = FakeAuthor(author_id)
+
+
+class FakeChannel:
+    """依照 discord.py 在 oldest_first=False 時的 before 分頁策略產生訊息，並計算 API 呼叫次數"""
+
+    def __init__(self, messages: List[FakeMessage], page_latency: float):
+        # 由新到舊
+        self.messages = sorted(messages, key=lambda m: m.id, reverse=True)
+        self.page_latency = page_latency
+        self.pages = 0
+        self.transferred = 0
+
+    async def _page(self, before: Optional[int], retrieve: int) -> List[FakeMessage]:
+        self.pages += 1
+        if self.page_latency:
+            await asyncio.sleep(self.page_latency)
+        data = [m for m in self.messages if before is None or m.id < before][:retrieve]
+        self.transferred += len(data)
+        return data
+
+    async def history(
+        self,
+        *,
+        limit: Optional[int] = 100,
+        before: Optional[discord.abc.Snowflake] = None,
+        after: Optional[discord.abc.Snowflake] = None,
+        oldest_first: Optional[bool] = None,
+    ) -> AsyncIterator[FakeMessage]:
+        cursor = before.id if before else None
+        while True:
+            retrieve = PAGE_SIZE if limit is None else min(limit, PAGE_SIZE)
+            if retrieve < 1:
+                return
+            data = await self._page(cursor, retrieve)
+            if data:
+                if limit is not None:
+                    limit -= len(data)
+                cursor = data[-1].id
+            if after is not None:
+                data = [m for m in data if m.id > after.id]
+            for msg in data:
+                yield msg
+            if len(data) < PAGE_SIZE:
+                return
+
+
+async def legacy_collect(channel: FakeChannel, to_message: FakeMessage, users: Set[int]) -> List[FakeMessage]:
+    """舊版 ID 模式的收集方式"""
+    messages = []
+    async for msg in channel.history(limit=1000):
+        if msg.id == to_message.id:
+            if not users or msg.author.id in users:
+                messages.append(msg)
+            break
+        if not users or msg.author.id in users:
+            messages.append(msg)
+    return messages
+
+
+async def new_collect(
+    channel: FakeChannel, to_message: FakeMessage, users: Set[int], amount: int, command: discord.Object
+) -> List[FakeMessage]:
+    """新版 ID 模式的收集方式 (與 cogs/clear.py 相同)"""
+    messages, exhausted = await collect_messages(channel, limit=amount, users=users, after=to_message, before=command)
+    if exhausted and (not users or to_message.author.id in users):
+        messages.append(to_message)
+    return messages
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="頻道中的訊息數量")
+    parser.add_argument("--users", type=int, default=20, help="發言的使用者數量")
+    parser.add_argument("--new-after", type=int, default=200, help="執行指令時 (確認刪除前) 新增的訊息數量")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="每次拉取頁面模擬的延遲 (秒)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base = discord.utils.time_snowflake(discord.utils.utcnow()) - args.messages * 2
+    all_messages = [
+        FakeMessage(base + i * 2, 1000 + rng.randrange(args.users)) for i in range(args.messages + args.new_after)
+    ]
+    # 指令執行時的 snowflake，之後的訊息是等待確認期間才送出的
+    command = discord.Object(id=all_messages[args.messages - 1].id + 1)
+    newest = args.messages - 1
+    user = {1000}
+
+    scenarios = [
+        # (名稱, 目標訊息距離最新訊息的則數, 使用者過濾, 數量)
+        ("最近 150 則", 150, set(), 1000),
+        ("最近 950 則", 950, set(), 1000),
+        ("950 則內單一使用者的 20 則", 950, user, 20),
+        ("5000 則內單一使用者", 5000, user, 1000),
+    ]
+
+    print(f"{'情境':<24} {'版本':<4} {'頁數':>6} {'傳輸訊息':>10} {'收集':>6} {'耗時 ms':>9}")
+    for name, depth, users, amount in scenarios:
+        to_message = all_messages[newest - depth]
+        for label, func in (
+            ("舊版", lambda ch: legacy_collect(ch, to_message, users)),
+            ("新版", lambda ch: new_collect(ch, to_message, users, amount, command)),
+        ):
+            channel = FakeChannel(all_messages, args.page_latency)
+            start = time.perf_counter()
+            collected = await func(channel)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(
+                f"{name:<24} {label:<4} {channel.pages:>6} {channel.transferred:>10,} "
+                f"{len(collected):>6} {elapsed:>9.1f}"
+            )
+    print("※ 舊版從最新訊息開始拉取，會把指令之後才送出的訊息一併收進去；目標超過 1000 則時也無法到達目標訊息")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+比較讀取池大小對查詢延遲的影響。
+
+每個讀取池大小各自使用一個全新的暫存資料庫，先寫入 punishments 與 anti_dive 資料，
+再同時執行:
+- 寫入端: 持續以 add_voice_event 寫入語音事件 (經由寫入緩衝整批提交)
+- 讀取端: 數個並行工作反覆呼叫 list_punishments(limit=None) 與 get_inactive_users
+
+讀取池大小為 0 時所有查詢都與寫入共用同一條連線，會排在批次寫入之後；
+大於 0 時查詢改走唯讀連線，在 WAL 模式下不會被寫入阻擋。
+
+使用方式 (於專案根目錄執行):
+    python benchmarks/bench_reader_pool.py
+    python benchmarks/bench_reader_pool.py --pool-sizes 0 2 4 --readers 8 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.DBEngine import DBEngine
+from utils.DBManager import DBManager
+from utils.SQLiteProfile import PROFILES
+
+
+async def _populate(db: DBManager, punishments: int, members: int) -> None:
+    await db.engine.init_schema()
+    now = int(time.time())
+    for i in range(punishments):
+        await db.add_punishment(
+            guild_id=1,
+            user_id=1000 + i % 500,
+            punished_at=now - i,
+            ptype="warn" if i % 3 else "mute",
+            reason="benchmark",
+            admin_id=42,
+        )
+    await db.flush()
+    await db.update_user_activity_bulk(
+        [(1, 1000 + i, now - (i % 90) * 86400, now - (i % 60) * 86400) for i in range(members)]
+    )
+
+
+async def _writer(db: DBManager, stop: asyncio.Event) -> int:
+    count = 0
+    while not stop.is_set():
+        for _ in range(50):
+            await db.add_voice_event(
+                guild_id=1,
+                user_id=1000 + count % 500,
+                channel_id=2000 + count % 5,
+                channel_name="語音頻道",
+                timestamp=int(time.time()),
+                event_type="join" if count % 2 else "leave",
+            )
+            count += 1
+        await asyncio.sleep(0.001)
+    return count
+
+
+async def _reader(db: DBManager, stop: asyncio.Event, latencies: List[float], index: int) -> None:
+    now = int(time.time())
+    while not stop.is_set():
+        start = time.perf_counter()
+        if index % 2:
+            await db.list_punishments(guild_id=1, limit=None)
+        else:
+            await db.get_inactive_users(
+                guild_id=1, message_threshold=now - 30 * 86400, voice_threshold=now - 30 * 86400
+            )
+        latencies.append(time.perf_counter() - start)
+
+
+async def bench(path: str, pool_size: int, args: argparse.Namespace) -> None:
+    engine = DBEngine(path, profile=PROFILES[args.profile], read_pool_size=pool_size)
+    db = DBManager(engine, flush_interval=0.05)
+    await _populate(db, args.punishments, args.members)
+
+    stop = asyncio.Event()
+    latencies: List[float] = []
+    writer = asyncio.create_task(_writer(db, stop))
+    readers = [asyncio.create_task(_reader(db, stop, latencies, i)) for i in range(args.readers)]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    written = await writer
+    await asyncio.gather(*readers)
+    await db.flush()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(
+        f"{pool_size:>6} {len(latencies) / args.duration:>10.1f} {p50:>9.2f} {p95:>9.2f} "
+        f"{written / args.duration:>12.0f}"
+    )
+    print(f"       讀取池統計: {engine.get_pool_stats()}")
+    await engine.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pool-sizes", nargs="+", type=int, default=[0, 2, 4], help="要比較的讀取池大小")
+    parser.add_argument("--readers", type=int, default=4, help="並行讀取工作數量")
+    parser.add_argument("--duration", type=float, default=5.0, help="每項測試的秒數")
+    parser.add_argument("--punishments", type=int, default=20000, help="預先寫入的懲處紀錄筆數")
+    parser.add_argument("--members", type=int, default=5000, help="預先寫入的活躍紀錄筆數")
+    parser.add_argument("--profile", default="balanced", choices=[k for k, v in PROFILES.items() if v.journal_mode == "wal"])
+    parser.add_argument("--dir", default=None, help="暫存資料庫所在目錄 (預設為系統暫存目錄)")
+    args = parser.parse_args()
+
+    print(f"並行讀取: {args.readers}，每項 {args.duration:.0f} 秒，profile: {args.profile}")
+    print(f"{'pool':>6} {'queries/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'寫入 rows/s':>12}")
+    for size in args.pool_sizes:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            await bench(os.path.join(tmp, "bench.db"), size, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+比較不同 SQLite 連線設定下 voice_logs 的寫入吞吐量。
+
+每個設定各自使用一個全新的暫存資料庫，分別測試:
+- 逐筆提交: 每筆 INSERT 後立即 commit (舊版 add_voice_event 的行為)
+- 批次寫入: 透過 DBManager 的寫入緩衝，以 executemany 整批提交
+
+使用方式 (於專案根目錄執行):
+    python benchmarks/bench_sqlite_profiles.py --rows 5000
+    python benchmarks/bench_sqlite_profiles.py --profiles balanced fast --rows 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+
+from utils.DBEngine import DBEngine
+from utils.DBManager import DBManager, _INSERT_SQL
+from utils.SQLiteProfile import PROFILES
+
+
+def _rows(count: int):
+    for i in range(count):
+        yield (1, 1000 + i % 50, 2000 + i % 5, "語音頻道", 1_700_000_000 + i, "self_mute" if i % 2 else "self_unmute")
+
+
+async def bench_per_row_commit(path: str, profile_name: str, count: int) -> float:
+    engine = DBEngine(path, profile=PROFILES[profile_name])
+    DBManager(engine)
+    await engine.init_schema()
+    await engine.close()
+
+    conn = await aiosqlite.connect(path)
+    await PROFILES[profile_name].apply(conn)
+    start = time.perf_counter()
+    for row in _rows(count):
+        await conn.execute(_INSERT_SQL["voice_logs"], row)
+        await conn.commit()
+    elapsed = time.perf_counter() - start
+    await conn.close()
+    return elapsed
+
+
+async def bench_write_behind(path: str, profile_name: str, count: int, batch_size: int) -> float:
+    engine = DBEngine(path, profile=PROFILES[profile_name])
+    db = DBManager(engine, batch_size=batch_size, flush_interval=0.05)
+    await engine.init_schema()
+    start = time.perf_counter()
+    for guild_id, user_id, channel_id, channel_name, ts, event_type in _rows(count):
+        await db.add_voice_event(
+            guild_id=guild_id,
+            user_id=user_id,
+            channel_id=channel_id,
+            channel_name=channel_name,
+            timestamp=ts,
+            event_type=event_type,
+        )
+        # 模擬事件處理之間會讓出事件迴圈
+        await asyncio.sleep(0)
+    await db.flush()
+    elapsed = time.perf_counter() - start
+    await engine.close()
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="每項測試寫入的筆數")
+    parser.add_argument("--batch-size", type=int, default=200, help="批次寫入的批次大小")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--dir", default=None, help="暫存資料庫所在目錄 (預設為系統暫存目錄)")
+    args = parser.parse_args()
+
+    print(f"寫入筆數: {args.rows}，批次大小: {args.batch_size}")
+    print(f"{'profile':<10} {'逐筆提交 rows/s':>16} {'批次寫入 rows/s':>16}")
+    for name in args.profiles:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            per_row = await bench_per_row_commit(os.path.join(tmp, "per_row.db"), name, args.rows)
+            batched = await bench_write_behind(os.path.join(tmp, "batched.db"), name, args.rows, args.batch_size)
+        print(f"{name:<10} {args.rows / per_row:>16.0f} {args.rows / batched:>16.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
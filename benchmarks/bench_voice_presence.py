@@ -0,0 +1,153 @@
+"""
+測試「某時間點誰在語音中」與「某用戶在某區間是否在語音中」的查詢延遲。
+
+以 join/leave 事件數量為規模 (每段停留紀錄對應兩筆事件)，直接產生 voice_sessions
+(R*Tree 由觸發器同步建立)，再比較:
+- R*Tree: DBManager.get_voice_presence_at (區間索引)
+- B-tree 掃描: 只靠 voice_sessions 的索引，以 start_time <= T AND end_time > T 過濾
+- 用戶區間: DBManager.get_user_voice_sessions_between
+
+使用方式 (於專案根目錄執行):
+    python benchmarks/bench_voice_presence.py                     # 預設 1000 萬筆事件
+    python benchmarks/bench_voice_presence.py --events 200000 --queries 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.DBEngine import DBEngine
+from utils.DBManager import DBManager
+from utils.SQLiteProfile import PROFILES
+
+GUILD_ID = 1
+START = 1_700_000_000
+
+
+def _generate(path: str, events: int, users: int, channels: int, span_days: int, seed: int) -> int:
+    """產生 events / 2 段停留紀錄並寫入 voice_sessions，回傳最後一段紀錄的時間。"""
+    rng = random.Random(seed)
+    sessions = events // 2
+    per_user = max(1, sessions // users)
+    span = span_days * 86400
+    # 平均每段停留 + 間隔的長度，讓所有紀錄大致分布在 span 內
+    slot = span / per_user
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    sql = (
+        "INSERT INTO voice_sessions (guild_id, user_id, channel_id, start_time, end_time, duration) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    batch: List[tuple] = []
+    written = 0
+    last = START
+    for user in range(users):
+        t = START + rng.randrange(int(slot))
+        for i in range(per_user):
+            if written >= sessions:
+                break
+            duration = int(rng.expovariate(1 / (slot * 0.3))) + 1
+            start = t
+            t += duration
+            user_id = 10_000 + user
+            if i == per_user - 1 and rng.random() < 0.05:
+                # 少數用戶仍在語音中
+                batch.append((GUILD_ID, user_id, rng.randrange(channels), start, None, None))
+            else:
+                batch.append((GUILD_ID, user_id, rng.randrange(channels), start, t, duration))
+            t += int(rng.expovariate(1 / (slot * 0.7))) + 1
+            written += 1
+            last = max(last, t)
+            if len(batch) >= 100_000:
+                conn.executemany(sql, batch)
+                conn.commit()
+                batch.clear()
+                print(f"\r  已寫入 {written:,} / {sessions:,} 段紀錄", end="", flush=True)
+    if batch:
+        conn.executemany(sql, batch)
+        conn.commit()
+    print(f"\r  已寫入 {written:,} / {sessions:,} 段紀錄")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return last
+
+
+async def _measure(name: str, queries: List[int], func: Callable[[int], Awaitable[int]]) -> None:
+    latencies = []
+    total_rows = 0
+    for ts in queries:
+        start = time.perf_counter()
+        total_rows += await func(ts)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:<14} {p50:>9.2f} {p95:>9.2f} {total_rows / len(queries):>10.1f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000_000, help="語音事件數量 (join + leave)")
+    parser.add_argument("--users", type=int, default=5000, help="用戶數量")
+    parser.add_argument("--channels", type=int, default=30, help="語音頻道數量")
+    parser.add_argument("--span-days", type=int, default=365, help="資料涵蓋的天數")
+    parser.add_argument("--queries", type=int, default=500, help="每種查詢執行的次數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dir", default=None, help="暫存資料庫所在目錄 (預設為系統暫存目錄)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = DBEngine(path, profile=PROFILES["balanced"])
+        db = DBManager(engine)
+        await engine.init_schema()
+        await engine.close()
+
+        print(f"產生 {args.events:,} 筆事件 ({args.events // 2:,} 段停留紀錄)...")
+        start = time.perf_counter()
+        last = _generate(path, args.events, args.users, args.channels, args.span_days, args.seed)
+        print(f"  耗時 {time.perf_counter() - start:.1f} 秒，資料庫大小 {os.path.getsize(path) / 1024 / 1024:.0f} MiB")
+
+        engine = DBEngine(path, profile=PROFILES["balanced"])
+        db = DBManager(engine)
+        rng = random.Random(args.seed + 1)
+        points = [rng.randrange(START, last) for _ in range(args.queries)]
+
+        async def rtree(ts: int) -> int:
+            return len(await db.get_voice_presence_at(guild_id=GUILD_ID, timestamp=ts))
+
+        async def btree(ts: int) -> int:
+            async with engine.reader() as conn:
+                cursor = await conn.execute(
+                    "SELECT user_id, channel_id FROM voice_sessions "
+                    "WHERE guild_id = ? AND start_time <= ? AND (end_time > ? OR end_time IS NULL)",
+                    (GUILD_ID, ts, ts),
+                )
+                return len(await cursor.fetchall())
+
+        async def user_window(ts: int) -> int:
+            user_id = 10_000 + rng.randrange(args.users)
+            rows = await db.get_user_voice_sessions_between(
+                guild_id=GUILD_ID, user_id=user_id, start_ts=ts, end_ts=ts + 7 * 86400
+            )
+            return len(rows)
+
+        print(f"{'查詢':<14} {'p50 ms':>9} {'p95 ms':>9} {'平均筆數':>10}")
+        await _measure("R*Tree", points, rtree)
+        await _measure("B-tree 掃描", points[: max(1, args.queries // 10)], btree)
+        await _measure("用戶 7 天區間", points, user_window)
+        await engine.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -13,7 +13,17 @@ except Exception:
 import discord
 from discord.ext import commands
 
+from utils.DBEngine import DBEngine
 from utils.DBManager import DBManager
+from utils.Instrumentation import Instrumentation
+from utils.LoopMonitor import LoopMonitor
+from utils.MessageStore import MessageStore
+from utils.MetricsServer import MetricsServer
+from utils.OutboundScheduler import OutboundScheduler
+from utils.WebhookDelivery import WebhookDelivery
+from utils.SettingsCache import SettingsCache
+from utils.SQLiteProfile import load_profile
+from utils.Temp_vioce_database import TempVoiceDatabase
 
 with open("config.json", "r", encoding="utf-8") as fp:
     cfg = json.load(fp)
@@ -27,9 +37,119 @@ class Bot(commands.Bot):
         super().__init__(
             command_prefix=cfg["prefix"], intents=intents, help_command=None
         )
-        self.db_manager = DBManager(os.getenv("database", "bot.db"))
+        # 事件處理器、指令、資料庫查詢與日誌發送的延遲量測 (停用時不包裝任何函式)
+        self.instrumentation = Instrumentation(enabled=cfg.get("instrumentation", {}).get("enabled", True))
+        # 事件迴圈延遲監控，阻塞超過門檻時記錄當下執行的程式位置 (於 setup_hook 啟動)
+        monitor_cfg = cfg.get("loop_monitor", {})
+        self.loop_monitor = LoopMonitor(
+            interval=monitor_cfg.get("interval", 0.25),
+            threshold=monitor_cfg.get("threshold", 0.5),
+            watchdog=monitor_cfg.get("watchdog", True),
+        )
+        # SQLite 連線調校設定 (config.json 的 sqlite 區塊或 SQLITE_* 環境變數)
+        self.sqlite_profile = load_profile(cfg)
+        log.info(f"使用 SQLite 設定: {self.sqlite_profile}")
+        sqlite_cfg = cfg.get("sqlite", {})
+        # 其他資料庫檔案以 ATTACH 掛載為獨立 schema，未設定則所有資料表都放在主資料庫
+        attach = dict(sqlite_cfg.get("attach", {}))
+        if "tempvoice" in attach:
+            attach["tempvoice"] = os.getenv("VOICEDATABASE", attach["tempvoice"])
+        self.db_engine = DBEngine(
+            os.getenv("database", "bot.db"),
+            profile=self.sqlite_profile,
+            # 唯讀連線池大小，0 代表所有讀取都走寫入連線
+            read_pool_size=sqlite_cfg.get("read_pool_size", 2),
+            attach=attach,
+        )
+        writer_cfg = cfg.get("db_writer", {})
+        self.db_manager = DBManager(
+            self.db_engine,
+            batch_size=writer_cfg.get("batch_size", 200),
+            flush_interval=writer_cfg.get("flush_interval", 1.0),
+            activity_flush_interval=writer_cfg.get("activity_flush_interval", 30.0),
+            max_pending=writer_cfg.get("max_pending", 50000),
+            max_retries=writer_cfg.get("max_retries", 3),
+            timezone=cfg["timezone"],
+        )
+        self.temp_voice_db = TempVoiceDatabase(self.db_engine)
+        if self.instrumentation.enabled:
+            self.instrumentation.instrument(self.db_manager)
+            self.instrumentation.instrument(self.temp_voice_db)
+        self.settings_cache = SettingsCache(self)
+        # 訊息刪除/編輯日誌使用的訊息內容快取 (依頻道的環狀緩衝區)
+        store_cfg = cfg.get("message_store", {})
+        self.message_store = MessageStore(
+            max_per_channel=store_cfg.get("max_per_channel", 200),
+            max_channels=store_cfg.get("max_channels", 500),
+            max_bytes=store_cfg.get("max_bytes", 32 * 1024 * 1024),
+            compress_threshold=store_cfg.get("compress_threshold", 256),
+        )
+        # 日誌訊息的集中發送排程 (依頻道排隊、控制速率，管理通知優先)
+        outbound_cfg = cfg.get("outbound", {})
+        # 啟用時日誌經由各日誌頻道的 webhook 發送，沒有權限的頻道自動改用一般訊息
+        webhook_cfg = outbound_cfg.get("webhook", {})
+        delivery = (
+            WebhookDelivery(
+                self,
+                name=webhook_cfg.get("name", "日誌"),
+                retry_after=webhook_cfg.get("retry_after", 600.0),
+                pool_size=webhook_cfg.get("pool_size", 10),
+            )
+            if webhook_cfg.get("enabled", False)
+            else None
+        )
+        self.outbound = OutboundScheduler(
+            max_per_channel=outbound_cfg.get("max_per_channel", 200),
+            max_total=outbound_cfg.get("max_total", 5000),
+            drop_policy=outbound_cfg.get("drop_policy", "drop_oldest"),
+            merge=outbound_cfg.get("merge", True),
+            rate=outbound_cfg.get("rate", 5),
+            per=outbound_cfg.get("per", 5.0),
+            delivery=delivery,
+            instrumentation=self.instrumentation,
+        )
+        # 本機的 /healthz 與 /metrics 監控端點，於 setup_hook 啟動
+        self.metrics_server = None
+
+    def add_listener(self, func, name=discord.utils.MISSING) -> None:
+        # 擴充的事件處理器經由此處註冊，啟用量測時包裝成記錄耗時的版本
+        if self.instrumentation.enabled:
+            name = func.__name__ if name is discord.utils.MISSING else name
+            func = self.instrumentation.wrap_listener(func)
+        super().add_listener(func, name)
+
+    def remove_listener(self, func, name=discord.utils.MISSING) -> None:
+        name = func.__name__ if name is discord.utils.MISSING else name
+        super().remove_listener(self.instrumentation.unwrap_listener(func), name)
+
+    def dispatch(self, event_name: str, /, *args, **kwargs) -> None:
+        if self.metrics_server is not None:
+            self.metrics_server.count_event(event_name, args)
+        super().dispatch(event_name, *args, **kwargs)
 
     async def setup_hook(self) -> None:
+        # 開始量測事件迴圈延遲 (擴充載入、同步指令期間的阻塞也會記錄)
+        self.loop_monitor.start()
+
+        # 初始化資料庫 (各資料層的資料表在建立時已向引擎註冊)，擴充載入時即可使用
+        await self.db_engine.init_schema()
+
+        # 啟動監控端點 (埠被占用等錯誤不影響機器人運作)
+        metrics_cfg = cfg.get("metrics_server", {})
+        if metrics_cfg.get("enabled", False):
+            server = MetricsServer(
+                self,
+                host=metrics_cfg.get("host", "127.0.0.1"),
+                port=metrics_cfg.get("port", 9100),
+                max_lag=metrics_cfg.get("max_lag", 1.0),
+                max_pending_age=metrics_cfg.get("max_pending_age", 60.0),
+            )
+            try:
+                await server.start()
+                self.metrics_server = server
+            except Exception:
+                log.exception("啟動監控端點時發生錯誤")
+
         # 清掉垃圾(已刪除或不需要的命令)
         # self.tree.clear_commands(guild=guild)
         # 載入擴充
@@ -43,16 +163,6 @@ class Bot(commands.Bot):
         log.info("載入擴充完畢")
         log.info(f"已載入 {len(self.cogs)} 個擴充")
 
-        # 初始化資料庫
-        try:
-            await self.db_manager.init_db()
-        except Exception as _:
-            log.exception("初始化一般資料庫時發生錯誤")
-        try:
-            await self.db_manager.init_voice_db()
-        except Exception as _:
-            log.exception("初始化語音資料庫時發生錯誤")
-        
         # 初始化臨時語音頻道系統
         if "temp_voice" in self.cogs:
             try:
@@ -75,6 +185,32 @@ class Bot(commands.Bot):
     async def on_ready(self) -> None:
         log.info(f"登入為 {self.user} ({self.user.id})")
 
+    async def close(self) -> None:
+        # 先卸載擴充 (各擴充在 cog_unload 中送出暫存的日誌)，再送出佇列中的日誌訊息，
+        # 然後中斷與 Discord 的連線，最後把資料庫寫入緩衝寫完並關閉連線。
+        # commands.Bot.close 也會卸載擴充，但那時才關閉發送排程，卸載時送出的日誌會被丟棄。
+        for extension in tuple(self.extensions):
+            try:
+                await self.unload_extension(extension)
+            except Exception:
+                log.exception(f"卸載擴充 {extension} 時發生錯誤")
+        for cog in tuple(self.cogs):
+            try:
+                await self.remove_cog(cog)
+            except Exception:
+                log.exception(f"移除 {cog} 時發生錯誤")
+        await self.outbound.close()
+        await super().close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        self.loop_monitor.stop()
+        try:
+            await self.db_engine.close()
+            log.info("資料庫已關閉")
+        except Exception:
+            log.exception("關閉資料庫時發生錯誤")
+
 
 async def main() -> None:
     discord.utils.setup_logging()
@@ -1,14 +1,16 @@
 import json
 import logging
-from typing import Optional, Any, List
+from typing import Optional, Any, AsyncIterator, List
 
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 
+from utils.OutboundScheduler import Priority
 from utils.time_utils import now_with_unix
 from zoneinfo import ZoneInfo
 from datetime import datetime, time
+from time import monotonic
 
 
 log = logging.getLogger(__name__)
@@ -16,6 +18,9 @@ log = logging.getLogger(__name__)
 with open("config.json", "r", encoding="utf-8") as fp:
     cfg = json.load(fp)
 
+# 潛水仔列表最多輸出的 embed 數量 (每則最多 4000 字)，超過的成員只顯示人數
+_MAX_DIVE_CHUNKS = 10
+
 class AntiDive(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -35,7 +40,8 @@ class AntiDive(commands.Cog):
         _ , ts = now_with_unix(self.timezone)
         
         try:
-            await self.db_manager.update_user_activity(
+            # 只更新記憶體，由 DBManager 定期批次寫入
+            self.db_manager.touch_user_activity(
                 guild_id=message.guild.id,
                 user_id=message.author.id,
                 message_time=ts
@@ -53,6 +59,7 @@ class AntiDive(commands.Cog):
             return
         
         try:
+            await self.db_manager.add_member_snapshot(guild_id=member.guild.id, user_id=member.id)
             await self.db_manager.update_user_activity(
                 guild_id=member.guild.id,
                 user_id=member.id,
@@ -80,7 +87,7 @@ class AntiDive(commands.Cog):
         
         if before.channel is None and after.channel is not None:
             try:
-                await self.db_manager.update_user_activity(
+                self.db_manager.touch_user_activity(
                     guild_id=member.guild.id,
                     user_id=member.id,
                     voice_time=ts
@@ -88,6 +95,104 @@ class AntiDive(commands.Cog):
             except Exception as _:
                 log.exception(f"更新用戶活動時發生錯誤")
                 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """同步所有伺服器的成員快照，潛水查詢依此判斷沒有紀錄與已離開的成員"""
+        for guild in self.bot.guilds:
+            await self.sync_member_snapshot(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.sync_member_snapshot(guild)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        if member.bot:
+            return
+        try:
+            await self.db_manager.remove_member_snapshot(guild_id=member.guild.id, user_id=member.id)
+        except Exception as _:
+            log.exception(f"更新成員快照時發生錯誤")
+
+    async def sync_member_snapshot(self, guild: discord.Guild) -> None:
+        try:
+            added, removed = await self.db_manager.sync_member_snapshot(
+                guild_id=guild.id,
+                user_ids=(member.id for member in guild.members if not member.bot),
+            )
+            log.info(f"伺服器 {guild.name} ({guild.id}) 成員快照已同步: 新增 {added} 名，移除 {removed} 名")
+        except Exception as _:
+            log.exception(f"同步伺服器 {guild.name} ({guild.id}) 的成員快照時發生錯誤")
+
+    async def iter_dive_descriptions(
+        self,
+        guild: discord.Guild,
+        threshold: int,
+        *,
+        summary_verb: str,
+        days: int,
+        page_size: int = 500,
+        max_chunks: int = _MAX_DIVE_CHUNKS,
+    ) -> AsyncIterator[str]:
+        """
+        分頁讀取潛水成員並逐段產生 embed 描述，每段不超過 4000 字，讀到一頁就產生已湊滿的段落。
+        資料庫已依最後活動時間排序 (沒有聊天紀錄的在前，其餘最久沒活動的在前)。
+        最多產生 max_chunks 段，其餘成員不再讀取，只在最後一段附上未列出的人數。
+        沒有潛水仔時不產生任何段落。
+        """
+        counts = await self.db_manager.count_dive_members(guild_id=guild.id, threshold=threshold)
+        total = sum(counts.values())
+        if not total:
+            return
+
+        summary = (
+            f"{summary_verb} **{total}** 名用戶（超過 {days} 天未活動）\n"
+            f"🏊‍♂️ 潛水 {counts['inactive']} 名｜📝 沒有聊天紀錄 {counts['never']} 名｜"
+            f"🚪 已離開 {counts['departed']} 名"
+        )
+        current_chunk = summary
+        section = None
+        after = None
+        listed = 0
+        emitted = 0
+        while True:
+            rows = await self.db_manager.list_dive_members(
+                guild_id=guild.id, threshold=threshold, after=after, limit=page_size
+            )
+            if not rows:
+                break
+            after = (rows[-1]["last_activity"], rows[-1]["user_id"])
+            for row in rows:
+                lines = []
+                row_section = "never" if row["last_activity"] <= 1 else "inactive"
+                if row_section != section:
+                    section = row_section
+                    header = "📝 **沒有聊天紀錄**：" if section == "never" else "🏊‍♂️ **潛水用戶**："
+                    lines.extend(["", header])
+
+                user_id = row["user_id"]
+                member = guild.get_member(user_id) if row["status"] != "departed" else None
+                name = f"({member.display_name})" if member else "(已離開伺服器)"
+                if section == "never":
+                    lines.append(f"• <@{user_id}> {name} - 沒有聊天紀錄")
+                else:
+                    lines.append(f"• <@{user_id}> {name} - 最後活動: <t:{row['last_activity']}:R>")
+
+                for line in lines:
+                    if len(current_chunk) + len(line) + 1 > 4000:  # +1 是換行符
+                        if emitted + 1 >= max_chunks:
+                            # 已達段數上限 (description 上限為 4096 字，附註仍放得下)
+                            yield current_chunk + f"\n\n…以及其他 **{total - listed}** 名用戶未列出"
+                            return
+                        yield current_chunk
+                        emitted += 1
+                        current_chunk = line
+                    else:
+                        current_chunk += "\n" + line
+                listed += 1
+        if current_chunk:
+            yield current_chunk
+
     @app_commands.checks.has_permissions(manage_channels=True)
     @app_commands.command(name="check_dive", description="列出所有潛水仔")
     async def check_dive(
@@ -109,118 +214,28 @@ class AntiDive(commands.Cog):
         search_time = ts - time if time else ts - 259200  # 如果沒有指定時間，預設為3天
         
         try:
-            dive_users = await self.db_manager.get_inactive_users(
-                guild_id=interaction.guild.id,
-                message_threshold=search_time,
-                voice_threshold=search_time,
-                require_both=True
-                )
-            
-            if not dive_users:
-                embed.description = "目前沒有潛水仔"
-                await interaction.followup.send(embed=embed, ephemeral=True)
-                return
-
-            else:
-                # 獲取伺服器成員信息，以便顯示用戶名
-                guild = self.bot.get_guild(interaction.guild.id)
-                
-                # 分離沒有聊天紀錄的用戶和真正潛水的用戶
-                no_record_users = []
-                diving_users = []
-                
-                for user in dive_users:
-                    last_message = user["last_message_time"] or 0
-                    last_voice = user["last_voice_time"] or 0
-                    last_activity = max(last_message, last_voice)
-                    
-                    if last_activity == 1:
-                        no_record_users.append(user)
-                    else:
-                        diving_users.append(user)
-                
-                # 建立描述文字
-                description_lines = []
-                
-                # 先顯示真正潛水的用戶（按照最後活動時間排序，最久沒活動的在最上面）
-                if diving_users:
-                    diving_users_sorted = sorted(diving_users, key=lambda user: max(user["last_message_time"] or 0, user["last_voice_time"] or 0))
-                    description_lines.append(f"🏊‍♂️ **潛水用戶** ({len(diving_users)} 名)：\n")
-                    
-                    for user in diving_users_sorted:
-                        user_id = user["user_id"]
-                        member = guild.get_member(user_id) if guild else None
-                        
-                        # 計算最後活動時間 (取最近的訊息或語音時間)
-                        last_message = user["last_message_time"] or 0
-                        last_voice = user["last_voice_time"] or 0
-                        last_activity = max(last_message, last_voice)
-                        
-                        if member:
-                            user_line = f"• <@{user_id}> ({member.display_name}) - 最後活動: <t:{last_activity}:R>"
-                        else:
-                            user_line = f"• <@{user_id}> (已離開伺服器) - 最後活動: <t:{last_activity}:R>"
-                        
-                        description_lines.append(user_line)
-                
-                # 再顯示沒有聊天紀錄的用戶
-                if no_record_users:
-                    if diving_users:  # 如果前面有潛水用戶，加個空行分隔
-                        description_lines.append("")
-                    description_lines.append(f"📝 **沒有聊天紀錄** ({len(no_record_users)} 名)：\n")
-                    
-                    for user in no_record_users:
-                        user_id = user["user_id"]
-                        member = guild.get_member(user_id) if guild else None
-                        
-                        if member:
-                            user_line = f"• <@{user_id}> ({member.display_name}) - 沒有聊天紀錄"
-                        else:
-                            user_line = f"• <@{user_id}> (已離開伺服器) - 沒有聊天紀錄"
-                        
-                        description_lines.append(user_line)
-                
-                # 在開頭加上總結
-                total_count = len(diving_users) + len(no_record_users)
-                summary = f"找到 **{total_count}** 名用戶（超過 {time // 86400 if time else 3} 天未活動）\n"
-                description_lines.insert(0, summary)
-                
-                # 當潛水仔太多，可能會超過 Discord 的 description 長度限制 (4096 字元)
-                # 因此需要分割成多個 embed
-                full_description = "\n".join(description_lines)
-                
-                # 檢查是否超過單一 embed description 上限
-                if len(full_description) <= 4000:
-                    embed.description = full_description
+            # 當潛水仔太多，可能會超過 Discord 的 description 長度限制 (4096 字元)，因此分割成多個 embed，
+            # 每湊滿一段就發送，不必等全部成員讀完
+            sent = 0
+            async for chunk in self.iter_dive_descriptions(
+                interaction.guild, search_time, summary_verb="找到", days=time // 86400 if time else 3
+            ):
+                if sent == 0:
+                    embed.description = chunk
                     await interaction.followup.send(embed=embed, ephemeral=True)
                 else:
-                    # 如果太長，分割成多個 embed
-                    chunks = []
-                    current_chunk = description_lines[0]  # 開頭描述
-                    
-                    for line in description_lines[1:]:
-                        if len(current_chunk) + len(line) + 1 > 4000:  # +1 是換行符
-                            chunks.append(current_chunk)
-                            current_chunk = line
-                        else:
-                            current_chunk += "\n" + line
-                    
-                    if current_chunk:
-                        chunks.append(current_chunk)
-                    
-                    # 發送第一個 embed
-                    embed.description = chunks[0]
-                    await interaction.followup.send(embed=embed, ephemeral=True)
-                    
-                    # 發送其他 embed (如果有的話)
-                    for i, chunk in enumerate(chunks[1:], 1):
-                        follow_embed = discord.Embed(
-                            title=f"潛水仔列表 (續 {i})",
-                            description=chunk,
-                            color=discord.Color.blue(),
-                            timestamp=now
-                        )
-                        await interaction.followup.send(embed=follow_embed, ephemeral=True)
+                    follow_embed = discord.Embed(
+                        title=f"潛水仔列表 (續 {sent})",
+                        description=chunk,
+                        color=discord.Color.blue(),
+                        timestamp=now
+                    )
+                    await interaction.followup.send(embed=follow_embed, ephemeral=True)
+                sent += 1
+
+            if not sent:
+                embed.description = "目前沒有潛水仔"
+                await interaction.followup.send(embed=embed, ephemeral=True)
                 
         except Exception as e:
             log.exception(f"獲取潛水仔時發生錯誤: {e}")
@@ -397,15 +412,20 @@ class AntiDive(commands.Cog):
                     # 預設檢查 3 天未活動的用戶
                     search_time = ts - 259200  # 3天
                     
-                    # 獲取潛水仔列表
-                    dive_users = await self.db_manager.get_inactive_users(
-                        guild_id=guild.id,
-                        message_threshold=search_time,
-                        voice_threshold=search_time,
-                        require_both=True
-                    )
-                    
-                    if not dive_users:
+                    # 逐段取得潛水仔列表 (已分割為多個 embed 的描述)，每段直接交給發送排程
+                    sent = 0
+                    async for chunk in self.iter_dive_descriptions(guild, search_time, summary_verb="發現", days=3):
+                        embed = discord.Embed(
+                            title="每日潛水仔報告" if sent == 0 else f"每日潛水仔報告 (續 {sent})",
+                            description=chunk,
+                            color=discord.Color.blue(),
+                            timestamp=now
+                        )
+                        embed.set_footer(text=f"伺服器: {guild.name} | ID: {guild.id}")
+                        self.bot.outbound.submit(anti_dive_channel, embed=embed, priority=Priority.LOW)
+                        sent += 1
+
+                    if not sent:
                         # 如果沒有潛水仔，發送簡單通知
                         embed = discord.Embed(
                             title="每日潛水仔報告",
@@ -414,117 +434,11 @@ class AntiDive(commands.Cog):
                             timestamp=now
                         )
                         embed.set_footer(text=f"伺服器: {guild.name} | ID: {guild.id}")
-                        await anti_dive_channel.send(embed=embed)
+                        self.bot.outbound.submit(anti_dive_channel, embed=embed, priority=Priority.LOW)
                         log.info(f"伺服器 {guild.name} ({guild.id}) 今日沒有潛水仔")
                         continue
                         
-                    log.info(f"伺服器 {guild.name} ({guild.id}) 今日發現 {len(dive_users)} 名潛水仔")
-                    
-                    # 準備潛水仔報告
-                    embed = discord.Embed(
-                        title="每日潛水仔報告",
-                        color=discord.Color.blue(),
-                        timestamp=now
-                    )
-                    embed.set_footer(text=f"伺服器: {guild.name} | ID: {guild.id}")
-                    
-                    # 建立描述文字
-                    description_lines = []
-                    
-                    # 分離沒有聊天紀錄的用戶和真正潛水的用戶
-                    no_record_users = []
-                    diving_users = []
-                    
-                    for user in dive_users:
-                        last_message = user["last_message_time"] or 0
-                        last_voice = user["last_voice_time"] or 0
-                        last_activity = max(last_message, last_voice)
-                        
-                        if last_activity == 1:
-                            no_record_users.append(user)
-                        else:
-                            diving_users.append(user)
-                    
-                    # 先顯示真正潛水的用戶（按照最後活動時間排序，最久沒活動的在最上面）
-                    if diving_users:
-                        diving_users_sorted = sorted(diving_users, key=lambda user: max(user["last_message_time"] or 0, user["last_voice_time"] or 0))
-                        description_lines.append(f"🏊‍♂️ **潛水用戶** ({len(diving_users)} 名)：\n")
-                        
-                        for user in diving_users_sorted:
-                            user_id = user["user_id"]
-                            member = guild.get_member(user_id)
-                            
-                            # 計算最後活動時間 (取最近的訊息或語音時間)
-                            last_message = user["last_message_time"] or 0
-                            last_voice = user["last_voice_time"] or 0
-                            last_activity = max(last_message, last_voice)
-                            
-                            if member:
-                                user_line = f"• <@{user_id}> ({member.display_name}) - 最後活動: <t:{last_activity}:R>"
-                            else:
-                                user_line = f"• <@{user_id}> (已離開伺服器) - 最後活動: <t:{last_activity}:R>"
-                            
-                            description_lines.append(user_line)
-                    
-                    # 再顯示沒有聊天紀錄的用戶
-                    if no_record_users:
-                        if diving_users:  # 如果前面有潛水用戶，加個空行分隔
-                            description_lines.append("")
-                        description_lines.append(f"📝 **沒有聊天紀錄** ({len(no_record_users)} 名)：\n")
-                        
-                        for user in no_record_users:
-                            user_id = user["user_id"]
-                            member = guild.get_member(user_id)
-                            
-                            if member:
-                                user_line = f"• <@{user_id}> ({member.display_name}) - 沒有聊天紀錄"
-                            else:
-                                user_line = f"• <@{user_id}> (已離開伺服器) - 沒有聊天紀錄"
-                            
-                            description_lines.append(user_line)
-                    
-                    # 在開頭加上總結
-                    total_count = len(diving_users) + len(no_record_users)
-                    summary = f"發現 **{total_count}** 名用戶（超過 3 天未活動）\n"
-                    description_lines.insert(0, summary)
-                    
-                    # 當潛水仔太多，可能會超過 Discord 的 description 長度限制 (4096 字元)
-                    # 因此需要分割成多個 embed
-                    full_description = "\n".join(description_lines)
-                    
-                    # 檢查是否超過單一 embed description 上限
-                    if len(full_description) <= 4000:
-                        embed.description = full_description
-                        await anti_dive_channel.send(embed=embed)
-                    else:
-                        # 如果太長，分割成多個 embed
-                        chunks = []
-                        current_chunk = description_lines[0]  # 開頭描述
-                        
-                        for line in description_lines[1:]:
-                            if len(current_chunk) + len(line) + 1 > 4000:  # +1 是換行符
-                                chunks.append(current_chunk)
-                                current_chunk = line
-                            else:
-                                current_chunk += "\n" + line
-                        
-                        if current_chunk:
-                            chunks.append(current_chunk)
-                        
-                        # 發送第一個 embed
-                        embed.description = chunks[0]
-                        await anti_dive_channel.send(embed=embed)
-                        
-                        # 發送其他 embed (如果有的話)
-                        for i, chunk in enumerate(chunks[1:], 1):
-                            follow_embed = discord.Embed(
-                                title=f"每日潛水仔報告 (續 {i})",
-                                description=chunk,
-                                color=discord.Color.blue(),
-                                timestamp=now
-                            )
-                            follow_embed.set_footer(text=f"伺服器: {guild.name} | ID: {guild.id}")
-                            await anti_dive_channel.send(embed=follow_embed)
+                    log.info(f"伺服器 {guild.name} ({guild.id}) 今日的潛水仔報告共 {sent} 頁")
                 
                 except Exception as e:
                     log.exception(f"處理伺服器 {guild.name} ({guild.id}) 的潛水仔報告時發生錯誤: {e}")
@@ -541,40 +455,33 @@ class AntiDive(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         now, ts = now_with_unix(self.timezone)
         
-        initialized_count = 0
-        skipped_count = 0
-        
-        for member in interaction.guild.members:
-            if member.bot:
-                continue
-            
+        user_ids = [member.id for member in interaction.guild.members if not member.bot]
+        last_edit = 0.0
+
+        async def report_progress(done: int, total: int) -> None:
+            # 編輯原本的回應顯示進度，最多每 2 秒一次，避免觸發速率限制；完成時由結果取代
+            nonlocal last_edit
+            current = monotonic()
+            if done >= total or current - last_edit < 2:
+                return
+            last_edit = current
             try:
-                # 先檢查用戶是否已有活動記錄
-                activities = await self.db_manager.get_user_activity(
-                    guild_id=interaction.guild.id,
-                    user_id=member.id
-                )
-                
-                # 如果使用者已有活動記錄，且不是預設值 1（表示已經有真實活動）
-                if activities and (
-                    (activities[0]["last_message_time"] is not None and activities[0]["last_message_time"] != 1) or 
-                    (activities[0]["last_voice_time"] is not None and activities[0]["last_voice_time"] != 1)
-                ):
-                    # 跳過該用戶，不覆蓋已有的資料
-                    skipped_count += 1
-                    continue
-                
-                # 如果用戶沒有活動記錄或只有初始值，則將它設為初始值 1
-                await self.db_manager.update_user_activity(
-                    guild_id=interaction.guild.id,
-                    user_id=member.id,
-                    message_time=1,
-                    voice_time=1
-                )
-                initialized_count += 1
-                
-            except Exception as e:
-                log.exception(f"初始化用戶 {member.id} 活動時發生錯誤: {e}")
+                await interaction.edit_original_response(content=f"⏳ 初始化中... {done}/{total}")
+            except discord.HTTPException:
+                pass
+
+        try:
+            # 已有實際活動 (非初始值 1) 的用戶由資料庫判斷後跳過，不覆蓋已有的資料
+            initialized_count, skipped_count = await self.db_manager.init_user_activity_bulk(
+                guild_id=interaction.guild.id,
+                user_ids=user_ids,
+                initial_time=1,
+                progress=report_progress,
+            )
+        except Exception as e:
+            log.exception(f"初始化反潛水系統時發生錯誤: {e}")
+            await interaction.edit_original_response(content=f"❌ 初始化時發生錯誤: {e}")
+            return
         
         # 回報處理結果
         embed = discord.Embed(
@@ -592,7 +499,7 @@ class AntiDive(commands.Cog):
         
         embed.set_footer(text=f"伺服器: {interaction.guild.name}")
         
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        await interaction.edit_original_response(content=None, embed=embed)
         
 async def setup(bot: commands.Bot):
     await bot.add_cog(AntiDive(bot))
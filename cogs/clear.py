@@ -2,13 +2,14 @@ import json
 import time
 import logging
 import re
-import asyncio
 import typing as t
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+from utils.Purger import DEFAULT_SCAN_LIMIT, collect_messages, purge_messages
+
 log = logging.getLogger(__name__)
 
 class ConfirmDeleteView(discord.ui.View):
@@ -89,47 +90,37 @@ class Clear(commands.Cog):
                 return
 
         # ------------------ 收集待刪訊息 ------------------
-        messages: list[discord.Message] = []
-        
-        # 確保 amount 是整數且大於0
-        max_messages = amount if amount is not None else 1000
-        
-        if to_message:
-            # ID模式：收集從指定ID到更早的訊息
-            try:
-                # 先確認目標訊息是否符合過濾條件
-                target_msg_valid = not target_users or to_message.author.id in target_users
-                
-                # 使用限制最大數量的方式從頻道底部往上收集訊息
-                async for msg in channel.history(limit=max_messages):
-                    # 如果到達目標訊息，就停止收集
-                    if msg.id == to_message.id:
-                        if target_msg_valid:
-                            messages.append(msg)  # 加入目標訊息本身
-                        break
-                    
-                    # 如果符合過濾條件，就加入列表
-                    if not target_users or msg.author.id in target_users:
-                        messages.append(msg)
-                
-                # 反轉訊息列表，讓它從舊到新排序(底部到目標ID)
-                messages.reverse()
-                
-            except Exception as e:
-                log.error(f"收集訊息時出錯: {e}")
-                await interaction.followup.send(f"收集訊息時發生錯誤: {e}", ephemeral=True)
-                return
-        else:
-            # 數量模式：直接收集指定數量的最新訊息
-            async for msg in channel.history(limit=max_messages):
-                if target_users and msg.author.id not in target_users:
-                    continue
-                messages.append(msg)
-                if len(messages) >= max_messages:
-                    break
+        # 以指令本身的 snowflake 為上界，不收集執行指令之後才送出的訊息；
+        # ID 模式以目標訊息為下界，只拉取兩者之間的頁面，符合數量後立即停止
+        try:
+            messages, exhausted = await collect_messages(
+                channel,
+                limit=amount,
+                users=target_users,
+                after=to_message,
+                before=discord.Object(id=interaction.id),
+                scan_limit=DEFAULT_SCAN_LIMIT,
+            )
+            # 只有掃描到目標訊息為止時才刪除目標訊息本身，否則兩者之間會留下未刪除的訊息
+            scan_limit_hit = to_message is not None and not exhausted and len(messages) < amount
+            if (
+                to_message
+                and exhausted
+                and (not target_users or to_message.author.id in target_users)
+            ):
+                messages.append(to_message)  # 加入目標訊息本身
+        except discord.HTTPException as e:
+            log.error(f"收集訊息時出錯: {e}")
+            await interaction.followup.send(f"收集訊息時發生錯誤: {e}", ephemeral=True)
+            return
 
+        scan_limit_notice = (
+            f"已掃描 {DEFAULT_SCAN_LIMIT} 則訊息仍未到達目標訊息，只會刪除最近的符合訊息，目標訊息與更早的訊息不會被刪除。"
+        )
         if not messages:
-            await interaction.followup.send("找不到符合條件的訊息。", ephemeral=True)
+            await interaction.followup.send(
+                "找不到符合條件的訊息。" + (f"\n{scan_limit_notice}" if scan_limit_hit else ""), ephemeral=True
+            )
             return
 
         # ------------------ 預覽 ------------------
@@ -161,6 +152,8 @@ class Clear(commands.Cog):
         if target_users:
             mentions = "、".join(f"<@{uid}>" for uid in target_users)
             embed.add_field(name="過濾使用者", value=mentions, inline=False)
+        if scan_limit_hit:
+            embed.add_field(name="⚠️ 已達掃描上限", value=scan_limit_notice, inline=False)
 
         view = ConfirmDeleteView(interaction.user)
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
@@ -169,20 +162,15 @@ class Clear(commands.Cog):
             return
 
         # ------------------ 刪除 ------------------
-        success, failed = 0, 0
         progress = await interaction.followup.send("開始刪除…", ephemeral=True)
 
-        for i, msg in enumerate(messages, 1):
-            try:
-                await msg.delete()
-                success += 1
-            except (discord.Forbidden, discord.HTTPException):
-                failed += 1
-
-            # 每 10 筆更新一次進度並稍作休息，減少速限可能
-            if i % 10 == 0:
-                await progress.edit(content=f"已刪除 {i}/{len(messages)}")
-                await asyncio.sleep(0.25)
+        async def report_progress(done: int, total: int) -> None:
+            await progress.edit(content=f"已刪除 {done}/{total}")
+
+        # 14 天內的訊息每 100 則批次刪除，較舊的才逐則刪除；進度最多每 2 秒更新一次
+        success, failed = await purge_messages(
+            channel, messages, progress=report_progress, progress_interval=2.0
+        )
 
         summary = f"完成！成功刪除 {success} 筆"
         if failed:
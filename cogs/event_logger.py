@@ -7,6 +7,8 @@ from discord import app_commands, utils
 from discord.ext import commands
 from zoneinfo import ZoneInfo
 
+from utils.AuditLogCache import AuditLogCache
+from utils.OutboundScheduler import Priority
 from utils.time_utils import now_with_unix
 
 with open("config.json", "r", encoding="utf-8") as fp:
@@ -26,23 +28,8 @@ class _EventLoggerSender():
         self.timezone = cfg["timezone"]
         
     async def get_log_channel(self, guild_id: int, log_type: str) -> discord.TextChannel | None:
-        """獲取日誌頻道"""
-        settings = await self.bot.db_manager.get_settings(guild_id)
-        if not settings:
-            return None
-        
-        try:
-            channel_id = settings[log_type]
-            if not channel_id:
-                return None
-        except (KeyError, IndexError):
-            return None
-    
-        log_channel = self.bot.get_channel(channel_id)
-        if not log_channel or not isinstance(log_channel, discord.TextChannel):
-            return None
-    
-        return log_channel
+        """獲取日誌頻道 (經由設定快取，不查詢資料庫)"""
+        return await self.bot.settings_cache.get_log_channel(guild_id, log_type)
     
     async def log_event(self, guild: discord.Guild, user: discord.User, event_type: str, event_time: float):
         """記錄事件到資料庫"""
@@ -64,6 +51,7 @@ class ImportantLogger(commands.Cog):
         self.guild_id = cfg["guild_id"]
         self.timezone = cfg["timezone"]
         self.event_logger_sender = _EventLoggerSender(bot)
+        self.audit_log_cache = AuditLogCache(max_age=max(120, DEFAULT_TIME_WINDOW * 4))
 
     async def create_user_action_embed(self, *, title: str, description: str, user: discord.abc.User, executor: discord.abc.User = None, reason: str = None, color: discord.Color = discord.Color.red()) -> discord.Embed:
         """建立共用的用戶動作嵌入訊息"""
@@ -79,7 +67,8 @@ class ImportantLogger(commands.Cog):
                             guild: discord.Guild, 
                             target_id: int, 
                             action: discord.AuditLogAction = discord.AuditLogAction.kick,
-                            time_window: int = DEFAULT_TIME_WINDOW ) -> tuple[bool, discord.User | None, str | None]:
+                            time_window: int = DEFAULT_TIME_WINDOW,
+                            retry: bool = False) -> tuple[bool, discord.User | None, str | None]:
         """
         查詢審核日誌資訊
     
@@ -87,51 +76,22 @@ class ImportantLogger(commands.Cog):
             guild: 伺服器
             target_id: 目標成員ID
             action: 審核日誌動作類型 (預設為踢出)
-            time_window: 時間窗口 (秒，預設為120秒)
+            time_window: 時間窗口 (秒，預設為15秒)
+            retry: 確定應有紀錄時 (封禁、解除封禁) 找不到會稍後再查一次；成員離開大多不是被踢出，不重試
     
         Returns:
             tuple: (是否找到匹配記錄, 執行者, 原因)
         """
-        try:
-            demand_time = discord.utils.utcnow().timestamp() - time_window
-            
-            async for entry in guild.audit_logs(limit=5, action=action):
-                try:
-                    # 獲取目標ID的通用方法
-                    entry_target_id = None
-                    
-                    if isinstance(entry.target, (discord.Member, discord.User)):
-                        entry_target_id = entry.target.id
-                    elif isinstance(entry.target, int):
-                        entry_target_id = entry.target
-                    else:
-                        # 嘗試從對象獲取ID
-                        entry_target_id = getattr(entry.target, 'id', None)
-                    
-                    if entry_target_id is None:
-                        log.debug(f"無法從審核日誌條目中提取目標ID，類型: {type(entry.target)}")
-                        continue
-                        
-                    # 檢查是否匹配目標ID
-                    if entry_target_id == target_id:
-                        # 檢查時間戳是否在有效範圍內
-                        entry_time = entry.created_at.timestamp()
-                        if entry_time >= demand_time:
-                            return True, entry.user, entry.reason
-                except Exception as e:
-                    log.warning(f"處理審核日誌條目時發生錯誤: {e}", exc_info=True)
-                    continue
-            
-            # 如果沒找到相符的審核日誌
-            return False, None, None
-                
-        except discord.Forbidden:
-            log.error(f"無法存取 {guild.name} 的審核日誌。請檢查機器人權限。")
-            return False, None, None
-        
-        except Exception as e:
-            log.error(f"在檢查 {guild.name} 的審核日誌時發生錯誤: {e}", exc_info=True)
+        # 同一伺服器、同一動作的查詢共用快取與進行中的拉取，大量踢出/封禁時不會每個事件各呼叫一次 API
+        entry = await self.audit_log_cache.lookup(guild, target_id, action, time_window=time_window, retry=retry)
+        if entry is None:
             return False, None, None
+        return True, entry.user, entry.reason
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        """離開伺服器時清除該伺服器的審核日誌快取"""
+        self.audit_log_cache.invalidate(guild.id)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
@@ -164,7 +124,7 @@ class ImportantLogger(commands.Cog):
                               f"目前伺服器成員數: {member.guild.member_count}\n",
                         inline=False
                     )
-                    await log_channel.send(embed=embed)
+                    self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.HIGH)
                     
             else:
                 log_channel = await self.event_logger_sender.get_log_channel(member.guild.id, MEMBER_LOG_CHANNEL)
@@ -193,7 +153,7 @@ class ImportantLogger(commands.Cog):
                         inline=False
                     )
                     embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
-                    await log_channel.send(embed=embed)
+                    self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.NORMAL)
                     
         except Exception as e:
             log.error(f"處理 on_member_remove 事件時發生錯誤: {e}", exc_info=True)
@@ -208,7 +168,8 @@ class ImportantLogger(commands.Cog):
                 guild=guild,
                 target_id=user.id,
                 action=discord.AuditLogAction.ban,
-                time_window=DEFAULT_TIME_WINDOW
+                time_window=DEFAULT_TIME_WINDOW,
+                retry=True
             )
             if log_channel:
                 embed = await self.create_user_action_embed(
@@ -219,7 +180,7 @@ class ImportantLogger(commands.Cog):
                     reason=ban_reason,
                     color=discord.Color.red()
                 )
-                await log_channel.send(embed=embed)
+                self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.HIGH)
         except Exception as e:
             log.error(f"處理 on_member_ban 事件時發生錯誤: {e}", exc_info=True)
 
@@ -233,7 +194,8 @@ class ImportantLogger(commands.Cog):
                 guild=guild,
                 target_id=user.id,
                 action=discord.AuditLogAction.unban,
-                time_window=DEFAULT_TIME_WINDOW
+                time_window=DEFAULT_TIME_WINDOW,
+                retry=True
             )
             if log_channel:
                 embed = await self.create_user_action_embed(
@@ -244,7 +206,7 @@ class ImportantLogger(commands.Cog):
                     reason=unban_reason,
                     color=discord.Color.green()
                 )
-                await log_channel.send(embed=embed)
+                self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.HIGH)
         except Exception as e:
             log.error(f"處理 on_member_unban 事件時發生錯誤: {e}", exc_info=True)
             
@@ -271,7 +233,7 @@ class ImportantLogger(commands.Cog):
                             name="禁言結束時間",
                             value=f"<t:{int(after_timeout.timestamp())}:F>",)
                         embed.set_author(name=after.display_name, icon_url=after.display_avatar.url)
-                        await log_channel.send(embed=embed)
+                        self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.HIGH)
                 elif (before_timeout and before_timeout > discord.utils.utcnow()) and (after_timeout is None or after_timeout < discord.utils.utcnow()):
                     if log_channel:
                         embed = discord.Embed(
@@ -281,7 +243,7 @@ class ImportantLogger(commands.Cog):
                             timestamp=now
                         )
                         embed.set_author(name=after.display_name, icon_url=after.display_avatar.url)
-                        await log_channel.send(embed=embed)
+                        self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.HIGH)
 
         except Exception as _:
             log.exception(f"處理 on_member_update 事件時發生錯誤")
@@ -327,7 +289,7 @@ class MemberLogger(commands.Cog):
                           f"目前伺服器成員數: {member.guild.member_count}\n",
                     inline=False
                 )
-                await log_channel.send(embed=embed)
+                self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.NORMAL)
                 
         except Exception as _:
             log.exception(f"發送成員加入事件時發生錯誤")
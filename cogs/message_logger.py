@@ -1,146 +1,299 @@
+import io
 import json
 import logging
 import datetime
-from typing import List
+from typing import Dict, List, Optional, Union
+from zoneinfo import ZoneInfo
 
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 
+from utils.MessageStore import StoredMessage
+from utils.OutboundScheduler import Priority
 from utils.time_utils import now_with_unix
 
 with open("config.json", "r", encoding="utf-8") as fp:
     cfg = json.load(fp)
-    
+
 log = logging.getLogger(__name__)
 
+
+def _from_row(row) -> StoredMessage:
+    """將 message_cache 的資料列轉為 StoredMessage"""
+    attachments = tuple(row["attachments"].split("\n")) if row["attachments"] else ()
+    return StoredMessage(
+        row["message_id"], row["channel_id"], row["guild_id"], row["author_id"], row["content"], attachments
+    )
+
+
 class MessageLogger(commands.Cog):
+    """
+    訊息編輯/刪除日誌。
+
+    使用 raw 事件，不依賴 discord.py 的訊息快取；原始內容依序取自
+    記憶體中的 MessageStore、資料庫的 message_cache (重新啟動後仍可取得) 與 discord.py 的快取。
+    批次刪除只發送一則日誌，並附上被刪除訊息的文字紀錄檔。
+    未設定訊息日誌頻道 (message_log_channel) 的伺服器不保存訊息內容。
+    """
     def __init__(self, bot):
         self.bot = bot
         self.db_manager = bot.db_manager
         self.guild_id = cfg["guild_id"]
         self.timezone = cfg["timezone"]
-        
+        self.message_store = bot.message_store
+        # 訊息內容保存於資料庫的天數
+        self.persist_days = cfg.get("message_store", {}).get("persist_days", 7)
+        self.prune_message_cache.start()
+
+    async def cog_unload(self) -> None:
+        self.prune_message_cache.cancel()
+
     async def get_log_channel(self, guild_id: int) -> discord.TextChannel | None:
-        """獲取日誌頻道"""
-        settings = await self.bot.db_manager.get_settings(guild_id)
-        if not settings or settings["message_log_channel"] is None:
-            return None
-        
-        log_channel = self.bot.get_channel(settings["message_log_channel"])
-        if not log_channel or not isinstance(log_channel, discord.TextChannel):
-            return None
-        
-        return log_channel
+        """獲取日誌頻道 (經由設定快取，不查詢資料庫)"""
+        return await self.bot.settings_cache.get_log_channel(guild_id, "message_log_channel")
+
+    @tasks.loop(hours=1)
+    async def prune_message_cache(self):
+        """清除超過保存天數的訊息內容"""
+        cutoff = discord.utils.utcnow() - datetime.timedelta(days=self.persist_days)
+        try:
+            removed = await self.db_manager.prune_message_cache(before_id=discord.utils.time_snowflake(cutoff))
+            if removed:
+                log.info(f"已清除 {removed} 筆超過 {self.persist_days} 天的訊息快取")
+        except Exception as _:
+            log.exception("清除訊息快取時發生錯誤")
+
+    async def _lookup(self, message_ids: List[int]) -> Dict[int, StoredMessage]:
+        """由記憶體快取與資料庫取得訊息紀錄 (並從記憶體快取中移除)"""
+        found: Dict[int, StoredMessage] = {}
+        for message_id in message_ids:
+            record = self.message_store.remove(message_id)
+            if record is not None:
+                found[message_id] = record
+        missing = [message_id for message_id in message_ids if message_id not in found]
+        if missing:
+            for message_id, row in (await self.db_manager.get_cached_messages(missing)).items():
+                found[message_id] = _from_row(row)
+        return found
+
+    async def _previous_message(self, channel_id: int, message_id: int) -> Optional[StoredMessage]:
+        record = self.message_store.previous(channel_id, message_id)
+        if record is None:
+            row = await self.db_manager.get_previous_cached_message(channel_id=channel_id, message_id=message_id)
+            if row is not None:
+                record = _from_row(row)
+        return record
 
     @commands.Cog.listener()
-    async def on_message_edit(self, before: discord.Message, after: discord.Message):
-        if before.author.bot:
+    async def on_message(self, message: discord.Message):
+        """記錄訊息內容，供刪除/編輯日誌使用 (未設定訊息日誌頻道的伺服器不保存)"""
+        if message.author.bot or not message.guild:
             return
-        
-        if before.content == after.content:
+        if not await self.get_log_channel(message.guild.id):
             return
-        
-        log_channel = await self.get_log_channel(before.guild.id)
-        
+        self.message_store.add(message)
+        await self.db_manager.cache_message(
+            message_id=message.id,
+            guild_id=message.guild.id,
+            channel_id=message.channel.id,
+            author_id=message.author.id,
+            content=message.content,
+            attachments=[a.filename for a in message.attachments],
+        )
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.message_store.remove_channel(channel.id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        after = payload.message
+        if after.author.bot or payload.guild_id is None:
+            return
+
+        # 以快取中的內容為準，連續編輯時 cached_message 也會是上一次編輯後的內容
+        stored = self.message_store.update(after)
+        if stored is None:
+            rows = await self.db_manager.get_cached_messages([payload.message_id])
+            if payload.message_id in rows:
+                stored = _from_row(rows[payload.message_id])
+        if stored is not None:
+            original: Optional[str] = stored.content
+        elif payload.cached_message is not None:
+            original = payload.cached_message.content
+        else:
+            original = None
+        if original == after.content:
+            return
+        await self.db_manager.update_cached_message(
+            message_id=after.id, content=after.content, attachments=[a.filename for a in after.attachments]
+        )
+        # 不知道原始內容時，只記錄剛編輯過的訊息 (排除連結預覽、釘選等不是編輯的更新)
+        if original is None and (
+            after.edited_at is None or discord.utils.utcnow() - after.edited_at > datetime.timedelta(minutes=1)
+        ):
+            return
+
+        log_channel = await self.get_log_channel(payload.guild_id)
+        if not log_channel:
+            return
+
         now, ts = now_with_unix(self.timezone)
-        
+
         embed = discord.Embed(
             title="訊息編輯紀錄",
             color=discord.Color.yellow(),
-            description=f"{before.author.mention} (`{before.author.id}`) 編輯了訊息\n[跳轉到訊息]({after.jump_url})",
+            description=f"{after.author.mention} (`{after.author.id}`) 編輯了訊息\n[跳轉到訊息]({after.jump_url})",
             timestamp=now
         )
         embed.add_field(
             name="原始訊息",
-            value=before.content[:1024],
+            value=(original[:1024] or "[無文字內容]") if original is not None else "[訊息不在快取中，無法取得原始內容]",
             inline=False
         )
         embed.add_field(
             name="新訊息",
-            value=after.content[:1024],
+            value=after.content[:1024] or "[無文字內容]",
             inline=False
         )
-        embed.set_author(name=before.author.display_name, icon_url=before.author.display_avatar.url)
-        await log_channel.send(embed=embed)
-        
+        embed.set_author(name=after.author.display_name, icon_url=after.author.display_avatar.url)
+        self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.NORMAL)
+
     @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Message):
-    
-        if message.author.bot:
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        message = payload.cached_message
+        if payload.guild_id is None or (message is not None and message.author.bot):
             return
-        
-        log_channel = await self.get_log_channel(message.guild.id)
+
+        stored = (await self._lookup([payload.message_id])).get(payload.message_id)
+        await self.db_manager.delete_cached_messages([payload.message_id])
+        if message is None and stored is None:
+            # 機器人訊息或超過保存期限的訊息，沒有可記錄的內容
+            return
+
+        log_channel = await self.get_log_channel(payload.guild_id)
         if not log_channel:
             return
-            
+
         now, ts = now_with_unix(self.timezone)
-        
+        guild = self.bot.get_guild(payload.guild_id)
+        author: Optional[Union[discord.Member, discord.User]] = (
+            message.author if message is not None else guild.get_member(stored.author_id) if guild else None
+        )
+        author_id = message.author.id if message is not None else stored.author_id
+
         embed = discord.Embed(
             title="訊息刪除紀錄",
             color=discord.Color.red(),
-            description=f"{message.author.mention} (`{message.author.id}`) 的訊息被刪除",
+            description=f"<@{author_id}> (`{author_id}`) 的訊息被刪除",
             timestamp=now
         )
-        if message.content:
+        content = (message.content if message is not None else "") or (stored.content if stored is not None else "")
+        if content:
             embed.add_field(
                 name="原始訊息",
-                value=message.content[:1024],
+                value=content[:1024],
                 inline=False
             )
-        
-        if message.attachments:
-            attachments = "\n".join([f"- {attachment.filename}" for attachment in message.attachments])
+
+        attachments = [a.filename for a in message.attachments] if message is not None else list(stored.attachments)
+        if attachments:
             embed.add_field(
                 name="附件",
-                value=attachments,
+                value="\n".join([f"- {filename}" for filename in attachments]),
                 inline=False
             )
-            
-        # 獲取附近訊息的連結 - 只找最近的一條
-        channel = message.channel
-        try:
-            # 嘗試獲取被刪除訊息之前的一條非機器人訊息
-            nearby_message = None
-            async for msg in channel.history(limit=10, before=message.created_at):
-                if not msg.author.bot:  # 排除機器人訊息
-                    nearby_message = msg
-                    break
-                    
-            if nearby_message:
-                # 顯示簡短的訊息預覽
-                link = f"[跳至附近訊息]({nearby_message.jump_url})"
-                
-                embed.add_field(
-                    name="附近訊息連結",
-                    value=link,
-                    inline=False
-                )
-            else:
-                embed.add_field(
-                    name="附近訊息連結",
-                    value="無法獲取附近訊息",
-                    inline=False
-                )
-        except Exception as e:
-            log.error(f"獲取附近訊息時發生錯誤: {e}")
+
+        # 附近訊息取自訊息快取 (只記錄非機器人的訊息)，不呼叫 API
+        nearby_message = await self._previous_message(payload.channel_id, payload.message_id)
+        if nearby_message:
+            preview = nearby_message.content
+            preview = (preview[:75] + "…") if len(preview) > 75 else (preview or "[Embed/檔案]")
+            embed.add_field(
+                name="附近訊息連結",
+                value=f"<@{nearby_message.author_id}>: {preview}\n[跳至附近訊息]({nearby_message.jump_url})",
+                inline=False
+            )
+        else:
             embed.add_field(
                 name="附近訊息連結",
-                value=f"獲取附近訊息時出錯: {e}",
+                value="無法獲取附近訊息",
                 inline=False
             )
-            
+
         # 添加頻道資訊
         embed.add_field(
             name="頻道資訊",
-            value=f"{message.channel.mention} (`{message.channel.id}`)",
+            value=f"<#{payload.channel_id}> (`{payload.channel_id}`)",
             inline=False
         )
-        
-        embed.set_author(name=message.author.display_name, icon_url=message.author.display_avatar.url)
-        await log_channel.send(embed=embed)
-        
-        
+
+        if author is not None:
+            embed.set_author(name=author.display_name, icon_url=author.display_avatar.url)
+        self.bot.outbound.submit(log_channel, embed=embed, priority=Priority.NORMAL)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """批次刪除只發送一則日誌，內容以文字檔附上"""
+        if payload.guild_id is None:
+            return
+
+        message_ids = sorted(payload.message_ids)
+        cached = {m.id: m for m in payload.cached_messages}
+        records = await self._lookup(message_ids)
+        await self.db_manager.delete_cached_messages(message_ids)
+
+        log_channel = await self.get_log_channel(payload.guild_id)
+        if not log_channel:
+            return
+
+        now, ts = now_with_unix(self.timezone)
+        tz = ZoneInfo(self.timezone)
+        guild = self.bot.get_guild(payload.guild_id)
+        lines: List[str] = []
+        known = 0
+        for message_id in message_ids:
+            created = discord.utils.snowflake_time(message_id).astimezone(tz).strftime("%Y-%m-%d %H:%M:%S")
+            message = cached.get(message_id)
+            record = records.get(message_id)
+            if message is not None:
+                if message.author.bot:
+                    continue
+                author = f"{message.author} ({message.author.id})"
+                content = message.content
+                attachments = [a.filename for a in message.attachments]
+            elif record is not None:
+                member = guild.get_member(record.author_id) if guild else None
+                author = f"{member or '未知成員'} ({record.author_id})"
+                content = record.content
+                attachments = list(record.attachments)
+            else:
+                lines.append(f"[{created}] (訊息 {message_id} 不在快取中)")
+                continue
+            known += 1
+            line = f"[{created}] {author}: {content}"
+            if attachments:
+                line += f" [附件: {', '.join(attachments)}]"
+            lines.append(line)
+        if not lines:
+            return
+
+        embed = discord.Embed(
+            title="訊息批次刪除紀錄",
+            color=discord.Color.red(),
+            description=f"<#{payload.channel_id}> (`{payload.channel_id}`) 有 {len(message_ids)} 則訊息被批次刪除",
+            timestamp=now
+        )
+        embed.add_field(name="可取得內容", value=f"{known} 則", inline=True)
+        embed.add_field(name="不在快取中", value=f"{len(lines) - known} 則", inline=True)
+        transcript = discord.File(
+            io.BytesIO("\n".join(lines).encode("utf-8")),
+            filename=f"deleted-{payload.channel_id}-{ts}.txt",
+        )
+        self.bot.outbound.submit(log_channel, embed=embed, file=transcript, priority=Priority.NORMAL)
+
+
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(MessageLogger(bot))
     log.info("MessageLogger 擴充已載入")
@@ -8,7 +8,7 @@ from typing import List
 import discord
 from discord import app_commands, utils
 from discord.ext import commands
-from utils.Paginator import Paginator
+from utils.Paginator import KeysetPageSource, LazyPaginator
 from utils.TimeFormat import format_seconds
 from utils.time_utils import now_with_unix
 
@@ -165,31 +165,20 @@ class Mute(commands.Cog):
         now, ts = now_with_unix(self.timezone)
         since = ts - 30 * 24 * 3600 if recently else None
         try:
-            records = await self.DBManager.list_punishments(
+            filters = dict(
                 guild_id = interaction.guild_id,
                 user_id = user.id,
                 ptype = ["mute", "unmute"],
                 start_ts = since,
-                limit = None if recently else 100
+            )
+            title = (
+                f"{user.display_name}({user.id}) "
+                + ("最近30天的禁言紀錄" if recently else "的全部禁言紀錄")
             )
 
-            if not records:
-                embed = discord.Embed(
-                    description = "沒有禁言紀錄",
-                    colour = discord.Colour.green(),
-                    timestamp = now
-                )
-
-            embeds: List[discord.Embed] = []
-            page_size = 5
-            for i in range(0, len(records), page_size):
-                chunk = records[i : i + page_size]
-                title = (
-                    f"{user.display_name}({user.id}) "
-                    + ("最近30天的禁言紀錄" if recently else "的全部禁言紀錄")
-                )
+            def render(records, page: int) -> discord.Embed:
                 emb = discord.Embed(title=title, colour=discord.Colour.orange(), timestamp=now)
-                for r in chunk:
+                for r in records:
                     dt = datetime.fromtimestamp(r["punished_at"], ZoneInfo(self.timezone))
                     time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
                     reason = utils.escape_markdown(r["reason"] or "(無原因)")
@@ -200,10 +189,28 @@ class Mute(commands.Cog):
                     else:
                         value = f"解除禁言\n原因: {reason}"
                     emb.add_field(name=time_str, value=value, inline=False)
-                embeds.append(emb)
-            
-            paginator = Paginator(embeds)
-            msg = await interaction.followup.send(embed=embeds[0], view=paginator, ephemeral=True)
+                return emb
+
+            # 每頁 5 筆，翻頁時才向資料庫取下一頁
+            source = KeysetPageSource(
+                lambda after, limit: self.DBManager.list_punishments(**filters, before=after, limit=limit),
+                key = lambda r: (r["punished_at"], r["punish_id"]),
+                per_page = 5,
+                count = lambda: self.DBManager.count_punishments(**filters),
+            )
+            paginator = LazyPaginator(source, render)
+            first = await paginator.first_page()
+
+            if first is None:
+                embed = discord.Embed(
+                    description = "沒有禁言紀錄",
+                    colour = discord.Colour.green(),
+                    timestamp = now
+                )
+                await interaction.followup.send(embed=embed, ephemeral=True)
+                return
+
+            msg = await interaction.followup.send(embed=first, view=paginator, ephemeral=True)
             paginator.message = msg
 
         except Exception as e:
@@ -0,0 +1,134 @@
+import io
+import json
+import logging
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from utils.time_utils import now_with_unix
+
+with open("config.json", "r", encoding="utf-8") as fp:
+    cfg = json.load(fp)
+
+log = logging.getLogger(__name__)
+
+_KIND_NAMES = {
+    "listener": "事件處理器",
+    "command": "斜線指令",
+    "db": "資料庫查詢",
+    "rest": "訊息發送",
+}
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+
+class Perf(commands.Cog):
+    """效能量測：查看最慢的事件處理器、指令、資料庫查詢與訊息發送"""
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.instrumentation = bot.instrumentation
+        self.timezone = cfg["timezone"]
+        self._previous_on_error = None
+
+    async def cog_load(self) -> None:
+        # 失敗的指令不會觸發 on_app_command_completion，改由指令樹的錯誤處理記錄，再交給原本的處理函式
+        self._previous_on_error = self.bot.tree.on_error
+        self.bot.tree.on_error = self._on_tree_error
+
+    async def cog_unload(self) -> None:
+        if self._previous_on_error is not None:
+            self.bot.tree.on_error = self._previous_on_error
+
+    def _record_command(self, interaction: discord.Interaction, command, outcome: str) -> None:
+        """
+        記錄斜線指令的耗時，名稱附上結果 (ok、error、check_failed)。
+        起點是互動的建立時間 (Discord 的 snowflake 時間)，因此包含 gateway 傳遞的延遲，
+        並受本機時鐘誤差影響。
+        """
+        if command is None:
+            return
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        self.instrumentation.record("command", f"/{command.qualified_name} [{outcome}]", elapsed)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        """記錄成功完成的斜線指令"""
+        self._record_command(interaction, command, "ok")
+
+    async def _on_tree_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        """記錄失敗或未通過檢查的斜線指令"""
+        outcome = "check_failed" if isinstance(error, app_commands.CheckFailure) else "error"
+        self._record_command(interaction, interaction.command, outcome)
+        await self._previous_on_error(interaction, error)
+
+    @app_commands.command(name="perf_top", description="查看耗時最長的項目")
+    @app_commands.describe(kind="類別", sort="排序依據", limit="顯示數量 (1–25)")
+    @app_commands.choices(
+        kind=[app_commands.Choice(name=name, value=value) for value, name in _KIND_NAMES.items()],
+        sort=[
+            app_commands.Choice(name="p95", value="p95"),
+            app_commands.Choice(name="p99", value="p99"),
+            app_commands.Choice(name="最大值", value="max"),
+            app_commands.Choice(name="累計耗時", value="total"),
+            app_commands.Choice(name="次數", value="count"),
+        ],
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def perf_top(
+        self,
+        interaction: discord.Interaction,
+        kind: str = None,
+        sort: str = "p95",
+        limit: app_commands.Range[int, 1, 25] = 10,
+    ):
+        """ 列出耗時最長的項目 """
+        now, _ = now_with_unix(self.timezone)
+        if not self.instrumentation.enabled:
+            await interaction.response.send_message("效能量測未啟用 (config.json 的 instrumentation.enabled)", ephemeral=True)
+            return
+
+        rows = self.instrumentation.top(kind=kind, sort=sort, limit=limit)
+        title = f"⏱️ 耗時排行：{_KIND_NAMES[kind] if kind else '全部'}（依 {sort}）"
+        embed = discord.Embed(
+            title=title,
+            description=f"自 <t:{int(self.instrumentation.started_at)}:R> 開始統計，單位為 ms",
+            color=discord.Color.blurple(),
+            timestamp=now,
+        )
+        if not rows:
+            embed.description += "\n\n目前沒有資料"
+        for row in rows:
+            embed.add_field(
+                name=f"[{_KIND_NAMES.get(row['kind'], row['kind'])}] {row['name']}"[:256],
+                value=(
+                    f"次數 {row['count']:,}｜p50 {_ms(row['p50'])}｜p95 {_ms(row['p95'])}｜"
+                    f"p99 {_ms(row['p99'])}｜最大 {_ms(row['max'])}｜累計 {row['total']:.1f} s"
+                ),
+                inline=False,
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="perf_export", description="匯出效能量測資料 (Prometheus 格式)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def perf_export(self, interaction: discord.Interaction):
+        """ 以 Prometheus 文字格式匯出所有直方圖 """
+        _, ts = now_with_unix(self.timezone)
+        data = self.instrumentation.to_prometheus().encode("utf-8")
+        await interaction.response.send_message(
+            file=discord.File(io.BytesIO(data), filename=f"metrics-{ts}.prom"), ephemeral=True
+        )
+
+    @app_commands.command(name="perf_reset", description="清除效能量測資料")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def perf_reset(self, interaction: discord.Interaction):
+        """ 清除所有直方圖，重新開始統計 """
+        self.instrumentation.reset()
+        await interaction.response.send_message("已清除效能量測資料", ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(Perf(bot))
+    log.info("Perf 擴充已載入")
@@ -36,6 +36,22 @@ class Ping(commands.Cog):
         embed = discord.Embed(title="🏓 Pong!", color=discord.Color.green())
         embed.add_field(name="API 延遲", value=f"`{api_latency} ms`", inline=True)
         embed.add_field(name="Websocket 延遲", value=f"`{ws_latency} ms`", inline=True)
+
+        # 事件迴圈延遲：事件處理器做了太多同步工作時會升高，過高會導致 gateway 心跳逾時而斷線
+        loop = self.bot.loop_monitor.get_stats()
+        embed.add_field(
+            name="事件迴圈延遲",
+            value=f"`{loop['lag'] * 1000:.0f} ms`（1 分鐘內最高 `{loop['max_lag'] * 1000:.0f} ms`）",
+            inline=False,
+        )
+        stall = loop["last_stall"]
+        if stall is not None:
+            where = stall["cog"] or stall["location"] or "未知位置"
+            embed.add_field(
+                name=f"最近一次阻塞（累計 {loop['stalls']} 次）",
+                value=f"<t:{int(stall['at'])}:R> 阻塞 `{stall['duration']:.2f} 秒`\n位置：`{where}`",
+                inline=False,
+            )
         # 回覆互動
         await interaction.followup.send(embed=embed)
 
@@ -0,0 +1,246 @@
+import json
+import logging
+import time as _time
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+from utils.OutboundScheduler import Priority
+from utils.time_utils import now_with_unix
+
+with open("config.json", "r", encoding="utf-8") as fp:
+    cfg = json.load(fp)
+
+log = logging.getLogger(__name__)
+
+_PUNISH_NAMES = {
+    "warn": "警告",
+    "mute": "禁言",
+    "ban": "封鎖",
+}
+_WEEKDAYS = "一二三四五六日"
+
+
+def _midnight(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _delta(current: int, previous: int) -> str:
+    """與前一期比較的變化，例如 ▲12%。"""
+    if previous == 0:
+        return "—" if current == 0 else "🆕"
+    pct = (current - previous) * 100 / previous
+    if abs(pct) < 0.5:
+        return "±0%"
+    return f"{'▲' if pct > 0 else '▼'}{abs(pct):.0f}%"
+
+
+def _hours(seconds: int) -> str:
+    return f"{seconds / 3600:.1f} 小時"
+
+
+class ActivityReport(commands.Cog):
+    """週報／月報：由 DBManager 的每日活動統計產生，不需掃描原始紀錄"""
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.db_manager = bot.db_manager
+        self.timezone = cfg["timezone"]
+        self._rollups_backfilled = False
+        self.refresh_voice_rollups.start()
+        self.scheduled_report.start()
+
+    async def cog_unload(self) -> None:
+        self.refresh_voice_rollups.cancel()
+        self.scheduled_report.cancel()
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        """升級後第一次啟動時從歷史紀錄建立活動統計"""
+        if self._rollups_backfilled:
+            return
+        self._rollups_backfilled = True
+        try:
+            if await self.db_manager.activity_rollups_need_backfill():
+                log.info("活動統計尚無資料，開始從歷史紀錄重建")
+                await self.db_manager.rebuild_activity_rollups()
+        except Exception as _:
+            log.exception("重建活動統計時發生錯誤")
+
+    @tasks.loop(minutes=5)
+    async def refresh_voice_rollups(self):
+        """定期將已結束的語音停留紀錄累加到活動統計"""
+        try:
+            await self.db_manager.refresh_voice_rollups()
+        except Exception as _:
+            log.exception("更新語音活動統計時發生錯誤")
+
+    async def build_report(
+        self,
+        guild: discord.Guild,
+        title: str,
+        start: datetime,
+        end: datetime,
+        previous_start: datetime,
+    ) -> discord.Embed:
+        """
+        產生 [start, end) 的活動報告，並與 [previous_start, start) 比較。
+        三個時間點都必須是設定時區的零時。
+        """
+        perf_start = _time.perf_counter()
+        await self.db_manager.refresh_voice_rollups()
+        start_ts, end_ts, prev_ts = int(start.timestamp()), int(end.timestamp()), int(previous_start.timestamp())
+        rows = await self.db_manager.get_activity_rollup(
+            guild_id=guild.id, start_ts=prev_ts, end_ts=end_ts, granularity="daily"
+        )
+
+        current: Dict[str, int] = {}
+        previous: Dict[str, int] = {}
+        per_day: Dict[int, Dict[str, int]] = {}
+        for row in rows:
+            bucket, metric, value = row["bucket"], row["metric"], row["value"]
+            if bucket < start_ts:
+                previous[metric] = previous.get(metric, 0) + value
+                continue
+            current[metric] = current.get(metric, 0) + value
+            day = per_day.setdefault(bucket, {})
+            day[metric] = day.get(metric, 0) + value
+
+        def punish_total(totals: Dict[str, int]) -> int:
+            return sum(totals.get(f"punish:{ptype}", 0) for ptype in _PUNISH_NAMES)
+
+        def stat(metric: str) -> Tuple[int, int]:
+            return current.get(metric, 0), previous.get(metric, 0)
+
+        embed = discord.Embed(
+            title=title,
+            description=f"{start.strftime('%Y-%m-%d')} ~ {(end - timedelta(days=1)).strftime('%Y-%m-%d')}（括號內為與前一期比較）",
+            color=discord.Color.blurple(),
+            timestamp=datetime.now(ZoneInfo(self.timezone)),
+        )
+        messages, prev_messages = stat("messages")
+        embed.add_field(name="💬 訊息", value=f"{messages:,}（{_delta(messages, prev_messages)}）")
+        voice, prev_voice = stat("voice_seconds")
+        embed.add_field(name="🎙️ 語音時長", value=f"{_hours(voice)}（{_delta(voice, prev_voice)}）")
+        sessions, prev_sessions = stat("voice_sessions")
+        embed.add_field(name="🔊 語音場次", value=f"{sessions:,}（{_delta(sessions, prev_sessions)}）")
+        joins, prev_joins = stat("event:member_join")
+        embed.add_field(name="📥 新成員", value=f"{joins:,}（{_delta(joins, prev_joins)}）")
+        leaves, prev_leaves = stat("event:member_leave")
+        embed.add_field(name="📤 離開成員", value=f"{leaves:,}（{_delta(leaves, prev_leaves)}）")
+        punishments, prev_punishments = punish_total(current), punish_total(previous)
+        breakdown = "、".join(
+            f"{name} {current[f'punish:{ptype}']}"
+            for ptype, name in _PUNISH_NAMES.items()
+            if current.get(f"punish:{ptype}")
+        )
+        embed.add_field(
+            name="⚖️ 懲處",
+            value=f"{punishments:,}（{_delta(punishments, prev_punishments)}）" + (f"\n{breakdown}" if breakdown else ""),
+        )
+
+        # 一週以內逐日列出，較長的期間每 7 天合併一行
+        tz = ZoneInfo(self.timezone)
+        days = sorted(per_day)
+        lines: List[str] = []
+        if (end - start).days <= 7:
+            for bucket in days:
+                local = datetime.fromtimestamp(bucket, tz)
+                day = per_day[bucket]
+                lines.append(
+                    f"`{local.strftime('%m-%d')} 週{_WEEKDAYS[local.weekday()]}` "
+                    f"💬 {day.get('messages', 0):,} ｜ 🎙️ {_hours(day.get('voice_seconds', 0))}"
+                )
+        else:
+            segment = start
+            while segment < end:
+                segment_end = min(segment + timedelta(days=7), end)
+                lo, hi = int(segment.timestamp()), int(segment_end.timestamp())
+                in_range = [per_day[b] for b in days if lo <= b < hi]
+                lines.append(
+                    f"`{segment.strftime('%m-%d')} ~ {(segment_end - timedelta(days=1)).strftime('%m-%d')}` "
+                    f"💬 {sum(d.get('messages', 0) for d in in_range):,} ｜ "
+                    f"🎙️ {_hours(sum(d.get('voice_seconds', 0) for d in in_range))}"
+                )
+                segment = segment_end
+        if lines:
+            embed.add_field(name="📈 趨勢", value="\n".join(lines), inline=False)
+
+        elapsed = (_time.perf_counter() - perf_start) * 1000
+        embed.set_footer(text=f"伺服器: {guild.name} | 產生耗時 {elapsed:.1f} ms")
+        return embed
+
+    def _weekly_range(self, now: datetime) -> Tuple[datetime, datetime, datetime]:
+        """上一個完整的週一至週日"""
+        monday = _midnight(now) - timedelta(days=now.weekday())
+        start = _midnight(monday - timedelta(days=7))
+        return start, monday, _midnight(start - timedelta(days=7))
+
+    def _monthly_range(self, now: datetime) -> Tuple[datetime, datetime, datetime]:
+        """上一個完整的月份"""
+        first = _midnight(now.replace(day=1))
+        start = _midnight((first - timedelta(days=1)).replace(day=1))
+        previous = _midnight((start - timedelta(days=1)).replace(day=1))
+        return start, first, previous
+
+    @tasks.loop(time=time(hour=9, minute=0, tzinfo=ZoneInfo(cfg["timezone"])))
+    async def scheduled_report(self):
+        """每週一發送週報，每月 1 日發送月報"""
+        now, _ = now_with_unix(self.timezone)
+        reports = []
+        if now.weekday() == 0:
+            reports.append(("📊 每週活動報告", self._weekly_range(now)))
+        if now.day == 1:
+            reports.append(("📊 每月活動報告", self._monthly_range(now)))
+        if not reports:
+            return
+
+        for guild in self.bot.guilds:
+            try:
+                channel = await self.bot.settings_cache.get_log_channel(guild.id, "report_channel")
+                if channel is None:
+                    log.info(f"伺服器 {guild.name} ({guild.id}) 未設定週報頻道，跳過")
+                    continue
+                for title, (start, end, previous) in reports:
+                    embed = await self.build_report(guild, title, start, end, previous)
+                    self.bot.outbound.submit(channel, embed=embed, priority=Priority.LOW)
+                log.info(f"伺服器 {guild.name} ({guild.id}) 已發送活動報告")
+            except Exception as e:
+                log.exception(f"發送伺服器 {guild.name} ({guild.id}) 的活動報告時發生錯誤: {e}")
+
+    @scheduled_report.before_loop
+    async def before_scheduled_report(self):
+        await self.bot.wait_until_ready()
+
+    @app_commands.command(name="activity_report", description="查看伺服器活動報告")
+    @app_commands.describe(period="報告期間")
+    @app_commands.choices(period=[
+        app_commands.Choice(name="最近 7 天", value="week"),
+        app_commands.Choice(name="最近 30 天", value="month"),
+    ])
+    @app_commands.checks.has_permissions(manage_channels=True)
+    async def activity_report(self, interaction: discord.Interaction, period: str = "week"):
+        """ 查看最近 7 / 30 天的活動報告 (含今天)，並與前一期比較 """
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        now, _ = now_with_unix(self.timezone)
+        days = 7 if period == "week" else 30
+        end = _midnight(now + timedelta(days=1))
+        start = _midnight(end - timedelta(days=days))
+        previous = _midnight(start - timedelta(days=days))
+        try:
+            embed = await self.build_report(
+                interaction.guild, f"📊 最近 {days} 天活動報告", start, end, previous
+            )
+        except Exception as e:
+            log.exception("產生活動報告時發生錯誤")
+            await interaction.followup.send(f"❌ 產生報告失敗：{e}", ephemeral=True)
+            return
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(ActivityReport(bot))
+    log.info("ActivityReport 擴充已載入")
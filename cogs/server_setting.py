@@ -29,7 +29,8 @@ class ServerSetting(commands.Cog):
             "voice_log_channel": "語音紀錄頻道",
             "member_log_channel": "成員頻道紀錄",
             "message_log_channel": "訊息紀錄頻道",
-            "anti_dive_channel": "防潛水頻道"
+            "anti_dive_channel": "防潛水頻道",
+            "report_channel": "週報／月報頻道"
         }
         return descriptions.get(type, "未知日誌類型")
         
@@ -94,6 +95,7 @@ class ServerSetting(commands.Cog):
             app_commands.Choice(name="成員頻道紀錄", value="member_log_channel"),
             app_commands.Choice(name="訊息紀錄頻道", value="message_log_channel"),
             app_commands.Choice(name="防潛水頻道", value="anti_dive_channel"),
+            app_commands.Choice(name="週報／月報頻道", value="report_channel"),
         ]
         
         # 如果使用者輸入了搜尋文字，則過濾選項
@@ -107,6 +109,16 @@ class ServerSetting(commands.Cog):
         # 如果沒有輸入，返回所有選項
         return options
     
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """日誌頻道被刪除時，從設定快取移除失效的頻道物件"""
+        self.bot.settings_cache.evict_channel(channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        """離開伺服器時清除該伺服器的設定快取"""
+        self.bot.settings_cache.invalidate(guild.id)
+
     @app_commands.checks.has_permissions(manage_channels=True)
     @app_commands.command(name="list_setting", description="列出伺服器設定")
     async def list_setting(self, interaction: discord.Interaction):
@@ -138,6 +150,7 @@ class ServerSetting(commands.Cog):
             "member_log_channel": "成員紀錄頻道",
             "message_log_channel": "訊息紀錄頻道",
             "anti_dive_channel": "防潛水頻道",
+            "report_channel": "週報／月報頻道",
             "guild_id": "伺服器 ID"
         }
         
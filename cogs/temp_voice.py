@@ -1,6 +1,5 @@
 import re
 import discord
-import os
 from discord.ext import commands
 from discord import app_commands
 from typing import Optional, List
@@ -62,16 +61,17 @@ class TemplateFormatter:
     
 class TempVoice(commands.Cog):
     """臨時語音頻道"""
-    def __init__(self, bot: commands.Bot, db_path):
+    def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.TemplateFormatter = TemplateFormatter
-        self.TempVoiceDatabase = TempVoiceDatabase(db_path)
+        # 由 Bot 建立在共用的資料庫引擎上，資料表於 setup_hook 初始化
+        self.TempVoiceDatabase: TempVoiceDatabase = bot.temp_voice_db
         self.panel = None
         self.cleanup_task = None
     
     async def create_child_channel(self, *, parent_channel: discord.VoiceChannel, member: discord.Member) -> discord.VoiceChannel:
         """創建一個新的子頻道"""
-        parent_channel_info = await self.TempVoiceDatabase.get_parent_channel(parent_channel.id)
+        parent_channel_info = self.TempVoiceDatabase.get_registered_parent(parent_channel.id)
         if not parent_channel_info:
             return None
         
@@ -192,7 +192,7 @@ class TempVoice(commands.Cog):
         """監聽語音狀態更新事件"""
         # 處理用戶進入母頻道的情況
         if after.channel and before.channel != after.channel:
-            is_parent = await self.TempVoiceDatabase.is_parent_channel(after.channel.id)
+            is_parent = self.TempVoiceDatabase.is_parent_channel(after.channel.id)
             if is_parent:
                 try:
                     # 創建子頻道
@@ -211,16 +211,15 @@ class TempVoice(commands.Cog):
         
         # 處理用戶離開子頻道的情況
         if before.channel and after.channel != before.channel:
-            is_child = await self.TempVoiceDatabase.is_child_channel(before.channel.id)
-            if is_child:
+            child_info = self.TempVoiceDatabase.get_registered_child(before.channel.id)
+            if child_info:
                 # 檢查頻道是否為空
                 if len(before.channel.members) == 0:
                     # 頻道為空，刪除它
                     await self.delete_child_channel(before.channel)
                 else:
                     # 檢查擁有者是否離開了子頻道（而不是移動到其他頻道）
-                    child_info = await self.TempVoiceDatabase.get_child_channel(before.channel.id)
-                    if child_info and child_info['owner_id'] == member.id:
+                    if child_info['owner_id'] == member.id:
                         # 確保擁有者真的離開了，而不是斷線重連或其他原因
                         if not after.channel or after.channel.id != before.channel.id:
                             # 擁有者離開了且頻道不為空，發送繼承按鈕
@@ -274,7 +273,7 @@ class TempVoice(commands.Cog):
         """設置一個語音頻道為母頻道"""
         await interaction.response.defer(thinking=True,ephemeral=True)
         
-        is_parent = await self.TempVoiceDatabase.is_parent_channel(channel.id)
+        is_parent = self.TempVoiceDatabase.is_parent_channel(channel.id)
         
         # 檢查是否已經是母頻道
         if is_parent:
@@ -312,7 +311,7 @@ class TempVoice(commands.Cog):
         """移除一個母頻道"""
         await interaction.response.defer(thinking=True, ephemeral=True)
         
-        is_parent = await self.TempVoiceDatabase.is_parent_channel(channel.id)
+        is_parent = self.TempVoiceDatabase.is_parent_channel(channel.id)
         
         if not is_parent:
             await interaction.followup.send(f"{channel.mention} 不是一個母頻道", ephemeral=True)
@@ -448,7 +447,7 @@ class TempVoice(commands.Cog):
                 channel = interaction.user.voice.channel
             
             # 檢查是否為子頻道
-            is_child = await self.TempVoiceDatabase.is_child_channel(channel.id)
+            is_child = self.TempVoiceDatabase.is_child_channel(channel.id)
             if not is_child:
                 await interaction.followup.send("❌ 此頻道不是臨時語音頻道", ephemeral=True)
                 return
@@ -1622,13 +1621,5 @@ class TransferOwnershipSelect(discord.ui.Select):
 
 async def setup(bot):
     """載入擴充"""
-    # 設定資料庫路徑
-    db_path = os.getenv("VOICEDATABASE", "temp_voice.db")
-    
-    # 建立資料庫連接並初始化
-    db = TempVoiceDatabase(db_path)
-    await db.initdb()
-    
-    # 將 cog 添加到機器人
-    await bot.add_cog(TempVoice(bot, db_path))
+    await bot.add_cog(TempVoice(bot))
     log.info("TempVoice 擴充已載入")
\ No newline at end of file
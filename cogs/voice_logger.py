@@ -1,10 +1,14 @@
+import asyncio
 import json
 import logging
+from datetime import datetime
+from typing import Dict, List
 
 import discord
 from discord import app_commands, utils
 from discord.ext import commands
 
+from utils.OutboundScheduler import OutboundScheduler, Priority
 from utils.time_utils import now_with_unix
 
 with open("config.json", "r", encoding="utf-8") as fp:
@@ -12,12 +16,198 @@ with open("config.json", "r", encoding="utf-8") as fp:
 
 log = logging.getLogger(__name__)
 
+# 互為相反的狀態事件，同一視窗內先後發生會互相抵銷，不發送到日誌頻道
+_INVERSE_EVENTS = {
+    "self_mute": "self_unmute",
+    "self_unmute": "self_mute",
+    "server_mute": "server_unmute",
+    "server_unmute": "server_mute",
+    "self_deaf": "self_undeaf",
+    "self_undeaf": "self_deaf",
+    "server_deaf": "server_undeaf",
+    "server_undeaf": "server_deaf",
+    "stream_on": "stream_off",
+    "stream_off": "stream_on",
+    "video_on": "video_off",
+    "video_off": "video_on",
+}
+# 進出頻道事件，抵銷相反事件時不會跨過這些事件往前找
+_PRESENCE_EVENTS = {"join", "leave", "move"}
+
+# Discord 限制: 每則訊息最多 10 個 embed、所有 embed 合計 6000 字
+_MAX_EMBEDS_PER_MESSAGE = 10
+_MAX_MESSAGE_EMBED_CHARS = 6000
+_MAX_EMBED_DESCRIPTION = 2000
+
+
+class _VoiceLogEntry:
+    """等待發送的一筆語音日誌"""
+    __slots__ = ("member_id", "member_name", "avatar_url", "channel_id", "event_type", "text", "color", "time", "ts")
+
+    def __init__(self, member: discord.Member, channel_id: int, event_type: str, text: str,
+                 color: discord.Color | int, time: datetime, ts: int) -> None:
+        self.member_id = member.id
+        self.member_name = member.display_name
+        self.avatar_url = member.display_avatar.url
+        self.channel_id = channel_id
+        self.event_type = event_type
+        self.text = text
+        self.color = color
+        self.time = time
+        self.ts = ts
+
+
+class _VoiceLogBuffer:
+    """
+    依日誌頻道暫存語音日誌，合併後再發送。
+
+    第一筆事件進入後等待 flush_delay 秒 (或累積 max_pending 筆) 才發送，
+    同一成員的事件合併成一個多行 embed，每則訊息最多 10 個 embed。
+    視窗內互為相反的狀態事件 (例如靜音後又取消靜音) 會互相抵銷。
+    只影響日誌頻道的訊息，資料庫仍記錄每一筆原始事件。
+    """
+
+    def __init__(self, outbound: OutboundScheduler, flush_delay: float = 2.0, max_pending: int = 50) -> None:
+        self.outbound = outbound
+        self.flush_delay = flush_delay
+        self.max_pending = max_pending
+        self._pending: Dict[int, List[_VoiceLogEntry]] = {}
+        self._channels: Dict[int, discord.TextChannel] = {}
+        self._wake: Dict[int, asyncio.Event] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def add(self, log_channel: discord.TextChannel, entry: _VoiceLogEntry) -> None:
+        """加入一筆日誌，必要時排程發送"""
+        pending = self._pending.setdefault(log_channel.id, [])
+        self._channels[log_channel.id] = log_channel
+
+        inverse = _INVERSE_EVENTS.get(entry.event_type)
+        if inverse:
+            for index in range(len(pending) - 1, -1, -1):
+                previous = pending[index]
+                if previous.member_id != entry.member_id:
+                    continue
+                if previous.event_type in _PRESENCE_EVENTS:
+                    break
+                if previous.event_type == inverse and previous.channel_id == entry.channel_id:
+                    del pending[index]
+                    return
+        pending.append(entry)
+
+        if log_channel.id not in self._tasks:
+            self._wake[log_channel.id] = asyncio.Event()
+            self._tasks[log_channel.id] = asyncio.create_task(self._flush_later(log_channel.id))
+        if len(pending) >= self.max_pending:
+            self._wake[log_channel.id].set()
+
+    async def _flush_later(self, channel_id: int) -> None:
+        try:
+            await asyncio.wait_for(self._wake[channel_id].wait(), self.flush_delay)
+        except asyncio.TimeoutError:
+            pass
+        self._tasks.pop(channel_id, None)
+        self._wake.pop(channel_id, None)
+        await self.flush(channel_id)
+
+    async def flush(self, channel_id: int) -> None:
+        """立即發送指定日誌頻道暫存的所有日誌"""
+        entries = self._pending.pop(channel_id, None)
+        log_channel = self._channels.get(channel_id)
+        if not entries or log_channel is None:
+            return
+        # 交給發送排程依序發送，語音日誌的優先順序最低
+        dropped = 0
+        for embeds in self._pack_messages(self._build_embeds(entries)):
+            if self.outbound.submit(log_channel, embeds=embeds, priority=Priority.LOW):
+                continue
+            if not self.outbound.closing:
+                # 佇列已滿，依發送排程的丟棄策略捨棄
+                dropped += len(embeds)
+                continue
+            # 發送排程已關閉 (關機途中)，直接發送避免暫存的日誌遺失
+            try:
+                await log_channel.send(embeds=embeds)
+            except discord.HTTPException as e:
+                dropped += len(embeds)
+                log.warning(f"直接發送語音日誌到頻道 {channel_id} 失敗: {e}")
+        if dropped:
+            log.warning(f"丟棄 {dropped} 則送往頻道 {channel_id} 的語音日誌")
+
+    async def flush_all(self) -> None:
+        """停止所有排程並發送所有暫存的日誌"""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._wake.clear()
+        for channel_id in list(self._pending):
+            await self.flush(channel_id)
+
+    @staticmethod
+    def _build_embeds(entries: List[_VoiceLogEntry]) -> List[discord.Embed]:
+        """將同一成員的事件合併為多行 embed，保持成員第一次出現的順序"""
+        by_member: Dict[int, List[_VoiceLogEntry]] = {}
+        for entry in entries:
+            by_member.setdefault(entry.member_id, []).append(entry)
+
+        embeds: List[discord.Embed] = []
+        for items in by_member.values():
+            lines: List[str] = []
+            chunk: List[_VoiceLogEntry] = []
+            length = 0
+            for entry in items:
+                line = f"<t:{entry.ts}:T> {entry.text}"
+                if lines and length + len(line) + 1 > _MAX_EMBED_DESCRIPTION:
+                    embeds.append(_VoiceLogBuffer._make_embed(chunk, lines))
+                    lines, chunk, length = [], [], 0
+                lines.append(line)
+                chunk.append(entry)
+                length += len(line) + 1
+            if lines:
+                embeds.append(_VoiceLogBuffer._make_embed(chunk, lines))
+        return embeds
+
+    @staticmethod
+    def _make_embed(entries: List[_VoiceLogEntry], lines: List[str]) -> discord.Embed:
+        last = entries[-1]
+        embed = discord.Embed(
+            title="語音頻道紀錄",
+            description="\n".join(lines),
+            color=last.color,
+            timestamp=last.time
+        )
+        embed.set_author(name=last.member_name, icon_url=last.avatar_url)
+        return embed
+
+    @staticmethod
+    def _pack_messages(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+        """依 Discord 的數量與字數限制將 embed 分組成多則訊息"""
+        messages: List[List[discord.Embed]] = []
+        current: List[discord.Embed] = []
+        size = 0
+        for embed in embeds:
+            embed_size = len(embed)
+            if current and (len(current) >= _MAX_EMBEDS_PER_MESSAGE or size + embed_size > _MAX_MESSAGE_EMBED_CHARS):
+                messages.append(current)
+                current, size = [], 0
+            current.append(embed)
+            size += embed_size
+        if current:
+            messages.append(current)
+        return messages
+
+
 class _VoiceLoggerSendToChannel():
     def __init__(self, bot: commands.Bot,):
         self.bot = bot
         self.db_manager = bot.db_manager
         self.guild_id = cfg["guild_id"]
         self.timezone = cfg["timezone"]
+        voice_log_cfg = cfg.get("voice_log", {})
+        self.buffer = _VoiceLogBuffer(
+            bot.outbound,
+            flush_delay=voice_log_cfg.get("flush_delay", 2.0),
+            max_pending=voice_log_cfg.get("max_pending", 50),
+        )
         
     def get_event_description(self, event_type: str) -> str:
         """根據事件類型返回描述"""
@@ -64,55 +254,45 @@ class _VoiceLoggerSendToChannel():
         return colors.get(event_type, discord.Color.default())
     
     async def get_log_channel(self, guild_id: int) -> discord.TextChannel | None:
-        """獲取日誌頻道"""
-        settings = await self.bot.db_manager.get_settings(guild_id)
-        if not settings or not settings["voice_log_channel"]:
-            return None
-        
-        log_channel = self.bot.get_channel(settings["voice_log_channel"])
-        if not log_channel or not isinstance(log_channel, discord.TextChannel):
-            return None
-        
-        return log_channel
+        """獲取日誌頻道 (經由設定快取，不查詢資料庫)"""
+        return await self.bot.settings_cache.get_log_channel(guild_id, "voice_log_channel")
     
     async def send_voice_event(self, member: discord.Member, channel: discord.VoiceChannel, event_type: str) -> None:
+        """將語音事件放入日誌緩衝，稍後與其他事件合併發送"""
         try:
+            if not channel:
+                return
             log_channel = await self.get_log_channel(channel.guild.id)
             if not log_channel:
                 return
-            if not channel:
-                return
             
             now, ts = now_with_unix(self.timezone)
 
             if event_type in ["join", "leave"]:
-                embed = discord.Embed(
-                    title="語音頻道紀錄",
-                    description=f"{self.get_event_description(event_type)} {channel.mention}({channel.name})",
-                    color=self.get_embed_color(event_type),
-                    timestamp=now
-                )
-                embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
+                text = f"{self.get_event_description(event_type)} {channel.mention}({channel.name})"
             elif event_type in ["channel_create", "channel_delete"]:
-                embed = discord.Embed(
-                    title="語音頻道創建刪除紀錄",
-                    description=f"{self.get_event_description(event_type)} {channel.name}({channel.id})",
-                    color=self.get_embed_color(event_type),
-                    timestamp=now
-                )
-                embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
+                text = f"{self.get_event_description(event_type)} {channel.name}({channel.id})"
             else:
-                embed = discord.Embed(
-                    title="語音頻道紀錄",
-                    description=f"在{channel.mention}({channel.name})中{self.get_event_description(event_type)}",
-                    color=self.get_embed_color(event_type),
-                    timestamp=now
-                )
-                embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
+                text = f"在{channel.mention}({channel.name})中{self.get_event_description(event_type)}"
         
-            await log_channel.send(embed=embed)
+            self.buffer.add(
+                log_channel,
+                _VoiceLogEntry(member, channel.id, event_type, text, self.get_embed_color(event_type), now, ts),
+            )
         except Exception as _:
             log.exception(f"發送語音事件到頻道時發生錯誤: {member.name} ({member.id}) 在 {channel.name} ({channel.id})")
+
+    async def send_move_event(self, member: discord.Member, before: discord.VoiceChannel, after: discord.VoiceChannel) -> None:
+        """將切換語音頻道事件放入日誌緩衝"""
+        log_channel = await self.get_log_channel(member.guild.id)
+        if not log_channel:
+            return
+        now, ts = now_with_unix(self.timezone)
+        text = f"從{before.mention}({before.name}) 移動到到 {after.mention}({after.name})"
+        self.buffer.add(
+            log_channel,
+            _VoiceLogEntry(member, after.id, "move", text, discord.Color.blue(), now, ts),
+        )
                  
 
 class VoiceLogger(commands.Cog):
@@ -122,6 +302,11 @@ class VoiceLogger(commands.Cog):
         self.guild_id = cfg["guild_id"]
         self.timezone = cfg["timezone"]
         self._voice_sender = _VoiceLoggerSendToChannel(bot)
+        self._sessions_backfilled = False
+
+    async def cog_unload(self) -> None:
+        """卸載時送出所有暫存的日誌"""
+        await self._voice_sender.buffer.flush_all()
         
     async def log_voice_event(self, member: discord.Member, channel: discord.VoiceChannel, event_type: str) -> None:
         """紀錄語音事件到資料庫"""
@@ -137,6 +322,52 @@ class VoiceLogger(commands.Cog):
             )
         except Exception as _:
             log.exception(f"記錄語音事件時發生錯誤: {member.name} ({member.id}) 在 {channel.name} ({channel.id})")
+
+    async def track_voice_session(self, member: discord.Member, channel: discord.VoiceChannel | None) -> None:
+        """
+        更新語音停留紀錄。
+        channel 為新加入的頻道，None 代表離開語音。
+        """
+        now, ts = now_with_unix(self.timezone)
+        try:
+            if channel is None:
+                await self.db_manager.close_voice_session(guild_id=member.guild.id, user_id=member.id, timestamp=ts)
+            else:
+                await self.db_manager.open_voice_session(
+                    guild_id=member.guild.id, user_id=member.id, channel_id=channel.id, timestamp=ts
+                )
+        except Exception as _:
+            log.exception(f"更新語音停留紀錄時發生錯誤: {member.name} ({member.id})")
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        """
+        連線就緒時修復語音停留紀錄。
+        機器人離線期間的進出無法得知，以目前的語音狀態為準。
+        """
+        if not self._sessions_backfilled:
+            self._sessions_backfilled = True
+            try:
+                if await self.db_manager.voice_sessions_need_backfill():
+                    log.info("voice_sessions 尚無資料，開始從 voice_logs 重建")
+                    await self.db_manager.rebuild_voice_sessions()
+            except Exception as _:
+                log.exception("重建語音停留紀錄時發生錯誤")
+
+        now, ts = now_with_unix(self.timezone)
+        for guild in self.bot.guilds:
+            voice_members = {
+                member.id: channel.id
+                for channel in (*guild.voice_channels, *guild.stage_channels)
+                for member in channel.members
+                if not member.bot
+            }
+            try:
+                await self.db_manager.repair_open_voice_sessions(
+                    guild_id=guild.id, voice_members=voice_members, timestamp=ts
+                )
+            except Exception as _:
+                log.exception(f"修復語音停留紀錄時發生錯誤: {guild.name} ({guild.id})")
             
 
     @commands.Cog.listener()
@@ -158,12 +389,14 @@ class VoiceLogger(commands.Cog):
         # 加入語音頻道
         if before.channel is None and after.channel is not None:
             await self.log_voice_event(member, after.channel, "join")
+            await self.track_voice_session(member, after.channel)
             await self._voice_sender.send_voice_event(
                 member, after.channel, "join"
             )
         # 離開語音頻道
         elif before.channel is not None and after.channel is None:
             await self.log_voice_event(member, before.channel, "leave")
+            await self.track_voice_session(member, None)
             await self._voice_sender.send_voice_event(
                 member, before.channel, "leave"
             )
@@ -171,16 +404,8 @@ class VoiceLogger(commands.Cog):
         elif before.channel and after.channel and before.channel.id != after.channel.id:
             await self.log_voice_event(member, before.channel, "leave")
             await self.log_voice_event(member, after.channel, "join")
-            log_channel = await self._voice_sender.get_log_channel(member.guild.id)
-            if log_channel:
-                embed = discord.Embed(
-                    title="語音頻道紀錄",
-                    description=f"從{before.channel.mention}({before.channel.name}) 移動到到 {after.channel.mention}({after.channel.name})",
-                    color=discord.Color.blue(),
-                    timestamp=now
-                )
-                embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
-                await log_channel.send(embed=embed)
+            await self.track_voice_session(member, after.channel)
+            await self._voice_sender.send_move_event(member, before.channel, after.channel)
         # 靜音
         if before.self_mute != after.self_mute:
             if after.self_mute:
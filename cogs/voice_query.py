@@ -0,0 +1,189 @@
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from utils.Paginator import Paginator
+from utils.TimeFormat import date_format, format_seconds, parse_datetime_string
+from utils.time_utils import now_with_unix
+
+with open("config.json", "r", encoding="utf-8") as fp:
+    cfg = json.load(fp)
+
+log = logging.getLogger(__name__)
+
+# Discord 對單一 embed 的限制：每個欄位最多 1024 字、最多 25 個欄位，全部文字合計最多 6000 字
+_FIELD_LINES = 10
+_MAX_FIELDS = 25
+_MAX_EMBED_CHARS = 6000
+
+
+def build_presence_embeds(title: str, total: int, channels: List[Tuple[str, List[str]]]) -> List[discord.Embed]:
+    """
+    將各語音頻道中的成員列表組成分頁的 embed。
+    參數:
+        title: 每頁的標題
+        total: 成員總數 (顯示在第一頁)
+        channels: (頻道名稱, 成員行列表) 列表
+    回傳:
+        embed 列表，每一頁都不超過 Discord 的欄位數與字數限制。
+    """
+    embeds: List[discord.Embed] = []
+    embed = discord.Embed(title=title, description=f"共 {total} 人", color=discord.Color.blue())
+    for name, lines in channels:
+        field_name = f"🔊 {name}"[:256]
+        for i in range(0, len(lines), _FIELD_LINES):
+            value = "\n".join(lines[i:i + _FIELD_LINES])
+            if embed.fields and (
+                len(embed.fields) >= _MAX_FIELDS
+                or len(embed) + len(field_name) + len(value) > _MAX_EMBED_CHARS
+            ):
+                embeds.append(embed)
+                embed = discord.Embed(title=title, color=discord.Color.blue())
+            embed.add_field(name=field_name, value=value, inline=False)
+    embeds.append(embed)
+    return embeds
+
+
+class VoiceQuery(commands.Cog):
+    """查詢成員於指定時間是否在語音頻道中"""
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.db_manager = bot.db_manager
+        self.timezone = cfg["timezone"]
+
+    @app_commands.command(name="voice_at", description="查詢指定時間在語音頻道中的成員")
+    @app_commands.describe(
+        time="時間，格式 YYYY-MM-DD HH:MM[:SS]",
+        channel="只查詢指定語音頻道 (可選)",
+    )
+    @app_commands.checks.has_permissions(manage_messages=True)
+    async def voice_at(
+        self,
+        interaction: discord.Interaction,
+        time: str,
+        channel: Optional[discord.VoiceChannel] = None,
+    ):
+        """ 查詢指定時間點在語音中的成員 """
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        try:
+            ts = parse_datetime_string(time, self.timezone)
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+
+        try:
+            rows = await self.db_manager.get_voice_presence_at(
+                guild_id=interaction.guild_id,
+                timestamp=ts,
+                channel_id=channel.id if channel else None,
+            )
+        except Exception as e:
+            log.exception("查詢語音紀錄時發生錯誤")
+            await interaction.followup.send(f"❌ 查詢失敗：{e}", ephemeral=True)
+            return
+
+        title = f"{date_format(ts)} 在語音頻道中的成員"
+        if not rows:
+            embed = discord.Embed(title=title, description="沒有成員在語音頻道中", color=discord.Color.green())
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+
+        by_channel: Dict[int, List[str]] = {}
+        for row in rows:
+            end = f"<t:{row['end_time']}:T>" if row["end_time"] is not None else "現在"
+            by_channel.setdefault(row["channel_id"], []).append(
+                f"<@{row['user_id']}> <t:{row['start_time']}:T> ~ {end}"
+            )
+
+        channels = []
+        for channel_id, lines in by_channel.items():
+            found = interaction.guild.get_channel(channel_id)
+            channels.append((found.name if found else f"已刪除頻道 ({channel_id})", lines))
+        embeds = build_presence_embeds(title, len(rows), channels)
+
+        if len(embeds) == 1:
+            await interaction.followup.send(embed=embeds[0], ephemeral=True)
+            return
+        paginator = Paginator(embeds)
+        msg = await interaction.followup.send(embed=embeds[0], view=paginator, ephemeral=True)
+        paginator.message = msg
+
+    @app_commands.command(name="voice_check", description="查詢成員在指定時間區間內是否在語音頻道中")
+    @app_commands.describe(
+        user="要查詢的成員",
+        start="開始時間，格式 YYYY-MM-DD HH:MM[:SS]",
+        end="結束時間，格式同上 (預設為現在)",
+    )
+    @app_commands.checks.has_permissions(manage_messages=True)
+    async def voice_check(
+        self,
+        interaction: discord.Interaction,
+        user: discord.Member,
+        start: str,
+        end: Optional[str] = None,
+    ):
+        """ 查詢成員在時間區間內的語音紀錄 """
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        now, now_ts = now_with_unix(self.timezone)
+        try:
+            start_ts = parse_datetime_string(start, self.timezone)
+            end_ts = parse_datetime_string(end, self.timezone) if end else now_ts
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        if end_ts <= start_ts:
+            await interaction.followup.send("❌ 結束時間必須晚於開始時間", ephemeral=True)
+            return
+
+        try:
+            sessions = await self.db_manager.get_user_voice_sessions_between(
+                guild_id=interaction.guild_id,
+                user_id=user.id,
+                start_ts=start_ts,
+                end_ts=end_ts,
+            )
+        except Exception as e:
+            log.exception("查詢語音紀錄時發生錯誤")
+            await interaction.followup.send(f"❌ 查詢失敗：{e}", ephemeral=True)
+            return
+
+        title = f"{user.display_name} 於 {date_format(start_ts)} ~ {date_format(end_ts)}"
+        if not sessions:
+            embed = discord.Embed(title=title, description="此期間不在語音頻道中", color=discord.Color.red(), timestamp=now)
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+
+        # 計算與查詢區間重疊的總時長
+        total = 0
+        lines = []
+        for row in sessions:
+            session_end = row["end_time"] if row["end_time"] is not None else now_ts
+            total += max(0, min(session_end, end_ts) - max(row["start_time"], start_ts))
+            end_str = f"<t:{row['end_time']}:f>" if row["end_time"] is not None else "現在"
+            lines.append(f"<#{row['channel_id']}> <t:{row['start_time']}:f> ~ {end_str}")
+
+        embeds: List[discord.Embed] = []
+        for i in range(0, len(lines), 15):
+            embed = discord.Embed(
+                title=title,
+                description=f"在語音中共 {format_seconds(total)}\n\n" + "\n".join(lines[i:i + 15]),
+                color=discord.Color.green(),
+                timestamp=now,
+            )
+            embeds.append(embed)
+
+        if len(embeds) == 1:
+            await interaction.followup.send(embed=embeds[0], ephemeral=True)
+            return
+        paginator = Paginator(embeds)
+        msg = await interaction.followup.send(embed=embeds[0], view=paginator, ephemeral=True)
+        paginator.message = msg
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(VoiceQuery(bot))
+    log.info("VoiceQuery 擴充已載入")
@@ -6,7 +6,7 @@ import discord
 from discord import app_commands, utils
 from discord.ext import commands
 
-from utils.Paginator import Paginator
+from utils.Paginator import KeysetPageSource, LazyPaginator
 from utils.time_utils import now_with_unix
 from zoneinfo import ZoneInfo
 from datetime import datetime
@@ -121,15 +121,37 @@ class Warn(commands.Cog):
 
         # 擷取資料
         since = ts - 30 * 24 * 3600 if recently else None
-        records = await self.db.list_punishments(
+        filters = dict(
             guild_id=interaction.guild_id,
             user_id=user.id,
             ptype="warn",
             start_ts=since,
-            limit=None if recently else 100,
         )
+        title = (
+            f"{user.display_name}({user.id}) "
+            + ("最近30天的警告紀錄" if recently else "的全部警告紀錄")
+        )
+
+        def render(records, page: int) -> discord.Embed:
+            emb = discord.Embed(title=title, colour=discord.Colour.orange(), timestamp=now)
+            for r in records:
+                dt = datetime.fromtimestamp(r["punished_at"], ZoneInfo(self.timezone))
+                time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
+                reason = utils.escape_markdown(r["reason"] or "(無原因)")
+                emb.add_field(name=time_str, value=reason, inline=False)
+            return emb
+
+        # 分頁來源（每頁最多 5 項），翻頁時才查詢下一頁
+        source = KeysetPageSource(
+            lambda after, limit: self.db.list_punishments(**filters, before=after, limit=limit),
+            key=lambda r: (r["punished_at"], r["punish_id"]),
+            per_page=5,
+            count=lambda: self.db.count_punishments(**filters),
+        )
+        paginator = LazyPaginator(source, render)
+        first = await paginator.first_page()
 
-        if not records:
+        if first is None:
             embed = discord.Embed(
                 description="沒有警告紀錄",
                 colour=discord.Colour.green(),
@@ -137,27 +159,8 @@ class Warn(commands.Cog):
             )
             return await interaction.followup.send(embed=embed, ephemeral=True)
 
-        # 建立多個分頁 embed（每頁最多 5 項）
-        embeds: List[discord.Embed] = []
-        page_size = 5
-        for i in range(0, len(records), page_size):
-            chunk = records[i : i + page_size]
-            title = (
-                f"{user.display_name}({user.id}) "
-                + ("最近30天的警告紀錄" if recently else "的全部警告紀錄")
-            )
-            emb = discord.Embed(title=title, colour=discord.Colour.orange(), timestamp=now)
-            for r in chunk:
-                dt = datetime.fromtimestamp(r["punished_at"], ZoneInfo(self.timezone))
-                time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-                reason = utils.escape_markdown(r["reason"] or "(無原因)")
-                emb.add_field(name=time_str, value=reason, inline=False)
-            embeds.append(emb)
-
-        # 啟動分頁 View
-        paginator = Paginator(embeds)
         # 存下 message 以供 on_timeout 編輯
-        msg = await interaction.followup.send(embed=embeds[0], view=paginator, ephemeral=True)
+        msg = await interaction.followup.send(embed=first, view=paginator, ephemeral=True)
         paginator.message = msg  # type: ignore
 
 
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# 各模組在匯入時讀取工作目錄下的 config.json
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
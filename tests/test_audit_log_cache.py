@@ -0,0 +1,48 @@
+import asyncio
+
+import discord
+
+from utils.AuditLogCache import AuditLogCache
+
+
+class _Guild:
+    id = 1
+    name = "test"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def audit_logs(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return
+        yield
+
+
+def test_miss_without_retry_fetches_once():
+    async def scenario():
+        cache = AuditLogCache(retry_delay=0.01)
+        guild = _Guild()
+        # 成員自行離開 (不是被踢出) 只拉取一次，不重試
+        assert await cache.lookup(guild, 10, discord.AuditLogAction.kick) is None
+        assert guild.calls == 1
+
+        # 多位成員同時離開，共用進行中的拉取
+        guild.calls = 0
+        results = await asyncio.gather(*(
+            cache.lookup(guild, user_id, discord.AuditLogAction.kick) for user_id in range(20)
+        ))
+        assert results == [None] * 20
+        assert guild.calls <= 2
+
+    asyncio.run(scenario())
+
+
+def test_miss_with_retry_fetches_again():
+    async def scenario():
+        cache = AuditLogCache(retry_delay=0.01)
+        guild = _Guild()
+        assert await cache.lookup(guild, 10, discord.AuditLogAction.ban, retry=True) is None
+        assert guild.calls == 2
+
+    asyncio.run(scenario())
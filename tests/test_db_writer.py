@@ -0,0 +1,97 @@
+import asyncio
+
+from utils.DBEngine import DBEngine
+from utils.DBManager import DBManager
+
+
+async def _open(tmp_path, **kwargs) -> DBManager:
+    engine = DBEngine(str(tmp_path / "bot.db"), read_pool_size=0)
+    manager = DBManager(engine, flush_interval=0.01, **kwargs)
+    await engine.init_schema()
+    return manager
+
+
+async def _count(manager: DBManager, table: str) -> int:
+    async with manager.engine.transaction() as conn:
+        cursor = await conn.execute(f"SELECT COUNT(*) FROM {table}")
+        return (await cursor.fetchone())[0]
+
+
+def test_bad_row_moves_to_dead_letter(tmp_path):
+    async def scenario():
+        manager = await _open(tmp_path, max_retries=2)
+        await manager.add_event(1, "member_join", 100, user_id=10)
+        # event_type 為 NOT NULL，這一列永遠無法寫入
+        await manager.add_event(1, None, 101, user_id=11)
+        await manager.add_event(1, "member_leave", 102, user_id=12)
+
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if manager.queue_depth == 0:
+                break
+        stats = manager.get_writer_stats()
+        assert manager.queue_depth == 0
+        assert stats["dead_letters"] == 1
+        assert stats["consecutive_failures"] == 0
+        assert await _count(manager, "server_events") == 2
+        assert await _count(manager, "write_dead_letter") == 1
+
+        # 之後的寫入不受影響
+        await manager.add_event(1, "member_join", 103, user_id=13)
+        await manager.flush()
+        assert await _count(manager, "server_events") == 3
+        await manager.engine.close()
+
+    asyncio.run(scenario())
+
+
+def test_pending_queue_is_capped(tmp_path):
+    async def scenario():
+        manager = await _open(tmp_path, max_pending=2)
+        manager.flush_interval = 60.0
+        for i in range(5):
+            await manager.add_event(1, "member_join", 100 + i, user_id=i)
+        assert manager.queue_depth == 2
+        assert manager.get_writer_stats()["dropped_rows"] == 3
+        await manager.engine.close()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_keeps_sessions_and_skips_rollups(tmp_path):
+    async def scenario():
+        manager = await _open(tmp_path, max_pending=1)
+        manager.flush_interval = 60.0
+        await manager.add_event(1, "member_join", 3600, user_id=1)
+        # 緩衝已滿：事件被丟棄且不計入統計，語音停留紀錄的結束/開始仍成對保留
+        await manager.add_event(1, "member_join", 3601, user_id=2)
+        await manager.open_voice_session(guild_id=1, user_id=3, channel_id=5, timestamp=3602)
+        assert manager.queue_depth == 3
+        await manager.flush()
+        async with manager.engine.transaction() as conn:
+            cursor = await conn.execute("SELECT value FROM activity_rollup_hourly WHERE metric = 'event:member_join'")
+            assert [row[0] for row in await cursor.fetchall()] == [1]
+        assert await _count(manager, "voice_sessions") == 1
+        await manager.engine.close()
+
+    asyncio.run(scenario())
+
+
+def test_dead_letter_rows_are_not_counted_in_rollups(tmp_path):
+    async def scenario():
+        manager = await _open(tmp_path)
+        await manager.add_punishment(
+            guild_id=1, user_id=10, punished_at=3600, ptype="warn", reason=None, admin_id=2
+        )
+        # admin_id 為 NOT NULL，這一列會移到 write_dead_letter
+        await manager.add_punishment(
+            guild_id=1, user_id=11, punished_at=3601, ptype="warn", reason=None, admin_id=None
+        )
+        await manager._flush(events=True, activity=True, isolate=True)
+        assert await _count(manager, "write_dead_letter") == 1
+        async with manager.engine.transaction() as conn:
+            cursor = await conn.execute("SELECT value FROM activity_rollup_hourly WHERE metric = 'punish:warn'")
+            assert [row[0] for row in await cursor.fetchall()] == [1]
+        await manager.engine.close()
+
+    asyncio.run(scenario())
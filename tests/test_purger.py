@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.Purger import collect_messages
+
+
+class FakeChannel:
+    """訊息 ID 即為時間順序，history 與 discord.py 相同由新到舊產生 (after, before) 之間的訊息"""
+
+    def __init__(self, authors):
+        self.messages = [
+            SimpleNamespace(id=index + 1, author=SimpleNamespace(id=author)) for index, author in enumerate(authors)
+        ]
+
+    async def history(self, *, limit, before=None, after=None, oldest_first=False):
+        count = 0
+        for message in reversed(self.messages):
+            if before is not None and message.id >= before.id:
+                continue
+            if after is not None and message.id <= after.id:
+                break
+            if limit is not None and count >= limit:
+                break
+            count += 1
+            yield message
+
+
+def _collect(channel, **kwargs):
+    return asyncio.run(collect_messages(channel, **kwargs))
+
+
+def test_range_exhausted_when_target_reached():
+    channel = FakeChannel([1, 2] * 10)
+    messages, exhausted = _collect(channel, limit=100, users={1}, after=channel.messages[4], scan_limit=50)
+    assert exhausted
+    assert [m.id for m in messages] == [19, 17, 15, 13, 11, 9, 7]
+
+
+def test_scan_limit_is_not_exhausted():
+    # 目標訊息之後有 30 則，只掃描 10 則就停止，不能把目標訊息一併刪除
+    channel = FakeChannel([2] * 30 + [1])
+    messages, exhausted = _collect(channel, limit=100, users={1}, after=channel.messages[0], scan_limit=10)
+    assert not exhausted
+    assert [m.id for m in messages] == [31]
+
+
+def test_limit_reached_is_not_exhausted():
+    channel = FakeChannel([1] * 10)
+    messages, exhausted = _collect(channel, limit=3, after=channel.messages[0])
+    assert not exhausted
+    assert len(messages) == 3
@@ -0,0 +1,57 @@
+import asyncio
+
+from utils.SettingsCache import SettingsCache
+
+
+class _DBManager:
+    def __init__(self):
+        self.settings = {}
+        self.gate = None
+
+    def add_settings_listener(self, listener):
+        pass
+
+    async def get_settings(self, guild_id):
+        # 先讀取資料再等待，模擬查詢完成前設定已被修改
+        row = self.settings.get(guild_id)
+        if self.gate is not None:
+            await self.gate.wait()
+        return row
+
+
+class _Bot:
+    def __init__(self):
+        self.db_manager = _DBManager()
+
+    def get_channel(self, channel_id):
+        return None
+
+
+def _stale_load(invalidate_guild):
+    async def scenario():
+        bot = _Bot()
+        cache = SettingsCache(bot)
+        bot.db_manager.gate = asyncio.Event()
+        lookup = asyncio.create_task(cache.get_log_channel(1, "message_log_channel"))
+        await asyncio.sleep(0)
+        # 載入途中設定被修改並清除快取，舊的結果不可寫回
+        bot.db_manager.settings[1] = {"message_log_channel": 123}
+        cache.invalidate(1 if invalidate_guild else None)
+        bot.db_manager.gate.set()
+        assert await lookup is None
+        bot.db_manager.gate = None
+        return cache
+
+    return asyncio.run(scenario())
+
+
+def test_guild_invalidation_during_load_is_not_cached():
+    cache = _stale_load(invalidate_guild=True)
+    assert cache._settings == {}
+    assert cache._channels == {}
+
+
+def test_global_invalidation_during_first_load_is_not_cached():
+    cache = _stale_load(invalidate_guild=False)
+    assert cache._settings == {}
+    assert cache._channels == {}
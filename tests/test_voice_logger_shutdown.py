@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from bot import Bot
+from cogs.voice_logger import _VoiceLogEntry
+
+
+class FakeChannel:
+    """只記錄送出內容的日誌頻道"""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, content=None, *, embeds=None, **kwargs):
+        self.sent.append(embeds or [])
+
+
+def _entry(member_id: int) -> _VoiceLogEntry:
+    member = SimpleNamespace(id=member_id, display_name=f"member-{member_id}",
+                             display_avatar=SimpleNamespace(url="https://example.com/a.png"))
+    now = discord.utils.utcnow()
+    return _VoiceLogEntry(member, 10, "join", "加入語音頻道", 0x00ff00, now, int(now.timestamp()))
+
+
+@pytest.fixture
+def bot_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("database", str(tmp_path / "bot.db"))
+    monkeypatch.setenv("VOICEDATABASE", str(tmp_path / "temp_voice.db"))
+
+
+async def _start_bot() -> Bot:
+    bot = Bot()
+    await bot.__aenter__()
+    await bot.db_engine.init_schema()
+    await bot.load_extension("cogs.voice_logger")
+    return bot
+
+
+def test_close_sends_buffered_voice_logs(bot_env):
+    async def scenario():
+        bot = await _start_bot()
+        channel = FakeChannel(1)
+        buffer = bot.get_cog("VoiceLogger")._voice_sender.buffer
+        buffer.add(channel, _entry(100))
+        buffer.add(channel, _entry(200))
+
+        # 與正常關機相同的順序：Bot.close 卸載擴充、送出佇列、中斷連線
+        await bot.close()
+
+        assert bot.outbound.get_stats()["dropped"] == 0
+        assert sum(len(embeds) for embeds in channel.sent) == 2
+
+    asyncio.run(scenario())
+
+
+def test_flush_after_scheduler_closed_sends_directly(bot_env):
+    async def scenario():
+        bot = await _start_bot()
+        channel = FakeChannel(1)
+        buffer = bot.get_cog("VoiceLogger")._voice_sender.buffer
+        buffer.add(channel, _entry(100))
+
+        await bot.outbound.close()
+        await buffer.flush_all()
+
+        assert sum(len(embeds) for embeds in channel.sent) == 1
+        await bot.close()
+
+    asyncio.run(scenario())
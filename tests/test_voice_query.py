@@ -0,0 +1,27 @@
+from cogs.voice_query import build_presence_embeds
+
+
+def _lines(count: int):
+    return [
+        f"<@{100000000000000000 + i}> <t:1700000000:T> ~ <t:1700003600:T>"
+        for i in range(count)
+    ]
+
+
+def test_presence_embeds_stay_within_discord_limits():
+    channels = [("大廳", _lines(300)), ("x" * 100, _lines(45))]
+    embeds = build_presence_embeds("2024-01-01 12:00:00 在語音頻道中的成員", 345, channels)
+
+    assert len(embeds) > 1
+    for embed in embeds:
+        assert len(embed) <= 6000
+        assert len(embed.fields) <= 25
+        assert all(len(field.value) <= 1024 and len(field.name) <= 256 for field in embed.fields)
+    listed = sum(field.value.count("\n") + 1 for embed in embeds for field in embed.fields)
+    assert listed == 345
+
+
+def test_small_result_is_one_page():
+    embeds = build_presence_embeds("標題", 3, [("大廳", _lines(3))])
+    assert len(embeds) == 1
+    assert embeds[0].description == "共 3 人"
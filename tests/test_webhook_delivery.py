@@ -0,0 +1,78 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from utils.WebhookDelivery import WebhookDelivery
+
+
+def _http_error(status: int, cls=discord.HTTPException) -> discord.HTTPException:
+    response = SimpleNamespace(status=status, reason="error")
+    return cls(response, "error")
+
+
+class FakeWebhook:
+    def __init__(self, error: Exception):
+        self.error = error
+        self.calls = 0
+
+    async def send(self, **kwargs):
+        self.calls += 1
+        if kwargs.get("file") is not None:
+            kwargs["file"].fp.read()
+        raise self.error
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, **kwargs):
+        file = kwargs.get("file")
+        self.sent.append((kwargs, file.fp.read() if file is not None else None))
+
+
+def _delivery(channel: FakeChannel, webhook: FakeWebhook) -> WebhookDelivery:
+    bot = SimpleNamespace(user=None)
+    delivery = WebhookDelivery(bot)
+    delivery._webhooks[channel.id] = webhook
+    return delivery
+
+
+@pytest.mark.parametrize("status", [400, 429, 500, 503])
+def test_http_error_falls_back_to_channel(status):
+    async def scenario():
+        channel = FakeChannel(1)
+        webhook = FakeWebhook(_http_error(status))
+        delivery = _delivery(channel, webhook)
+        file = discord.File(io.BytesIO(b"transcript"), filename="log.txt")
+
+        await delivery.send(channel, embeds=[discord.Embed(title="x")], file=file)
+
+        assert webhook.calls == 1
+        assert len(channel.sent) == 1
+        # 檔案已被 webhook 讀取過，改用一般訊息時必須從頭送出
+        assert channel.sent[0][1] == b"transcript"
+        stats = delivery.get_stats()
+        assert stats["webhook_errors"] == 1
+        assert stats["fallback_sends"] == 1
+        # 暫時性的錯誤不丟棄 webhook
+        assert stats["webhooks"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_not_found_drops_cached_webhook():
+    async def scenario():
+        channel = FakeChannel(1)
+        delivery = _delivery(channel, FakeWebhook(_http_error(404, discord.NotFound)))
+
+        await delivery.send(channel, embeds=[discord.Embed(title="x")])
+
+        assert len(channel.sent) == 1
+        assert delivery.get_stats()["webhooks"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import discord
+
+log = logging.getLogger(__name__)
+
+# (guild_id, 審核日誌動作)
+_Key = Tuple[int, discord.AuditLogAction]
+
+
+class AuditLogCache:
+    """
+    審核日誌查詢快取。
+
+    成員被踢出/封禁/解除封禁的事件不包含執行者與原因，需要查詢審核日誌。
+    大量踢出或封禁時，每個事件各自呼叫一次 API 既浪費請求額度，也容易因為審核日誌尚未寫入而漏掉。
+
+    此快取以 (伺服器, 動作) 為單位拉取最近的審核日誌，並以目標 ID 建立索引：
+    - 同一時間等待同一伺服器、同一動作的查詢共用同一次拉取
+    - 每次只拉取上次看到的最新一筆之後的紀錄 (最多回溯 max_age 秒)
+    - 呼叫端確定應有紀錄時 (例如封禁、解除封禁) 可指定 retry，找不到時等待 retry_delay 秒後再拉取一次，
+      涵蓋審核日誌比事件晚寫入的情況；成員離開時大多不是被踢出，不應重試
+    """
+
+    def __init__(self, *, max_age: float = 120.0, retry_delay: float = 1.0, initial_limit: int = 50):
+        """
+        參數:
+            max_age: 快取保留的審核日誌時間範圍 (秒)，應大於查詢使用的時間窗口。
+            retry_delay: 指定 retry 的查詢第一次找不到時，再次拉取前等待的秒數，0 代表不重試。
+            initial_limit: 第一次拉取 (尚未看過任何紀錄) 時取得的筆數。
+        """
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.initial_limit = initial_limit
+        # 目標 ID -> 最新一筆審核日誌
+        self._entries: Dict[_Key, Dict[int, discord.AuditLogEntry]] = {}
+        self._last_id: Dict[_Key, int] = {}
+        # 最近一次「已完成」與「進行中」拉取的開始時間
+        self._fetched_at: Dict[_Key, float] = {}
+        self._inflight: Dict[_Key, Tuple[float, asyncio.Task]] = {}
+        self._stats = {"lookups": 0, "hits": 0, "fetches": 0, "shared_waits": 0}
+
+    async def lookup(
+        self,
+        guild: discord.Guild,
+        target_id: int,
+        action: discord.AuditLogAction,
+        *,
+        time_window: float = 15,
+        retry: bool = False,
+    ) -> Optional[discord.AuditLogEntry]:
+        """
+        查詢 time_window 秒內對 target_id 執行 action 的審核日誌。
+        參數:
+            retry: 找不到時是否等待 retry_delay 秒後再拉取一次 (只在確定應有紀錄時使用)。
+        回傳:
+            符合的審核日誌，找不到或沒有權限時為 None。
+        """
+        self._stats["lookups"] += 1
+        key = (guild.id, action)
+        requested = time.time()
+        since = requested - time_window
+
+        await self._refresh(guild, action, requested)
+        entry = self._find(key, target_id, since)
+        if entry is None and retry and self.retry_delay > 0:
+            await asyncio.sleep(self.retry_delay)
+            await self._refresh(guild, action, requested + self.retry_delay)
+            entry = self._find(key, target_id, since)
+        if entry is not None:
+            self._stats["hits"] += 1
+        return entry
+
+    def _find(self, key: _Key, target_id: int, since: float) -> Optional[discord.AuditLogEntry]:
+        entry = self._entries.get(key, {}).get(target_id)
+        if entry is not None and entry.created_at.timestamp() >= since:
+            return entry
+        return None
+
+    async def _refresh(self, guild: discord.Guild, action: discord.AuditLogAction, not_before: float) -> None:
+        """確保有一次在 not_before 之後開始的拉取已完成，進行中的拉取由所有等待者共用。"""
+        key = (guild.id, action)
+        while self._fetched_at.get(key, 0.0) < not_before:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                started = time.time()
+                task = asyncio.create_task(self._fetch(guild, action, started))
+                inflight = (started, task)
+                self._inflight[key] = inflight
+            else:
+                self._stats["shared_waits"] += 1
+            # 若這次拉取在 not_before 之前就已開始，可能不包含該事件，迴圈會再拉取一次
+            await asyncio.shield(inflight[1])
+
+    async def _fetch(self, guild: discord.Guild, action: discord.AuditLogAction, started: float) -> None:
+        key = (guild.id, action)
+        self._stats["fetches"] += 1
+        try:
+            entries = self._entries.setdefault(key, {})
+            last_id = self._last_id.get(key)
+            oldest = datetime.fromtimestamp(started - self.max_age, tz=timezone.utc)
+            if last_id is None:
+                iterator = guild.audit_logs(limit=self.initial_limit, action=action)
+            else:
+                after = max(last_id, discord.utils.time_snowflake(oldest))
+                iterator = guild.audit_logs(limit=None, action=action, after=discord.Object(id=after))
+            async for entry in iterator:
+                target_id = self._target_id(entry)
+                if target_id is None:
+                    log.debug(f"無法從審核日誌條目中提取目標ID，類型: {type(entry.target)}")
+                elif target_id not in entries or entries[target_id].id < entry.id:
+                    entries[target_id] = entry
+                if last_id is None or entry.id > last_id:
+                    last_id = entry.id
+            if last_id is not None:
+                self._last_id[key] = last_id
+            # 移除超過保留時間的紀錄
+            for target_id in [t for t, e in entries.items() if e.created_at < oldest]:
+                del entries[target_id]
+        except discord.Forbidden:
+            log.error(f"無法存取 {guild.name} 的審核日誌。請檢查機器人權限。")
+        except Exception as e:
+            log.error(f"在檢查 {guild.name} 的審核日誌時發生錯誤: {e}", exc_info=True)
+        finally:
+            # 失敗時也視為已拉取，避免等待者不斷重試
+            self._fetched_at[key] = max(self._fetched_at.get(key, 0.0), started)
+            if self._inflight.get(key, (None,))[0] == started:
+                del self._inflight[key]
+
+    @staticmethod
+    def _target_id(entry: discord.AuditLogEntry) -> Optional[int]:
+        """獲取目標ID的通用方法"""
+        if isinstance(entry.target, (discord.Member, discord.User)):
+            return entry.target.id
+        if isinstance(entry.target, int):
+            return entry.target
+        # 嘗試從對象獲取ID
+        return getattr(entry.target, "id", None)
+
+    def invalidate(self, guild_id: int) -> None:
+        """離開伺服器時清除該伺服器的快取"""
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            self._entries.pop(key, None)
+            self._last_id.pop(key, None)
+            self._fetched_at.pop(key, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """查詢次數、命中次數、實際 API 拉取次數與共用進行中拉取的次數"""
+        return dict(self._stats)
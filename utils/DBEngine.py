@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+import aiosqlite
+
+from utils.SQLiteProfile import PROFILES, SQLiteProfile
+
+log = logging.getLogger(__name__)
+
+
+class DBEngine:
+    """
+    共用的非同步 SQLite 引擎，由 Bot 持有。
+
+    DBManager 與 TempVoiceDatabase 都建立在同一個引擎上，共用:
+    - 一條寫入連線 (所有寫入透過 transaction() 依序執行，避免交易互相交錯)
+    - WAL 模式下的唯讀連線池 (reader())
+    - PRAGMA 調校、定期 PRAGMA optimize
+    - 資料表初始化 (add_schema / init_schema) 與關閉流程 (add_close_hook / close)
+
+    其他資料庫檔案可以透過 attach 以 ATTACH DATABASE 掛載為獨立的 schema，
+    例如將臨時語音頻道的資料表保留在原本的 temp_voice.db。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        profile: Optional[SQLiteProfile] = None,
+        read_pool_size: int = 2,
+        attach: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """
+        參數:
+            db_path: 主資料庫檔案路徑。
+            profile: 連線時套用的 SQLite 調校設定，預設為 balanced。
+            read_pool_size: 唯讀連線數量，0 代表所有查詢都使用寫入連線。
+                            僅在 WAL 模式且為檔案資料庫時啟用。
+            attach: schema 名稱 -> 資料庫檔案路徑，連線後以 ATTACH DATABASE 掛載。
+        """
+        self.db_path = db_path
+        self.profile = profile or PROFILES["balanced"]
+        self.read_pool_size = read_pool_size
+        self.attached: Dict[str, str] = dict(attach or {})
+        for name in self.attached:
+            if not name.isidentifier() or name.lower() in ("main", "temp"):
+                raise ValueError(f"無效的 schema 名稱: {name}")
+
+        self.conn: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._optimize_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self._schemas: List[Tuple[str, Callable[[], Awaitable[None]]]] = []
+        self._close_hooks: List[Callable[[], Awaitable[None]]] = []
+
+        # --------- 讀取池 ---------
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._pool_stats: Dict[str, Any] = {
+            "acquisitions": 0,
+            "waits": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "writer_fallbacks": 0,
+        }
+
+    @property
+    def closing(self) -> bool:
+        return self._closing
+
+    def schema_for(self, name: str) -> str:
+        """回傳指定 schema 名稱，若未掛載則回傳 main。"""
+        return name if name in self.attached else "main"
+
+    async def connect(self) -> aiosqlite.Connection:
+        """
+        建立寫入連線、掛載其他資料庫、套用 PRAGMA 並開啟讀取池。
+        僅於尚未連線時執行。
+        """
+        if self.conn is not None:
+            return self.conn
+        async with self._connect_lock:
+            if self.conn is not None:
+                return self.conn
+            if self._closing:
+                raise RuntimeError("DBEngine 已關閉")
+            conn = await aiosqlite.connect(self.db_path)
+            conn.row_factory = aiosqlite.Row
+            try:
+                await self.profile.apply(conn)
+                for name, path in self.attached.items():
+                    await conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+                    await self.profile.apply_schema(conn, name)
+            except BaseException:
+                await conn.close()
+                raise
+            self.conn = conn
+            await self._open_readers()
+            if self.profile.optimize_interval > 0 and self._optimize_task is None:
+                self._optimize_task = asyncio.create_task(self._optimize_loop(), name="DBEngine-optimize")
+            return conn
+
+    async def _open_readers(self) -> None:
+        """在 WAL 模式下開啟唯讀連線池，每條連線也以唯讀方式掛載其他資料庫。"""
+        if self.read_pool_size <= 0 or self._readers:
+            return
+        if self.db_path == ":memory:" or self.profile.journal_mode != "wal":
+            return
+        async with self.conn.execute("PRAGMA journal_mode") as cursor:
+            row = await cursor.fetchone()
+        if not row or str(row[0]).lower() != "wal":
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await aiosqlite.connect(self._readonly_uri(self.db_path), uri=True)
+            reader.row_factory = aiosqlite.Row
+            for name, path in self.attached.items():
+                await reader.execute(f"ATTACH DATABASE ? AS {name}", (self._readonly_uri(path),))
+            await self.profile.apply_reader(reader, ("main", *self.attached))
+            self._readers.append(reader)
+            queue.put_nowait(reader)
+        self._idle_readers = queue
+        log.info(f"已開啟 {self.read_pool_size} 條唯讀資料庫連線")
+
+    @staticmethod
+    def _readonly_uri(path: str) -> str:
+        return Path(path).resolve().as_uri() + "?mode=ro"
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        從讀取池取得一條唯讀連線，用完自動歸還。
+        讀取池未啟用時改用寫入連線。
+        """
+        await self.connect()
+        if self._idle_readers is None:
+            self._pool_stats["writer_fallbacks"] += 1
+            yield self.conn
+            return
+
+        stats = self._pool_stats
+        stats["acquisitions"] += 1
+        if self._idle_readers.empty():
+            stats["waits"] += 1
+            start = time.perf_counter()
+            reader = await self._idle_readers.get()
+            waited = time.perf_counter() - start
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+        else:
+            reader = self._idle_readers.get_nowait()
+        try:
+            yield reader
+        finally:
+            self._idle_readers.put_nowait(reader)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        取得寫入連線並在區塊結束時提交，發生例外時回滾。
+        多個資料層共用同一條寫入連線，寫入必須經由此處依序執行，
+        否則一方的 commit/rollback 會連帶影響另一方尚未完成的交易。
+        """
+        conn = await self.connect()
+        async with self._write_lock:
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                try:
+                    await conn.rollback()
+                except Exception:
+                    log.exception("回滾交易時發生錯誤")
+                raise
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        取得讀取池的統計資料。
+        回傳:
+            dict，包含 size、idle、in_use、acquisitions、waits、avg_wait、max_wait (秒)、
+            writer_fallbacks (讀取池未啟用而改用寫入連線的次數)。
+        """
+        stats = dict(self._pool_stats)
+        idle = self._idle_readers.qsize() if self._idle_readers is not None else 0
+        stats["size"] = len(self._readers)
+        stats["idle"] = idle
+        stats["in_use"] = len(self._readers) - idle
+        stats["avg_wait"] = stats["total_wait"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    # --------- 資料表初始化與關閉 ---------
+    def add_schema(self, name: str, init: Callable[[], Awaitable[None]]) -> None:
+        """註冊資料表初始化函式，由 init_schema 依註冊順序執行。"""
+        self._schemas.append((name, init))
+
+    async def init_schema(self) -> None:
+        """
+        依序執行所有已註冊的資料表初始化函式。
+        單一資料層初始化失敗只記錄錯誤，不影響其他資料層。
+        """
+        await self.connect()
+        for name, init in self._schemas:
+            try:
+                await init()
+            except Exception:
+                log.exception(f"初始化資料表 {name} 時發生錯誤")
+
+    def add_close_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """註冊關閉前要執行的函式 (例如寫完寫入緩衝)，於關閉連線前依註冊順序執行。"""
+        self._close_hooks.append(hook)
+
+    async def _optimize_loop(self) -> None:
+        """定期執行 PRAGMA optimize。"""
+        while True:
+            await asyncio.sleep(self.profile.optimize_interval)
+            if self.conn is None:
+                continue
+            try:
+                async with self._write_lock:
+                    await SQLiteProfile.optimize(self.conn)
+            except Exception:
+                log.exception("執行 PRAGMA optimize 時發生錯誤")
+
+    async def close(self) -> None:
+        """
+        執行所有關閉前函式、停止 PRAGMA optimize 任務、關閉讀取池，
+        最後執行一次 PRAGMA optimize 並關閉寫入連線。
+        應於機器人關閉時呼叫。
+        """
+        if self._closing:
+            return
+        for hook in self._close_hooks:
+            try:
+                await hook()
+            except Exception:
+                log.exception("執行資料庫關閉前函式時發生錯誤")
+        self._closing = True
+
+        if self._optimize_task is not None:
+            self._optimize_task.cancel()
+            await asyncio.gather(self._optimize_task, return_exceptions=True)
+            self._optimize_task = None
+        for reader in self._readers:
+            try:
+                await reader.close()
+            except Exception:
+                log.exception("關閉唯讀連線時發生錯誤")
+        self._readers = []
+        self._idle_readers = None
+        if self.conn is not None:
+            async with self._write_lock:
+                try:
+                    await SQLiteProfile.optimize(self.conn)
+                except Exception:
+                    log.exception("關閉前執行 PRAGMA optimize 時發生錯誤")
+                await self.conn.close()
+                self.conn = None
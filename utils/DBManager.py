@@ -1,34 +1,737 @@
-import os
-from typing import Any, List, Optional
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from zoneinfo import ZoneInfo
 
 import aiosqlite
 
+from utils.DBEngine import DBEngine
+
+log = logging.getLogger(__name__)
+
+# set_settings 未傳入的欄位 (與傳入 None 清除設定區分)
+_UNSET: Any = object()
+
+_SETTING_COLUMNS = (
+    "notify_channel",
+    "voice_log_channel",
+    "member_log_channel",
+    "message_log_channel",
+    "anti_dive_channel",
+    "report_channel",
+)
+
+# 寫入緩衝 (write-behind) 使用的 INSERT 語句，每個資料表一條，批次時以 executemany 執行
+_INSERT_SQL: Dict[str, str] = {
+    "punishments": "INSERT INTO punishments (guild_id, user_id, punished_at, type, reason, admin_id, duration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "server_events": "INSERT INTO server_events (guild_id, user_id, event_type, event_time) VALUES (?, ?, ?, ?)",
+    "voice_logs": "INSERT INTO voice_logs (guild_id, user_id, channel_id, channel_name, timestamp, event_type) VALUES (?, ?, ?, ?, ?, ?)",
+}
+
+# voice_sessions 的開啟/關閉操作必須依序執行，寫入緩衝中以 (SQL, 參數) 保存，
+# 寫入時將連續相同的 SQL 合併為一次 executemany
+_SESSION_CLOSE_SQL = """
+    UPDATE voice_sessions
+    SET end_time = MAX(?1, start_time), duration = MAX(?1, start_time) - start_time
+    WHERE guild_id = ?2 AND user_id = ?3 AND end_time IS NULL
+"""
+_SESSION_OPEN_SQL = "INSERT INTO voice_sessions (guild_id, user_id, channel_id, start_time) VALUES (?, ?, ?, ?)"
+
+# 訊息內容快取的新增/編輯/刪除同樣必須依序執行，與 voice_sessions 相同以 (SQL, 參數) 保存
+_MESSAGE_CACHE_INSERT_SQL = """
+    INSERT OR REPLACE INTO message_cache (message_id, guild_id, channel_id, author_id, content, attachments)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+_MESSAGE_CACHE_EDIT_SQL = "UPDATE message_cache SET content = ?, attachments = ? WHERE message_id = ?"
+_MESSAGE_CACHE_DELETE_SQL = "DELETE FROM message_cache WHERE message_id = ?"
+
+# 以 (SQL, 參數) 保存、需依序執行的緩衝資料表
+_ORDERED_TABLES = ("voice_sessions", "message_cache")
+
+# 寫入緩衝的資料表順序 (同一次寫入中依此順序執行)
+_PENDING_TABLES = (*_INSERT_SQL, *_ORDERED_TABLES)
+
+# 緩衝已滿時仍然接受的資料表：處分紀錄不可遺失，語音停留紀錄的結束/開始必須成對保留
+_UNCAPPED_TABLES = frozenset({"punishments", "voice_sessions"})
+
+# 逐列重試時可歸咎於單一資料列的錯誤，這些資料列會移到 write_dead_letter；
+# 其他錯誤 (例如資料庫被鎖定、磁碟已滿) 與資料無關，整批保留在緩衝中稍後重試
+_ROW_ERRORS = (
+    sqlite3.IntegrityError,
+    sqlite3.InterfaceError,
+    sqlite3.DataError,
+    sqlite3.ProgrammingError,
+    OverflowError,
+)
+_DEAD_LETTER_SQL = """
+    INSERT INTO write_dead_letter (table_name, statement, params, error, failed_at) VALUES (?, ?, ?, ?, ?)
+"""
+
+# 直接覆寫活動時間：不存在則新增，存在則只更新有提供 (非 NULL) 的欄位
+_ACTIVITY_SET_SQL = """
+    INSERT INTO anti_dive (guild_id, user_id, last_message_time, last_voice_time)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        last_message_time = COALESCE(excluded.last_message_time, anti_dive.last_message_time),
+        last_voice_time = COALESCE(excluded.last_voice_time, anti_dive.last_voice_time)
+"""
+
+# 活動時間批次寫入：不存在則新增，存在則保留較新的時間 (NULL 表示該欄位不更新)
+_ACTIVITY_UPSERT_SQL = """
+    INSERT INTO anti_dive (guild_id, user_id, last_message_time, last_voice_time)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        last_message_time = MAX(
+            COALESCE(excluded.last_message_time, anti_dive.last_message_time),
+            COALESCE(anti_dive.last_message_time, excluded.last_message_time)
+        ),
+        last_voice_time = MAX(
+            COALESCE(excluded.last_voice_time, anti_dive.last_voice_time),
+            COALESCE(anti_dive.last_voice_time, excluded.last_voice_time)
+        )
+"""
+
+# 活動統計 (每小時/每日) 的累加寫入：同一時段同一指標的數值直接相加
+_ROLLUP_UPSERT_SQL: Dict[str, str] = {
+    table: f"""
+        INSERT INTO {table} (guild_id, bucket, metric, value) VALUES (?, ?, ?, ?)
+        ON CONFLICT(guild_id, bucket, metric) DO UPDATE SET value = value + excluded.value
+    """
+    for table in ("activity_rollup_hourly", "activity_rollup_daily")
+}
+
+# 由 voice_sessions 計算的指標 (重建語音停留紀錄時需一併重算)
+_VOICE_ROLLUP_METRICS = ("voice_seconds", "voice_sessions")
+
+# 初始化活動時間：不存在則新增，已存在者只在兩個欄位都沒有實際活動 (NULL 或等於初始值) 時覆寫
+_ACTIVITY_INIT_SQL = """
+    INSERT INTO anti_dive (guild_id, user_id, last_message_time, last_voice_time)
+    VALUES (?1, ?2, ?3, ?3)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        last_message_time = excluded.last_message_time,
+        last_voice_time = excluded.last_voice_time
+    WHERE (anti_dive.last_message_time IS NULL OR anti_dive.last_message_time = excluded.last_message_time)
+      AND (anti_dive.last_voice_time IS NULL OR anti_dive.last_voice_time = excluded.last_voice_time)
+"""
+
+# 最後活動時間 (訊息與語音取較新者，沒有紀錄為 0)，與 idx_anti_dive_last_activity 的索引運算式一致
+_LAST_ACTIVITY_EXPR = "MAX(COALESCE(last_message_time, 0), COALESCE(last_voice_time, 0))"
+
 
 class DBManager:
     """
     非同步資料庫管理類別。
-    用於管理 Discord Bot 所需的 SQLite 資料表。
-    實例僅適用於單一資料庫檔案，非多執行緒安全。
+    用於管理 Discord Bot 所需的 SQLite 資料表，建立在共用的 DBEngine 上。
+    非多執行緒安全。
+
+    add_punishment / add_event / add_voice_event 不會立即寫入，
+    而是放入寫入緩衝，由背景任務依數量或等待時間門檻，
+    以每個資料表一次 executemany、整批一個交易的方式寫入。
+    touch_user_activity 只更新記憶體中的最後活動時間，定期批次寫入 anti_dive。
+    寫入緩衝中的事件同時累加到每小時/每日的活動統計 (activity_rollup_*)，
+    隨同一個交易寫入，週報/月報只需讀取統計表。
+    cache_message / update_cached_message / delete_cached_messages 維護訊息內容快取 (message_cache)，
+    同樣經由寫入緩衝依序寫入，讓重新啟動後的訊息刪除/編輯日誌仍能取得原始內容。
+    關閉引擎時會先呼叫 close() 寫完緩衝中的資料。
+    整批寫入連續失敗 max_retries 次後改為逐列寫入，無法寫入的資料列移到 write_dead_letter，
+    不會讓一筆壞資料卡住之後所有的寫入；緩衝超過 max_pending 筆時丟棄新的資料並記錄警告
+    (處分與語音停留紀錄除外)，被丟棄或移到 write_dead_letter 的資料不計入活動統計。
+
+    查詢方法 (list_punishments、list_events、get_settings、get_user_activity、
+    get_inactive_users) 走引擎的唯讀連線池，不必排在寫入連線的插入工作之後。
     """
 
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        engine: DBEngine,
+        *,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        activity_flush_interval: float = 30.0,
+        timezone: str = "UTC",
+        max_pending: int = 50000,
+        max_retries: int = 3,
+    ):
         """
         初始化 DBManager 實例。
         參數:
-            db_path: 資料庫檔案路徑。
-        若環境變數 'database' 存在則優先使用。
+            engine: 共用的資料庫引擎。
+            batch_size: 緩衝筆數達到此值時立即寫入。
+            flush_interval: 最舊一筆緩衝資料最多等待的秒數。
+            activity_flush_interval: 用戶活動時間在記憶體中最多停留的秒數。
+            timezone: 每日活動統計切分日期使用的時區。
+            max_pending: 寫入緩衝最多保留的筆數，超過時丟棄新的資料 (處分與語音停留紀錄除外)。
+            max_retries: 整批寫入連續失敗幾次後改為逐列寫入。
+        """
+        self.engine = engine
+        engine.add_schema("db_manager", self.init_db)
+        engine.add_schema("voice_logs", self.init_voice_db)
+        engine.add_schema("message_cache", self.init_message_cache_db)
+        engine.add_close_hook(self.close)
+
+        # --------- 寫入緩衝 ---------
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._pending: Dict[str, List[tuple]] = {table: [] for table in _PENDING_TABLES}
+        self._pending_count = 0
+        self._oldest_pending: Optional[float] = None
+        self._settings_listeners: List[Callable[[int], None]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closing = False
+        # (guild_id, user_id) -> [last_message_time, last_voice_time]，尚未寫入的最新活動時間
+        self.activity_flush_interval = activity_flush_interval
+        self._activity: Dict[Tuple[int, int], List[Optional[int]]] = {}
+        self._activity_oldest: Optional[float] = None
+        self._writer_stats: Dict[str, Any] = {
+            "flushes": 0,
+            "failed_flushes": 0,
+            "rows_flushed": 0,
+            "activity_rows_flushed": 0,
+            "last_flush_rows": 0,
+            "last_flush_latency": 0.0,
+            "max_flush_latency": 0.0,
+            "total_flush_latency": 0.0,
+            "last_flush_at": None,
+            "consecutive_failures": 0,
+            "dropped_rows": 0,
+            "dead_letters": 0,
+        }
+        # (guild_id, 小時起點, 指標) -> 尚未寫入的累加值
+        self._rollup: Dict[Tuple[int, int, str], int] = {}
+        self.timezone = ZoneInfo(timezone)
+        self._day_of_hour: Dict[int, int] = {}
+
+    def _reader(self):
+        return self.engine.reader()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """取得引擎讀取池的統計資料，參見 DBEngine.get_pool_stats。"""
+        return self.engine.get_pool_stats()
+
+    async def close(self) -> None:
         """
-        self.db_path = os.getenv("database", db_path)
-        self.conn: Optional[aiosqlite.Connection] = None
+        停止背景寫入任務並寫完緩衝中的資料。
+        連線由 DBEngine 管理，引擎關閉時會自動呼叫此方法。
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._writer_task is not None:
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("關閉時批次寫入資料庫失敗，改為逐列寫入")
+            await self._flush(events=True, activity=True, isolate=True)
+
+    # --------- 寫入緩衝 (write-behind) ---------
+    def _ensure_writer(self) -> None:
+        """確保背景寫入任務正在執行。"""
+        if self._closing:
+            raise RuntimeError("DBManager 已關閉，無法再寫入資料")
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer_loop(), name="DBManager-writer")
+
+    def _enqueue(self, table: str, row: tuple) -> bool:
+        """
+        將一列資料放入寫入緩衝，必要時喚醒背景寫入任務。
+        回傳:
+            是否已放入緩衝 (緩衝已滿而丟棄時為 False)。
+        """
+        self._ensure_writer()
+        if self._pending_count >= self.max_pending and table not in _UNCAPPED_TABLES:
+            stats = self._writer_stats
+            stats["dropped_rows"] += 1
+            if stats["dropped_rows"] % 1000 == 1:
+                log.warning(
+                    f"寫入緩衝已滿 ({self.max_pending} 筆)，丟棄 {table} 的資料 (累計丟棄 {stats['dropped_rows']} 筆)"
+                )
+            return False
+        first = self._pending_count == 0
+        if first:
+            self._oldest_pending = time.monotonic()
+        self._pending[table].append(row)
+        self._pending_count += 1
+
+        # 第一筆資料需要讓背景任務重新計算等待時間；達到批次大小則立即寫入
+        if first or self._pending_count >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _events_due(self, now: float) -> bool:
+        return bool(self._pending_count) and (
+            self._pending_count >= self.batch_size
+            or now - self._oldest_pending >= self.flush_interval
+        )
+
+    def _activity_due(self, now: float) -> bool:
+        return bool(self._activity) and now - self._activity_oldest >= self.activity_flush_interval
+
+    async def _writer_loop(self) -> None:
+        """背景寫入任務：依數量或等待時間門檻觸發寫入。"""
+        while True:
+            deadlines = []
+            if self._pending_count:
+                if self._pending_count >= self.batch_size:
+                    deadlines.append(0.0)
+                else:
+                    deadlines.append(self._oldest_pending + self.flush_interval)
+            if self._activity:
+                deadlines.append(self._activity_oldest + self.activity_flush_interval)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self._closing:
+                return
+            now = time.monotonic()
+            events_due = self._events_due(now)
+            activity_due = self._activity_due(now)
+            if not events_due and not activity_due:
+                continue
+            stats = self._writer_stats
+            try:
+                await self._flush(
+                    events=events_due,
+                    activity=activity_due,
+                    isolate=stats["consecutive_failures"] >= self.max_retries,
+                )
+                stats["consecutive_failures"] = 0
+            except Exception:
+                stats["consecutive_failures"] += 1
+                failures = stats["consecutive_failures"]
+                log.exception(
+                    f"批次寫入資料庫時發生錯誤 (連續 {failures} 次)，將於稍後"
+                    + ("逐列重試" if failures >= self.max_retries else "重試")
+                )
+                await asyncio.sleep(min(self.flush_interval * 2 ** (failures - 1), 60.0))
+
+    async def flush(self) -> None:
+        """
+        立即將寫入緩衝與活動時間緩衝中的所有資料寫入資料庫。
+        每個資料表以一次 executemany 寫入，整批共用一個交易。
+        寫入失敗時資料會放回緩衝並拋出例外。
+        """
+        await self._flush(events=True, activity=True)
+
+    async def flush_activity(self) -> None:
+        """立即將尚未寫入的用戶活動時間寫入 anti_dive。"""
+        await self._flush(events=False, activity=True)
+
+    async def _flush(self, *, events: bool, activity: bool, isolate: bool = False) -> None:
+        """
+        參數:
+            isolate: 逐列寫入 (每列一個 SAVEPOINT)，無法寫入的資料列移到 write_dead_letter。
+        """
+        async with self._flush_lock:
+            events = events and bool(self._pending_count)
+            activity = activity and bool(self._activity)
+            if not events and not activity:
+                return
+
+            batch: Dict[str, List[tuple]] = {}
+            count = 0
+            oldest = None
+            if events:
+                batch = self._pending
+                count = self._pending_count
+                oldest = self._oldest_pending
+                self._pending = {table: [] for table in _PENDING_TABLES}
+                self._pending_count = 0
+                self._oldest_pending = None
+
+            activity_batch: Dict[Tuple[int, int], List[Optional[int]]] = {}
+            activity_oldest = None
+            if activity:
+                activity_batch = self._activity
+                activity_oldest = self._activity_oldest
+                self._activity = {}
+                self._activity_oldest = None
+
+            # 活動統計的累加值隨任一次寫入一併寫入
+            rollup_batch = self._rollup
+            self._rollup = {}
+
+            start = time.perf_counter()
+            dead_letters = 0
+            try:
+                async with self.engine.transaction() as conn:
+                    if isolate:
+                        dead_letters = await self._write_isolated(conn, batch, activity_batch, rollup_batch)
+                    else:
+                        await self._write_batch(conn, batch, activity_batch, rollup_batch)
+            except BaseException:
+                self._writer_stats["failed_flushes"] += 1
+                # 將資料放回緩衝前端，保持寫入順序
+                for table, rows in batch.items():
+                    self._pending[table][:0] = rows
+                self._pending_count += count
+                if count:
+                    self._oldest_pending = oldest
+                for key, (m, v) in activity_batch.items():
+                    self._merge_pending_activity(key, m, v)
+                if activity_batch:
+                    self._activity_oldest = activity_oldest
+                for key, value in rollup_batch.items():
+                    self._rollup[key] = self._rollup.get(key, 0) + value
+                raise
+
+            latency = time.perf_counter() - start
+            stats = self._writer_stats
+            stats["flushes"] += 1
+            stats["rows_flushed"] += count
+            stats["activity_rows_flushed"] += len(activity_batch)
+            stats["last_flush_rows"] = count + len(activity_batch)
+            stats["last_flush_latency"] = latency
+            stats["max_flush_latency"] = max(stats["max_flush_latency"], latency)
+            stats["total_flush_latency"] += latency
+            stats["last_flush_at"] = time.time()
+            stats["dead_letters"] += dead_letters
+
+    async def _write_batch(
+        self,
+        conn: aiosqlite.Connection,
+        batch: Dict[str, List[tuple]],
+        activity_batch: Dict[Tuple[int, int], List[Optional[int]]],
+        rollup_batch: Dict[Tuple[int, int, str], int],
+    ) -> None:
+        """每個資料表以一次 executemany 寫入 (依序資料表則合併連續相同的 SQL)。"""
+        for table, rows in batch.items():
+            if not rows:
+                continue
+            if table in _ORDERED_TABLES:
+                for sql, params in self._group_runs(rows):
+                    await conn.executemany(sql, params)
+            else:
+                await conn.executemany(_INSERT_SQL[table], rows)
+        if activity_batch:
+            await conn.executemany(
+                _ACTIVITY_UPSERT_SQL,
+                [(g, u, m, v) for (g, u), (m, v) in activity_batch.items()],
+            )
+        if rollup_batch:
+            await self._write_rollups(conn, rollup_batch)
+
+    async def _write_isolated(
+        self,
+        conn: aiosqlite.Connection,
+        batch: Dict[str, List[tuple]],
+        activity_batch: Dict[Tuple[int, int], List[Optional[int]]],
+        rollup_batch: Dict[Tuple[int, int, str], int],
+    ) -> int:
+        """
+        在同一個交易中逐列寫入，每列以 SAVEPOINT 隔離；
+        因資料本身而失敗的資料列回滾到 SAVEPOINT 並記錄到 write_dead_letter。
+        回傳:
+            移到 write_dead_letter 的筆數。
+        """
+        statements: List[Tuple[str, str, tuple]] = []
+        for table, rows in batch.items():
+            if table in _ORDERED_TABLES:
+                statements.extend((table, sql, params) for sql, params in rows)
+            else:
+                statements.extend((table, _INSERT_SQL[table], row) for row in rows)
+        statements.extend(
+            ("anti_dive", _ACTIVITY_UPSERT_SQL, (g, u, m, v)) for (g, u), (m, v) in activity_batch.items()
+        )
+
+        # 沒有明確開始交易時，釋放最外層的 SAVEPOINT 會直接提交
+        if not conn.in_transaction:
+            await conn.execute("BEGIN")
+        dead: List[tuple] = []
+        # 移到 write_dead_letter 的資料列不計入活動統計 (不修改 rollup_batch，失敗時才能原樣放回)
+        rollups = dict(rollup_batch)
+
+        async def write(table: str, sql: str, params: tuple) -> bool:
+            await conn.execute("SAVEPOINT write_row")
+            try:
+                await conn.execute(sql, params)
+            except _ROW_ERRORS as e:
+                await conn.execute("ROLLBACK TO write_row")
+                log.error(f"寫入 {table} 失敗，已移到 write_dead_letter: {e}，參數: {params!r}")
+                dead.append((
+                    table,
+                    " ".join(sql.split()),
+                    json.dumps(params, ensure_ascii=False, default=str),
+                    f"{type(e).__name__}: {e}",
+                    int(time.time()),
+                ))
+                written = False
+            else:
+                written = True
+            await conn.execute("RELEASE write_row")
+            return written
+
+        for table, sql, params in statements:
+            if not await write(table, sql, params):
+                key = self._row_rollup_key(table, params)
+                if key is not None and key in rollups:
+                    rollups[key] -= 1
+                    if rollups[key] <= 0:
+                        del rollups[key]
+        for table, sql, rows in self._rollup_statements(rollups):
+            for row in rows:
+                await write(table, sql, row)
+        if dead:
+            await conn.executemany(_DEAD_LETTER_SQL, dead)
+        return len(dead)
+
+    # --------- 活動統計 (rollup) ---------
+    def _count_rollup(self, guild_id: int, timestamp: int, metric: str, value: int = 1) -> None:
+        """將一筆活動累加到記憶體中的每小時統計，隨下一次批次寫入。"""
+        key = (guild_id, timestamp - timestamp % 3600, metric)
+        self._rollup[key] = self._rollup.get(key, 0) + value
+
+    @staticmethod
+    def _row_rollup_key(table: str, row: tuple) -> Optional[Tuple[int, int, str]]:
+        """回傳緩衝資料列在寫入時計入的活動統計 (guild_id, 小時起點, 指標)，沒有則為 None。"""
+        if table == "punishments":
+            guild_id, _, timestamp, ptype = row[:4]
+            metric = f"punish:{ptype}"
+        elif table == "server_events":
+            guild_id, _, event_type, timestamp = row
+            metric = f"event:{event_type}"
+        elif table == "voice_logs" and row[5] == "join":
+            guild_id, timestamp = row[0], row[4]
+            metric = "voice_joins"
+        else:
+            return None
+        if not isinstance(timestamp, int):
+            return None
+        return (guild_id, timestamp - timestamp % 3600, metric)
+
+    def _day_bucket(self, hour: int) -> int:
+        """回傳小時起點所屬日期 (依設定時區) 的零時時間戳。"""
+        day = self._day_of_hour.get(hour)
+        if day is None:
+            if len(self._day_of_hour) > 10000:
+                self._day_of_hour.clear()
+            local = datetime.fromtimestamp(hour, self.timezone)
+            day = int(local.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+            self._day_of_hour[hour] = day
+        return day
+
+    async def _write_rollups(
+        self, conn: aiosqlite.Connection, rollups: Mapping[Tuple[int, int, str], int]
+    ) -> None:
+        """將 (guild_id, 小時起點, 指標) -> 累加值 寫入每小時與每日統計表。"""
+        for _, sql, rows in self._rollup_statements(rollups):
+            await conn.executemany(sql, rows)
+
+    def _rollup_statements(
+        self, rollups: Mapping[Tuple[int, int, str], int]
+    ) -> List[Tuple[str, str, List[tuple]]]:
+        """回傳寫入每小時與每日統計表的 (資料表, SQL, 參數列表)。"""
+        if not rollups:
+            return []
+        daily: Dict[Tuple[int, int, str], int] = {}
+        for (guild_id, hour, metric), value in rollups.items():
+            key = (guild_id, self._day_bucket(hour), metric)
+            daily[key] = daily.get(key, 0) + value
+        return [
+            (
+                "activity_rollup_hourly",
+                _ROLLUP_UPSERT_SQL["activity_rollup_hourly"],
+                [(g, b, m, v) for (g, b, m), v in rollups.items()],
+            ),
+            (
+                "activity_rollup_daily",
+                _ROLLUP_UPSERT_SQL["activity_rollup_daily"],
+                [(g, b, m, v) for (g, b, m), v in daily.items()],
+            ),
+        ]
+
+    @staticmethod
+    def _split_by_hour(start: int, end: int) -> List[Tuple[int, int]]:
+        """將 [start, end) 依整點切分，回傳 (小時起點, 秒數) 列表。"""
+        parts: List[Tuple[int, int]] = []
+        hour = start - start % 3600
+        while hour < end:
+            seconds = min(end, hour + 3600) - max(start, hour)
+            if seconds > 0:
+                parts.append((hour, seconds))
+            hour += 3600
+        return parts
+
+    async def refresh_voice_rollups(self, *, batch_size: int = 5000) -> int:
+        """
+        將已結束但尚未統計的語音停留紀錄累加到活動統計。
+
+        voice_sessions 結束 (或直接新增已結束的紀錄) 時由觸發器寫入 voice_rollup_queue，
+        此方法分批取出，依整點切分停留時間後累加 voice_seconds，並以開始時間累加 voice_sessions。
+        由週報排程定期呼叫，產生報告前也會先呼叫一次。
+        回傳:
+            本次處理的紀錄數量。
+        """
+        if self._pending["voice_sessions"]:
+            await self.flush()
+        processed = 0
+        while True:
+            async with self.engine.transaction() as conn:
+                cursor = await conn.execute(
+                    """
+                    SELECT q.session_id, s.guild_id, s.start_time, s.end_time
+                    FROM voice_rollup_queue AS q
+                    LEFT JOIN voice_sessions AS s ON s.session_id = q.session_id
+                    ORDER BY q.session_id LIMIT ?
+                    """,
+                    (batch_size,),
+                )
+                rows = await cursor.fetchall()
+                if not rows:
+                    break
+                rollups: Dict[Tuple[int, int, str], int] = {}
+                for row in rows:
+                    # 已被刪除 (例如重建) 的紀錄只需移出佇列
+                    if row["guild_id"] is None or row["end_time"] is None:
+                        continue
+                    guild_id, start, end = row["guild_id"], row["start_time"], row["end_time"]
+                    key = (guild_id, start - start % 3600, "voice_sessions")
+                    rollups[key] = rollups.get(key, 0) + 1
+                    for hour, seconds in self._split_by_hour(start, end):
+                        key = (guild_id, hour, "voice_seconds")
+                        rollups[key] = rollups.get(key, 0) + seconds
+                if rollups:
+                    await self._write_rollups(conn, rollups)
+                await conn.executemany(
+                    "DELETE FROM voice_rollup_queue WHERE session_id = ?",
+                    [(row["session_id"],) for row in rows],
+                )
+            processed += len(rows)
+            if len(rows) < batch_size:
+                break
+        return processed
+
+    async def get_activity_rollup(
+        self,
+        *,
+        guild_id: int,
+        start_ts: int,
+        end_ts: int,
+        granularity: str = "daily",
+    ) -> List[aiosqlite.Row]:
+        """
+        讀取 [start_ts, end_ts) 內的活動統計。
+        參數:
+            granularity: "hourly" 或 "daily" (每日以設定時區的零時為起點)
+        回傳:
+            包含 bucket (時段起點)、metric、value 的列表，依時段排序。
+        指標:
+            messages、voice_joins、voice_sessions、voice_seconds、
+            event:<事件類型> (例如 event:member_join)、punish:<處分類型> (例如 punish:warn)
+        """
+        if granularity not in ("hourly", "daily"):
+            raise ValueError(f"無效的統計粒度: {granularity}")
+        if self._rollup:
+            await self.flush()
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                f"SELECT bucket, metric, value FROM activity_rollup_{granularity} "
+                "WHERE guild_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                (guild_id, start_ts, end_ts),
+            )
+            return await cursor.fetchall()
+
+    async def activity_rollups_need_backfill(self) -> bool:
+        """活動統計尚無資料但已有歷史事件時回傳 True (例如升級後第一次啟動)。"""
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                """
+                SELECT NOT EXISTS (SELECT 1 FROM activity_rollup_hourly) AND (
+                    EXISTS (SELECT 1 FROM voice_logs)
+                    OR EXISTS (SELECT 1 FROM server_events)
+                    OR EXISTS (SELECT 1 FROM punishments)
+                )
+                """
+            )
+            return bool((await cursor.fetchone())[0])
+
+    async def rebuild_activity_rollups(self, *, guild_id: Optional[int] = None) -> None:
+        """
+        從 voice_logs、server_events、punishments 與 voice_sessions 重新計算活動統計。
+        訊息數量沒有原始紀錄，重建時保留既有的 messages 統計。
+        參數:
+            guild_id: 只重建指定伺服器，None 代表全部。
+        """
+        await self.flush()
+        guild_filter = "" if guild_id is None else "AND guild_id = ?"
+        guild_params: tuple = () if guild_id is None else (guild_id,)
+        sources = (
+            "SELECT guild_id, timestamp - timestamp % 3600, 'voice_joins', COUNT(*) "
+            f"FROM voice_logs WHERE event_type = 'join' {guild_filter} GROUP BY 1, 2",
+            "SELECT guild_id, event_time - event_time % 3600, 'event:' || event_type, COUNT(*) "
+            f"FROM server_events WHERE 1 {guild_filter} GROUP BY 1, 2, 3",
+            "SELECT guild_id, punished_at - punished_at % 3600, 'punish:' || type, COUNT(*) "
+            f"FROM punishments WHERE 1 {guild_filter} GROUP BY 1, 2, 3",
+        )
+        async with self.engine.transaction() as conn:
+            for table in ("activity_rollup_hourly", "activity_rollup_daily"):
+                await conn.execute(
+                    f"DELETE FROM {table} WHERE metric != 'messages' {guild_filter}", guild_params
+                )
+            rollups: Dict[Tuple[int, int, str], int] = {}
+            for sql in sources:
+                cursor = await conn.execute(sql, guild_params)
+                for g, hour, metric, value in await cursor.fetchall():
+                    rollups[(g, hour, metric)] = value
+            if rollups:
+                await self._write_rollups(conn, rollups)
+            # 已結束的語音停留紀錄重新排入佇列，由 refresh_voice_rollups 計算
+            await conn.execute(
+                "INSERT OR IGNORE INTO voice_rollup_queue (session_id) "
+                f"SELECT session_id FROM voice_sessions WHERE end_time IS NOT NULL {guild_filter}",
+                guild_params,
+            )
+        processed = await self.refresh_voice_rollups()
+        log.info(f"已重建活動統計 ({len(rollups)} 個時段指標，{processed} 筆語音停留紀錄)")
 
-    async def connect(self) -> None:
+    @staticmethod
+    def _group_runs(ops: List[Tuple[str, tuple]]) -> List[Tuple[str, List[tuple]]]:
+        """將依序排列的 (SQL, 參數) 中連續相同的 SQL 合併，保持執行順序。"""
+        runs: List[Tuple[str, List[tuple]]] = []
+        for sql, params in ops:
+            if runs and runs[-1][0] is sql:
+                runs[-1][1].append(params)
+            else:
+                runs.append((sql, [params]))
+        return runs
+
+    @property
+    def queue_depth(self) -> int:
+        """目前寫入緩衝中尚未寫入的筆數。"""
+        return self._pending_count
+
+    def get_writer_stats(self) -> Dict[str, Any]:
         """
-        建立與 SQLite 資料庫的非同步連線，並設定 row_factory 以便回傳 dict-like row。
-        僅於尚未連線時執行。
+        取得寫入緩衝的統計資料，用於觀察佇列深度與寫入延遲。
+        回傳:
+            dict，包含 queue_depth、oldest_pending_age、pending_activity、flushes、rows_flushed、
+            last_flush_latency、avg_flush_latency、max_flush_latency (延遲單位為秒)、
+            consecutive_failures (連續寫入失敗次數)、dropped_rows (緩衝已滿而丟棄的筆數)、
+            dead_letters (移到 write_dead_letter 的筆數) 等欄位。
         """
-        if self.conn is None:
-            self.conn = await aiosqlite.connect(self.db_path)
-            self.conn.row_factory = aiosqlite.Row
+        stats = dict(self._writer_stats)
+        stats["queue_depth"] = self._pending_count
+        stats["queue_depth_by_table"] = {table: len(rows) for table, rows in self._pending.items()}
+        stats["oldest_pending_age"] = (
+            time.monotonic() - self._oldest_pending if self._oldest_pending is not None else 0.0
+        )
+        stats["pending_activity"] = len(self._activity)
+        stats["avg_flush_latency"] = (
+            stats["total_flush_latency"] / stats["flushes"] if stats["flushes"] else 0.0
+        )
+        return stats
 
     async def init_db(self) -> None:
         """
@@ -36,8 +739,7 @@ class DBManager:
         若資料表不存在則建立。
         僅需於資料庫首次建立時呼叫。
         """
-        await self.connect()
-        async with self.conn.cursor() as cur:
+        async with self.engine.transaction() as conn, conn.cursor() as cur:
             await cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS punishments (
@@ -58,6 +760,10 @@ class DBManager:
             await cur.execute(
                 "CREATE INDEX IF NOT EXISTS idx_punishments_time ON punishments(punished_at)"
             )
+            # 查詢單一用戶的紀錄時依時間排序分頁 (punish_id 為 rowid，隱含在索引最後)
+            await cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_punishments_user_time ON punishments(guild_id, user_id, punished_at)"
+            )
             await cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS server_events (
@@ -86,7 +792,8 @@ class DBManager:
                     voice_log_channel     INTEGER,
                     member_log_channel    INTEGER,
                     message_log_channel   INTEGER,
-                    anti_dive_channel     INTEGER
+                    anti_dive_channel     INTEGER,
+                    report_channel        INTEGER
                 )
                 """
             )
@@ -109,17 +816,64 @@ class DBManager:
             await cur.execute(
                 "CREATE INDEX IF NOT EXISTS idx_anti_dive_voice ON anti_dive(guild_id, last_voice_time)"
             )
-            
-        await self.conn.commit()
-        
+            await cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_anti_dive_last_activity "
+                f"ON anti_dive(guild_id, {_LAST_ACTIVITY_EXPR}, user_id)"
+            )
+
+            # 伺服器目前的成員 (不含機器人)，由 AntiDive 於啟動時同步、成員進出時更新
+            await cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS member_snapshot (
+                    guild_id  INTEGER NOT NULL,
+                    user_id   INTEGER NOT NULL,
+                    PRIMARY KEY (guild_id, user_id)
+                ) WITHOUT ROWID
+                """
+            )
+
+            # 舊版資料庫補上新增的設定欄位
+            await cur.execute("PRAGMA table_info(server_settings)")
+            existing = {row["name"] for row in await cur.fetchall()}
+            for column in _SETTING_COLUMNS:
+                if column not in existing:
+                    await cur.execute(f"ALTER TABLE server_settings ADD COLUMN {column} INTEGER")
+
+            # 活動統計 (週報/月報)：bucket 為時段起點，每日統計以設定時區的零時為起點
+            for table in ("activity_rollup_hourly", "activity_rollup_daily"):
+                await cur.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        guild_id  INTEGER NOT NULL,
+                        bucket    INTEGER NOT NULL,
+                        metric    TEXT    NOT NULL,
+                        value     INTEGER NOT NULL,
+                        PRIMARY KEY (guild_id, bucket, metric)
+                    ) WITHOUT ROWID
+                    """
+                )
+
+            # 寫入緩衝中無法寫入的資料列 (例如違反約束)，保留原始語句與參數以便人工處理
+            await cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS write_dead_letter (
+                    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name  TEXT    NOT NULL,
+                    statement   TEXT    NOT NULL,
+                    params      TEXT    NOT NULL,
+                    error       TEXT    NOT NULL,
+                    failed_at   INTEGER NOT NULL
+                )
+                """
+            )
+
     async def init_voice_db(self) -> None:
         """
         初始化語音房紀錄的所有資料表與索引。
         若資料表不存在則建立。
         僅需於資料庫首次建立時呼叫。
         """
-        await self.connect()
-        async with self.conn.cursor() as cur:
+        async with self.engine.transaction() as conn, conn.cursor() as cur:
             # 建立語音事件記錄表
             await cur.execute("""
                 CREATE TABLE IF NOT EXISTS voice_logs (
@@ -151,8 +905,111 @@ class DBManager:
                 CREATE INDEX IF NOT EXISTS idx_voice_channel_user_time 
                 ON voice_logs (guild_id, channel_id, user_id, timestamp)
             """)
-            
-        await self.conn.commit()
+
+            # 建立語音停留紀錄表 (由 join/leave/move 事件配對而成)，end_time 為 NULL 代表仍在語音中
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS voice_sessions (
+                    session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    start_time INTEGER NOT NULL,
+                    end_time INTEGER,
+                    duration INTEGER
+                )
+            """)
+            await cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_voice_sessions_user_time
+                ON voice_sessions (guild_id, user_id, start_time)
+            """)
+            await cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_voice_sessions_channel_time
+                ON voice_sessions (guild_id, channel_id, start_time)
+            """)
+            # 每位用戶在每個伺服器最多只有一筆進行中的紀錄
+            await cur.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_voice_sessions_open
+                ON voice_sessions (guild_id, user_id) WHERE end_time IS NULL
+            """)
+
+            # 已結束紀錄的時間區間索引 (R*Tree)，用於查詢某時間點/區間內在語音中的用戶
+            # R*Tree 以 32 位元浮點數儲存座標 (邊界向外取整)，查詢後需再以 voice_sessions 的整數時間精確過濾
+            await cur.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS voice_session_rtree
+                USING rtree(session_id, start_time, end_time, +guild_id INTEGER)
+            """)
+            await cur.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_voice_sessions_rtree_insert
+                AFTER INSERT ON voice_sessions WHEN NEW.end_time IS NOT NULL
+                BEGIN
+                    INSERT OR REPLACE INTO voice_session_rtree
+                    VALUES (NEW.session_id, NEW.start_time, NEW.end_time, NEW.guild_id);
+                END
+            """)
+            await cur.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_voice_sessions_rtree_close
+                AFTER UPDATE OF end_time ON voice_sessions WHEN NEW.end_time IS NOT NULL
+                BEGIN
+                    INSERT OR REPLACE INTO voice_session_rtree
+                    VALUES (NEW.session_id, NEW.start_time, NEW.end_time, NEW.guild_id);
+                END
+            """)
+            await cur.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_voice_sessions_rtree_delete
+                AFTER DELETE ON voice_sessions
+                BEGIN
+                    DELETE FROM voice_session_rtree WHERE session_id = OLD.session_id;
+                END
+            """)
+            # 已結束但尚未累加到活動統計的紀錄，由 refresh_voice_rollups 定期處理
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS voice_rollup_queue (
+                    session_id INTEGER PRIMARY KEY
+                )
+            """)
+            await cur.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_voice_sessions_rollup_insert
+                AFTER INSERT ON voice_sessions WHEN NEW.end_time IS NOT NULL
+                BEGIN
+                    INSERT OR IGNORE INTO voice_rollup_queue VALUES (NEW.session_id);
+                END
+            """)
+            await cur.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_voice_sessions_rollup_close
+                AFTER UPDATE OF end_time ON voice_sessions
+                WHEN OLD.end_time IS NULL AND NEW.end_time IS NOT NULL
+                BEGIN
+                    INSERT OR IGNORE INTO voice_rollup_queue VALUES (NEW.session_id);
+                END
+            """)
+            # 建立索引前已存在的紀錄補進 R*Tree
+            await cur.execute("""
+                INSERT INTO voice_session_rtree
+                SELECT session_id, start_time, end_time, guild_id FROM voice_sessions
+                WHERE end_time IS NOT NULL AND NOT EXISTS (SELECT 1 FROM voice_session_rtree)
+            """)
+
+    async def init_message_cache_db(self) -> None:
+        """
+        初始化訊息內容快取資料表。
+        message_id 為 snowflake (內含建立時間)，依時間清除舊資料時直接以主鍵範圍刪除。
+        """
+        async with self.engine.transaction() as conn, conn.cursor() as cur:
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS message_cache (
+                    message_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    author_id INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    attachments TEXT NOT NULL DEFAULT ''
+                )
+            """)
+            # 用於查詢同一頻道中被刪除訊息的前一則訊息
+            await cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_message_cache_channel
+                ON message_cache (channel_id, message_id)
+            """)
 
     # --------- punishments CRUD ---------
     async def add_punishment(
@@ -176,13 +1033,13 @@ class DBManager:
             reason: 處分原因 (可為 None)
             admin_id: 處分管理員 ID
             duration: 處分持續時間 (可為 None)
+        資料會先放入寫入緩衝，由背景任務批次寫入。
         """
-        await self.connect()
-        await self.conn.execute(
-            "INSERT INTO punishments (guild_id, user_id, punished_at, type, reason, admin_id, duration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        if self._enqueue(
+            "punishments",
             (guild_id, user_id, punished_at, ptype, reason, admin_id, duration),
-        )
-        await self.conn.commit()
+        ):
+            self._count_rollup(guild_id, punished_at, f"punish:{ptype}")
 
     async def list_punishments(
         self,
@@ -192,6 +1049,7 @@ class DBManager:
         ptype: Optional[str] = None,
         start_ts: Optional[int] = None,
         limit: Optional[int] = 100,
+        before: Optional[Tuple[int, int]] = None,
     ) -> List[aiosqlite.Row]:
         """查詢懲罰紀錄
     
@@ -202,13 +1060,53 @@ class DBManager:
             ptype (Optional[str]): 處分類型 (可選).
             start_ts (Optional[int]): 起始時間戳，只回傳 >= 此值的紀錄 (可選).
             limit (Optional[int]): 最大回傳筆數, 預設 100 (可選).
+            before (Optional[Tuple[int, int]]): 上一頁最後一筆的 (punished_at, punish_id)，
+                只回傳排在其後的紀錄，用於 keyset 分頁 (可選).
 
         Returns:
-            List[aiosqlite.Row]: 查詢結果的列列表.
+            List[aiosqlite.Row]: 查詢結果的列列表，依 punished_at、punish_id 由新到舊排序.
         """
-        await self.connect()
-        sql = "SELECT * FROM punishments WHERE guild_id = ?"
-        params: list[Any] = [guild_id]
+        # 先寫入緩衝中的資料，確保剛新增的紀錄查得到
+        if self._pending_count:
+            await self.flush()
+        where, params = self._punishment_filter(guild_id, user_id, ptype, start_ts)
+        sql = f"SELECT * FROM punishments WHERE {where}"
+        if before is not None:
+            sql += " AND (punished_at, punish_id) < (?, ?)"
+            params.extend(before)
+        sql += " ORDER BY punished_at DESC, punish_id DESC"
+        # 只有 limit 不為 None 時才加 LIMIT
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        async with self._reader() as conn:
+            cursor = await conn.execute(sql, params)
+            rows = await cursor.fetchall()
+        return rows
+
+    async def count_punishments(
+        self,
+        *,
+        guild_id: int,
+        user_id: Optional[int] = None,
+        ptype: Optional[str] = None,
+        start_ts: Optional[int] = None,
+    ) -> int:
+        """計算符合條件的懲罰紀錄數量，條件與 list_punishments 相同。"""
+        if self._pending_count:
+            await self.flush()
+        where, params = self._punishment_filter(guild_id, user_id, ptype, start_ts)
+        async with self._reader() as conn:
+            cursor = await conn.execute(f"SELECT COUNT(*) FROM punishments WHERE {where}", params)
+            return (await cursor.fetchone())[0]
+
+    @staticmethod
+    def _punishment_filter(
+        guild_id: int, user_id: Optional[int], ptype: Any, start_ts: Optional[int]
+    ) -> Tuple[str, List[Any]]:
+        """組出 list_punishments / count_punishments 共用的 WHERE 條件。"""
+        sql = "guild_id = ?"
+        params: List[Any] = [guild_id]
         if user_id is not None:
             sql += " AND user_id = ?"
             params.append(user_id)
@@ -223,14 +1121,7 @@ class DBManager:
         if start_ts is not None:
             sql += " AND punished_at >= ?"
             params.append(start_ts)
-        sql += " ORDER BY punished_at DESC"
-        # 只有 limit 不為 None 時才加 LIMIT
-        if limit is not None:
-            sql += " LIMIT ?"
-            params.append(limit)
-        cursor = await self.conn.execute(sql, params)
-        rows = await cursor.fetchall()
-        return rows
+        return sql, params
 
     # --------- server_events CRUD ---------
     async def add_event(
@@ -247,13 +1138,10 @@ class DBManager:
             event_type: 事件類型
             event_time: 事件發生時間 (UNIX timestamp)
             user_id: 相關用戶 ID (可為 None)
+        資料會先放入寫入緩衝，由背景任務批次寫入。
         """
-        await self.connect()
-        await self.conn.execute(
-            "INSERT INTO server_events (guild_id, user_id, event_type, event_time) VALUES (?, ?, ?, ?)",
-            (guild_id, user_id, event_type, event_time),
-        )
-        await self.conn.commit()
+        if self._enqueue("server_events", (guild_id, user_id, event_type, event_time)):
+            self._count_rollup(guild_id, event_time, f"event:{event_type}")
 
     async def list_events(
         self, guild_id: int, user_id: Optional[int] = None, limit: int = 100
@@ -267,18 +1155,20 @@ class DBManager:
         回傳:
             aiosqlite.Row 組成的 list。
         """
-        await self.connect()
-        if user_id is not None:
-            cursor = await self.conn.execute(
-                "SELECT * FROM server_events WHERE guild_id = ? AND user_id = ? ORDER BY event_time DESC LIMIT ?",
-                (guild_id, user_id, limit),
-            )
-        else:
-            cursor = await self.conn.execute(
-                "SELECT * FROM server_events WHERE guild_id = ? ORDER BY event_time DESC LIMIT ?",
-                (guild_id, limit),
-            )
-        return await cursor.fetchall()
+        if self._pending_count:
+            await self.flush()
+        async with self._reader() as conn:
+            if user_id is not None:
+                cursor = await conn.execute(
+                    "SELECT * FROM server_events WHERE guild_id = ? AND user_id = ? ORDER BY event_time DESC LIMIT ?",
+                    (guild_id, user_id, limit),
+                )
+            else:
+                cursor = await conn.execute(
+                    "SELECT * FROM server_events WHERE guild_id = ? ORDER BY event_time DESC LIMIT ?",
+                    (guild_id, limit),
+                )
+            return await cursor.fetchall()
     
     async def add_voice_event(
         self,
@@ -290,32 +1180,314 @@ class DBManager:
         timestamp: int,
         event_type: str,
     ) -> None:
-        await self.connect()
-        await self.conn.execute(
-            """
-            INSERT INTO voice_logs(
-            guild_id,
-            user_id,
-            channel_id,
-            channel_name,
-            timestamp,
-            event_type) VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (guild_id, user_id, channel_id,channel_name, timestamp, event_type),
+        """
+        新增一筆語音事件。
+        資料會先放入寫入緩衝，由背景任務批次寫入。
+        """
+        accepted = self._enqueue(
+            "voice_logs",
+            (guild_id, user_id, channel_id, channel_name, timestamp, event_type),
         )
-        await self.conn.commit()
-        
+        if accepted and event_type == "join":
+            self._count_rollup(guild_id, timestamp, "voice_joins")
+
+    # --------- voice_sessions ---------
+    async def open_voice_session(
+        self,
+        *,
+        guild_id: int,
+        user_id: int,
+        channel_id: int,
+        timestamp: int,
+    ) -> None:
+        """
+        開始一段語音停留紀錄 (加入或切換語音頻道時呼叫)。
+        若用戶已有進行中的紀錄，會先以同一時間結束。
+        資料會先放入寫入緩衝，與 voice_logs 在同一個交易中依序寫入。
+        """
+        self._enqueue("voice_sessions", (_SESSION_CLOSE_SQL, (timestamp, guild_id, user_id)))
+        self._enqueue("voice_sessions", (_SESSION_OPEN_SQL, (guild_id, user_id, channel_id, timestamp)))
+
+    async def close_voice_session(self, *, guild_id: int, user_id: int, timestamp: int) -> None:
+        """結束用戶進行中的語音停留紀錄 (離開語音頻道時呼叫)，沒有進行中的紀錄則不做任何事。"""
+        self._enqueue("voice_sessions", (_SESSION_CLOSE_SQL, (timestamp, guild_id, user_id)))
+
+    async def rebuild_voice_sessions(
+        self,
+        *,
+        guild_id: Optional[int] = None,
+        chunk_size: int = 5000,
+        progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> int:
+        """
+        從 voice_logs 重建 voice_sessions。
+
+        依 id 分段讀取 voice_logs (每段 chunk_size 筆)，只在記憶體中保留目前仍在語音中的用戶，
+        已結束的紀錄逐段寫入暫存表；最後在一個交易中補上重建期間新增的事件並替換 voice_sessions，
+        因此重建期間機器人可以繼續寫入。
+
+        參數:
+            guild_id: 只重建指定伺服器，None 代表全部。
+            chunk_size: 每段讀取的 voice_logs 筆數。
+            progress: 每處理完一段後以已處理筆數呼叫的回呼 (可選)。
+        回傳:
+            重建後的紀錄數量。
+        """
+        await self.flush()
+        # (guild_id, user_id) -> (channel_id, start_time)
+        open_sessions: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        guild_filter = "" if guild_id is None else "AND guild_id = ?"
+        guild_params: tuple = () if guild_id is None else (guild_id,)
+        select_sql = (
+            "SELECT id, guild_id, user_id, channel_id, timestamp, event_type FROM voice_logs "
+            f"WHERE id > ? {guild_filter} AND event_type IN ('join', 'leave') ORDER BY id LIMIT ?"
+        )
+
+        async with self.engine.transaction() as conn:
+            await conn.execute("DROP TABLE IF EXISTS temp.voice_sessions_rebuild")
+            await conn.execute(
+                "CREATE TEMP TABLE voice_sessions_rebuild ("
+                "guild_id INTEGER, user_id INTEGER, channel_id INTEGER, "
+                "start_time INTEGER, end_time INTEGER, duration INTEGER)"
+            )
+
+        last_id = 0
+        processed = 0
+        try:
+            while True:
+                async with self._reader() as conn:
+                    cursor = await conn.execute(select_sql, (last_id, *guild_params, chunk_size))
+                    rows = await cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                processed += len(rows)
+                closed = self._pair_voice_events(rows, open_sessions)
+                if closed:
+                    async with self.engine.transaction() as conn:
+                        await conn.executemany(
+                            "INSERT INTO temp.voice_sessions_rebuild VALUES (?, ?, ?, ?, ?, ?)", closed
+                        )
+                if progress is not None:
+                    await progress(processed)
+
+            # 最後一段在持有寫入鎖的交易中處理，期間不會有新的事件寫入
+            async with self.engine.transaction() as conn:
+                while True:
+                    cursor = await conn.execute(select_sql, (last_id, *guild_params, chunk_size))
+                    rows = await cursor.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1]["id"]
+                    processed += len(rows)
+                    closed = self._pair_voice_events(rows, open_sessions)
+                    await conn.executemany(
+                        "INSERT INTO temp.voice_sessions_rebuild VALUES (?, ?, ?, ?, ?, ?)", closed
+                    )
+                await conn.executemany(
+                    "INSERT INTO temp.voice_sessions_rebuild VALUES (?, ?, ?, ?, NULL, NULL)",
+                    [(g, u, c, start) for (g, u), (c, start) in open_sessions.items()],
+                )
+                await conn.execute(f"DELETE FROM voice_sessions WHERE 1 {guild_filter}", guild_params)
+                # 語音統計改由重建後的紀錄重新累加 (新增的已結束紀錄會由觸發器排入佇列)
+                metrics = ", ".join(f"'{metric}'" for metric in _VOICE_ROLLUP_METRICS)
+                for table in ("activity_rollup_hourly", "activity_rollup_daily"):
+                    await conn.execute(
+                        f"DELETE FROM {table} WHERE metric IN ({metrics}) {guild_filter}", guild_params
+                    )
+                await conn.execute(
+                    "DELETE FROM voice_rollup_queue WHERE session_id NOT IN (SELECT session_id FROM voice_sessions)"
+                )
+                await conn.execute(
+                    "INSERT INTO voice_sessions (guild_id, user_id, channel_id, start_time, end_time, duration) "
+                    "SELECT guild_id, user_id, channel_id, start_time, end_time, duration "
+                    "FROM temp.voice_sessions_rebuild ORDER BY start_time"
+                )
+                cursor = await conn.execute("SELECT COUNT(*) FROM temp.voice_sessions_rebuild")
+                total = (await cursor.fetchone())[0]
+        finally:
+            async with self.engine.transaction() as conn:
+                await conn.execute("DROP TABLE IF EXISTS temp.voice_sessions_rebuild")
+
+        log.info(f"已從 {processed} 筆語音事件重建 {total} 筆語音停留紀錄")
+        return total
+
+    async def get_voice_presence_at(
+        self,
+        *,
+        guild_id: int,
+        timestamp: int,
+        channel_id: Optional[int] = None,
+    ) -> List[aiosqlite.Row]:
+        """
+        查詢指定時間點在語音頻道中的用戶。
+
+        已結束的紀錄以 R*Tree 找出涵蓋該時間點的區間，進行中的紀錄以部分索引查詢。
+        停留區間視為 [start_time, end_time)。
+
+        參數:
+            guild_id: 伺服器 ID
+            timestamp: 要查詢的時間點 (UNIX 時間戳)
+            channel_id: 只查詢指定頻道 (可選)
+        回傳:
+            包含 user_id、channel_id、start_time、end_time (進行中為 None) 的列表，依頻道與開始時間排序。
+        """
+        if self._pending["voice_sessions"]:
+            await self.flush()
+        channel_filter = "" if channel_id is None else "AND s.channel_id = :channel_id"
+        sql = f"""
+            SELECT s.user_id, s.channel_id, s.start_time, s.end_time
+            FROM voice_session_rtree AS r
+            JOIN voice_sessions AS s ON s.session_id = r.session_id
+            WHERE r.start_time <= :ts AND r.end_time >= :ts AND r.guild_id = :guild_id
+              AND s.start_time <= :ts AND s.end_time > :ts {channel_filter}
+            UNION ALL
+            SELECT s.user_id, s.channel_id, s.start_time, s.end_time
+            FROM voice_sessions AS s
+            WHERE s.guild_id = :guild_id AND s.end_time IS NULL AND s.start_time <= :ts {channel_filter}
+            ORDER BY channel_id, start_time
+        """
+        params = {"guild_id": guild_id, "ts": timestamp, "channel_id": channel_id}
+        async with self._reader() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def get_user_voice_sessions_between(
+        self,
+        *,
+        guild_id: int,
+        user_id: int,
+        start_ts: int,
+        end_ts: int,
+    ) -> List[aiosqlite.Row]:
+        """
+        查詢用戶在 [start_ts, end_ts) 區間內的語音停留紀錄 (與區間有重疊即列出)。
+        回傳:
+            包含 channel_id、start_time、end_time (進行中為 None)、duration 的列表，依開始時間排序；
+            空列表代表該區間內不在語音中。
+        """
+        if self._pending["voice_sessions"]:
+            await self.flush()
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                """
+                SELECT channel_id, start_time, end_time, duration FROM voice_sessions
+                WHERE guild_id = ? AND user_id = ? AND start_time < ?
+                  AND (end_time IS NULL OR end_time > ?)
+                ORDER BY start_time
+                """,
+                (guild_id, user_id, end_ts, start_ts),
+            )
+            return await cursor.fetchall()
+
+    async def voice_sessions_need_backfill(self) -> bool:
+        """voice_sessions 尚無資料但 voice_logs 已有事件時回傳 True (例如升級後第一次啟動)。"""
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM voice_logs) AND NOT EXISTS (SELECT 1 FROM voice_sessions)"
+            )
+            return bool((await cursor.fetchone())[0])
+
+    @staticmethod
+    def _pair_voice_events(
+        rows: Iterable[Mapping[str, Any]],
+        open_sessions: Dict[Tuple[int, int], Tuple[int, int]],
+    ) -> List[tuple]:
+        """
+        將依時間排序的 join/leave 事件配對成已結束的停留紀錄。
+        open_sessions 會就地更新為處理後仍在語音中的用戶。
+        """
+        closed: List[tuple] = []
+        for row in rows:
+            key = (row["guild_id"], row["user_id"])
+            ts = row["timestamp"]
+            current = open_sessions.pop(key, None)
+            if current is not None:
+                channel_id, start = current
+                end = max(ts, start)
+                closed.append((key[0], key[1], channel_id, start, end, end - start))
+            if row["event_type"] == "join":
+                open_sessions[key] = (row["channel_id"], ts)
+        return closed
+
+    async def repair_open_voice_sessions(
+        self,
+        *,
+        guild_id: int,
+        voice_members: Mapping[int, int],
+        timestamp: int,
+    ) -> Tuple[int, int]:
+        """
+        修復重新啟動 (或斷線) 期間遺漏的語音停留紀錄。
+
+        參數:
+            guild_id: 伺服器 ID
+            voice_members: 目前在語音頻道中的用戶 ID -> 頻道 ID
+            timestamp: 目前時間
+        處理方式:
+            - 進行中的紀錄若用戶已不在原頻道，以該用戶最後一筆語音事件的時間結束
+              (實際離開時間無法得知，取已知的最晚時間)
+            - 目前在語音中但沒有進行中紀錄的用戶，以目前時間開始新的紀錄
+        回傳:
+            (結束的紀錄數量, 新開始的紀錄數量)
+        """
+        await self.flush()
+        async with self.engine.transaction() as conn:
+            cursor = await conn.execute(
+                "SELECT session_id, user_id, channel_id, start_time FROM voice_sessions "
+                "WHERE guild_id = ? AND end_time IS NULL",
+                (guild_id,),
+            )
+            open_rows = await cursor.fetchall()
+
+            closes: List[tuple] = []
+            still_open = set()
+            for row in open_rows:
+                if voice_members.get(row["user_id"]) == row["channel_id"]:
+                    still_open.add(row["user_id"])
+                    continue
+                cursor = await conn.execute(
+                    "SELECT MAX(timestamp) FROM voice_logs WHERE guild_id = ? AND user_id = ? AND timestamp >= ?",
+                    (guild_id, row["user_id"], row["start_time"]),
+                )
+                last_seen = (await cursor.fetchone())[0] or row["start_time"]
+                closes.append((last_seen, last_seen - row["start_time"], row["session_id"]))
+            if closes:
+                await conn.executemany(
+                    "UPDATE voice_sessions SET end_time = ?, duration = ? WHERE session_id = ?", closes
+                )
+
+            opens = [
+                (guild_id, user_id, channel_id, timestamp)
+                for user_id, channel_id in voice_members.items()
+                if user_id not in still_open
+            ]
+            if opens:
+                await conn.executemany(_SESSION_OPEN_SQL, opens)
+
+        if closes or opens:
+            log.info(f"伺服器 {guild_id} 修復語音停留紀錄: 結束 {len(closes)} 筆，新增 {len(opens)} 筆")
+        return len(closes), len(opens)
+
 
     # --------- server_settings CRUD ---------
+    def add_settings_listener(self, callback: Callable[[int], None]) -> None:
+        """
+        註冊設定變更的回呼，set_settings 寫入後會以 guild_id 呼叫。
+        用於讓設定快取在寫入時失效。
+        """
+        self._settings_listeners.append(callback)
+
     async def set_settings(
         self,
         *,
         guild_id: int,
-        notify_channel: Optional[int] = None,
-        voice_log_channel: Optional[int] = None,
-        member_log_channel: Optional[int] = None,
-        message_log_channel: Optional[int] = None,
-        anti_dive_channel: Optional[int] = None,
+        notify_channel: Optional[int] = _UNSET,
+        voice_log_channel: Optional[int] = _UNSET,
+        member_log_channel: Optional[int] = _UNSET,
+        message_log_channel: Optional[int] = _UNSET,
+        anti_dive_channel: Optional[int] = _UNSET,
+        report_channel: Optional[int] = _UNSET,
     ) -> None:
         """
         設定或更新伺服器配置。
@@ -326,53 +1498,65 @@ class DBManager:
             member_log_channel: 成員紀錄頻道 ID (可選)
             message_log_channel: 訊息紀錄頻道 ID (可選)
             anti_dive_channel: 反潛水頻道 ID (可選)
+            report_channel: 週報/月報頻道 ID (可選)
         若該 guild_id 已存在則更新，否則新增。
+        只會寫入有傳入的欄位，傳入 None 代表清除該欄位。
+        以單一 INSERT ... ON CONFLICT DO UPDATE 完成。
         """
-        await self.connect()
-        cursor = await self.conn.execute(
-            "SELECT 1 FROM server_settings WHERE guild_id = ?", (guild_id,)
-        )
-        exists = await cursor.fetchone()
-        if exists:
-            fields: List[str] = []
-            params: List[Any] = []
-            for key, val in [
-                ("notify_channel", notify_channel),
-                ("voice_log_channel", voice_log_channel),
-                ("member_log_channel", member_log_channel),
-                ("message_log_channel", message_log_channel),
-                ("anti_dive_channel", anti_dive_channel),
-            ]:
-                if val is not None:
-                    fields.append(f"{key} = ?")
-                    params.append(val)
-            if fields:
-                params.append(guild_id)
-                await self.conn.execute(
-                    f"UPDATE server_settings SET {', '.join(fields)} WHERE guild_id = ?",
-                    tuple(params),
-                )
-        else:
-            await self.conn.execute(
-                """
-                INSERT INTO server_settings
-                (guild_id, notify_channel,
-                voice_log_channel,
-                member_log_channel,
-                message_log_channel,
-                anti_dive_channel)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    guild_id,
-                    notify_channel,
-                    voice_log_channel,
-                    member_log_channel,
-                    message_log_channel,
-                    anti_dive_channel,
-                ),
+        await self.set_settings_bulk([
+            {
+                "guild_id": guild_id,
+                "notify_channel": notify_channel,
+                "voice_log_channel": voice_log_channel,
+                "member_log_channel": member_log_channel,
+                "message_log_channel": message_log_channel,
+                "anti_dive_channel": anti_dive_channel,
+                "report_channel": report_channel,
+            }
+        ])
+
+    async def set_settings_bulk(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        """
+        批次設定多個伺服器的配置，整批一個交易。
+        參數:
+            rows: 每個元素為包含 guild_id 與要更新欄位的 dict，
+                  未出現 (或值為 _UNSET) 的欄位不會被修改。
+        """
+        # 依照要更新的欄位組合分組，每組一條 UPSERT 以 executemany 執行
+        groups: Dict[Tuple[str, ...], List[tuple]] = {}
+        guild_ids: List[int] = []
+        for row in rows:
+            columns = tuple(
+                column for column in _SETTING_COLUMNS
+                if row.get(column, _UNSET) is not _UNSET
+            )
+            groups.setdefault(columns, []).append(
+                (row["guild_id"], *(row[column] for column in columns))
             )
-        await self.conn.commit()
+            guild_ids.append(row["guild_id"])
+        if not groups:
+            return
+
+        async with self.engine.transaction() as conn:
+            for columns, params in groups.items():
+                if columns:
+                    placeholders = ", ".join("?" for _ in columns)
+                    updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+                    sql = (
+                        f"INSERT INTO server_settings (guild_id, {', '.join(columns)}) "
+                        f"VALUES (?, {placeholders}) "
+                        f"ON CONFLICT(guild_id) DO UPDATE SET {updates}"
+                    )
+                else:
+                    sql = "INSERT INTO server_settings (guild_id) VALUES (?) ON CONFLICT(guild_id) DO NOTHING"
+                await conn.executemany(sql, params)
+
+        for guild_id in dict.fromkeys(guild_ids):
+            for callback in self._settings_listeners:
+                try:
+                    callback(guild_id)
+                except Exception:
+                    log.exception("通知設定變更時發生錯誤")
 
     async def get_settings(self, guild_id: int) -> Optional[aiosqlite.Row]:
         """
@@ -382,14 +1566,117 @@ class DBManager:
         回傳:
             aiosqlite.Row 或 None。
         """
-        await self.connect()
-        cursor = await self.conn.execute(
-            "SELECT * FROM server_settings WHERE guild_id = ?", (guild_id,)
-        )
-        return await cursor.fetchone()
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                "SELECT * FROM server_settings WHERE guild_id = ?", (guild_id,)
+            )
+            return await cursor.fetchone()
         
     # --------- anti_dive CRUD ---------
-    
+
+    def _merge_pending_activity(
+        self, key: Tuple[int, int], message_time: Optional[int], voice_time: Optional[int]
+    ) -> None:
+        """將活動時間合併進記憶體緩衝，每個欄位只保留較新的時間。"""
+        entry = self._activity.get(key)
+        if entry is None:
+            if not self._activity:
+                self._activity_oldest = time.monotonic()
+            self._activity[key] = [message_time, voice_time]
+            return
+        if message_time is not None and (entry[0] is None or message_time > entry[0]):
+            entry[0] = message_time
+        if voice_time is not None and (entry[1] is None or voice_time > entry[1]):
+            entry[1] = voice_time
+
+    def touch_user_activity(
+        self,
+        *,
+        guild_id: int,
+        user_id: int,
+        message_time: Optional[int] = None,
+        voice_time: Optional[int] = None,
+    ) -> None:
+        """
+        記錄用戶的最新活動時間 (僅更新記憶體)。
+
+        參數:
+            guild_id: 伺服器 ID
+            user_id: 用戶 ID
+            message_time: 用戶最後發送訊息的時間戳 (可選)
+            voice_time: 用戶最後在語音頻道的時間戳 (可選)
+
+        每個欄位只保留較新的時間，由背景任務定期以一次 UPSERT 批次寫入 anti_dive。
+        查詢 get_user_activity / get_inactive_users 時會合併尚未寫入的資料。
+        """
+        if message_time is None and voice_time is None:
+            return
+        self._ensure_writer()
+        first = not self._activity
+        self._merge_pending_activity((guild_id, user_id), message_time, voice_time)
+        if message_time is not None:
+            self._count_rollup(guild_id, message_time, "messages")
+        if first:
+            self._wakeup.set()
+
+    @staticmethod
+    def _overlay_activity(row: Mapping[str, Any], pending: List[Optional[int]]) -> Dict[str, Any]:
+        """將記憶體中尚未寫入的活動時間疊加到資料庫的紀錄上。"""
+        merged = dict(row)
+        for column, value in zip(("last_message_time", "last_voice_time"), pending):
+            if value is not None and (merged[column] is None or value > merged[column]):
+                merged[column] = value
+        return merged
+
+    @staticmethod
+    def _is_inactive(
+        row: Mapping[str, Any],
+        message_threshold: Optional[int],
+        voice_threshold: Optional[int],
+        require_both: bool,
+    ) -> bool:
+        """與 get_inactive_users 的 SQL 條件相同的判斷，用於合併記憶體中的資料。"""
+        conditions = []
+        if message_threshold is not None:
+            value = row["last_message_time"]
+            conditions.append(value is None or value < message_threshold)
+        if voice_threshold is not None:
+            value = row["last_voice_time"]
+            conditions.append(value is None or value < voice_threshold)
+        if not conditions:
+            return True
+        return all(conditions) if require_both else any(conditions)
+
+    def _discard_pending_activity(
+        self, guild_id: int, user_id: int, message_time: Optional[int], voice_time: Optional[int]
+    ) -> None:
+        """直接覆寫活動時間時，捨棄記憶體中對應欄位尚未寫入的值。"""
+        pending = self._activity.get((guild_id, user_id))
+        if pending is None:
+            return
+        if message_time is not None:
+            pending[0] = None
+        if voice_time is not None:
+            pending[1] = None
+        if pending[0] is None and pending[1] is None:
+            del self._activity[(guild_id, user_id)]
+
+    @staticmethod
+    async def _existing_activity_users(
+        conn: aiosqlite.Connection, guild_id: int, user_ids: List[int]
+    ) -> set:
+        """回傳在 anti_dive 已有紀錄的用戶 ID。"""
+        existing = set()
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cursor = await conn.execute(
+                f"SELECT user_id FROM anti_dive WHERE guild_id = ? AND user_id IN ({placeholders})",
+                (guild_id, *chunk),
+            )
+            existing.update(row["user_id"] for row in await cursor.fetchall())
+        return existing
+
     async def update_user_activity(
         self, 
         *, 
@@ -408,51 +1695,85 @@ class DBManager:
             voice_time: 用戶最後在語音頻道的時間戳 (可選)
         
         至少需要提供 message_time 或 voice_time 其中之一。
-        如果記錄不存在則創建，如果存在則更新。
+        以單一 INSERT ... ON CONFLICT DO UPDATE 寫入，只更新有提供的欄位。
+        與 touch_user_activity 不同，此方法會直接覆寫 (例如重設為初始值)，
+        並捨棄記憶體中對應欄位尚未寫入的活動時間。
         """
-        await self.connect()
-        
-        # 檢查是否已有該用戶的記錄
-        cursor = await self.conn.execute(
-            "SELECT 1 FROM anti_dive WHERE guild_id = ? AND user_id = ?",
-            (guild_id, user_id)
-        )
-        exists = await cursor.fetchone()
-        
-        if exists:
-            # 更新現有記錄
-            fields = []
-            params = []
-            
-            if message_time is not None:
-                fields.append("last_message_time = ?")
-                params.append(message_time)
-                
-            if voice_time is not None:
-                fields.append("last_voice_time = ?")
-                params.append(voice_time)
-                
-            if fields:
-                params.extend([guild_id, user_id])
-                await self.conn.execute(
-                    f"UPDATE anti_dive SET {', '.join(fields)} WHERE guild_id = ? AND user_id = ?",
-                    tuple(params)
-                )
-        else:
-            # 創建新記錄
-            await self.conn.execute(
-                "INSERT INTO anti_dive (guild_id, user_id, last_message_time, last_voice_time) VALUES (?, ?, ?, ?)",
-                (guild_id, user_id, message_time, voice_time)
+        self._discard_pending_activity(guild_id, user_id, message_time, voice_time)
+
+        async with self.engine.transaction() as conn:
+            await conn.execute(
+                _ACTIVITY_SET_SQL, (guild_id, user_id, message_time, voice_time)
             )
-            
-        await self.conn.commit()
+
+    async def update_user_activity_bulk(
+        self,
+        rows: Iterable[Tuple[int, int, Optional[int], Optional[int]]],
+    ) -> None:
+        """
+        批次更新多位用戶的活動時間，整批一個交易。
+
+        參數:
+            rows: (guild_id, user_id, message_time, voice_time) 的序列，
+                  時間為 None 的欄位不更新。
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        for guild_id, user_id, message_time, voice_time in rows:
+            self._discard_pending_activity(guild_id, user_id, message_time, voice_time)
+
+        async with self.engine.transaction() as conn:
+            await conn.executemany(_ACTIVITY_SET_SQL, rows)
         
+    async def init_user_activity_bulk(
+        self,
+        *,
+        guild_id: int,
+        user_ids: Iterable[int],
+        initial_time: int = 1,
+        chunk_size: int = 5000,
+        progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    ) -> Tuple[int, int]:
+        """
+        批次初始化多位用戶的活動時間 (兩個欄位都設為 initial_time)。
+
+        已有實際活動 (任一欄位不是 NULL 也不是 initial_time) 的用戶不會被覆寫。
+        每段 chunk_size 位用戶以一次 UPSERT executemany 在一個交易中寫入，
+        由資料庫判斷是否覆寫，不需逐一查詢。
+
+        參數:
+            guild_id: 伺服器 ID
+            user_ids: 要初始化的用戶 ID
+            initial_time: 初始化使用的時間值
+            chunk_size: 每個交易處理的用戶數量
+            progress: 每段寫入後以 (已處理數量, 總數) 呼叫的回呼 (可選)
+        回傳:
+            (已初始化數量, 已跳過數量)
+        """
+        user_ids = list(user_ids)
+        # 先寫入記憶體中的活動時間，讓判斷以最新資料為準
+        await self.flush_activity()
+
+        initialized = 0
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            async with self.engine.transaction() as conn:
+                before = conn.total_changes
+                await conn.executemany(
+                    _ACTIVITY_INIT_SQL, [(guild_id, user_id, initial_time) for user_id in chunk]
+                )
+                initialized += conn.total_changes - before
+            if progress is not None:
+                await progress(i + len(chunk), len(user_ids))
+        return initialized, len(user_ids) - initialized
+
     async def get_user_activity(
         self, 
         *, 
         guild_id: int, 
         user_id: Optional[int] = None
-    ) -> List[aiosqlite.Row]:
+    ) -> List[Mapping[str, Any]]:
         """
         獲取指定伺服器中用戶的活動記錄。
         
@@ -461,24 +1782,36 @@ class DBManager:
             user_id: 用戶 ID (可選，若提供則只回傳該用戶的資料)
             
         回傳:
-            符合條件的活動記錄列表。
+            符合條件的活動記錄列表，已合併記憶體中尚未寫入的活動時間。
         """
-        await self.connect()
-        
-        if user_id is not None:
-            cursor = await self.conn.execute(
-                "SELECT * FROM anti_dive WHERE guild_id = ? AND user_id = ?",
-                (guild_id, user_id)
-            )
-            result = await cursor.fetchall()
-            return result
-        else:
-            cursor = await self.conn.execute(
-                "SELECT * FROM anti_dive WHERE guild_id = ?",
-                (guild_id,)
-            )
-            result = await cursor.fetchall()
+        async with self._reader() as conn:
+            if user_id is not None:
+                cursor = await conn.execute(
+                    "SELECT * FROM anti_dive WHERE guild_id = ? AND user_id = ?",
+                    (guild_id, user_id)
+                )
+            else:
+                cursor = await conn.execute(
+                    "SELECT * FROM anti_dive WHERE guild_id = ?",
+                    (guild_id,)
+                )
+            result: List[Any] = list(await cursor.fetchall())
+
+        pending = {
+            key: value for key, value in self._activity.items()
+            if key[0] == guild_id and (user_id is None or key[1] == user_id)
+        }
+        if not pending:
             return result
+
+        for i, row in enumerate(result):
+            value = pending.pop((guild_id, row["user_id"]), None)
+            if value is not None:
+                result[i] = self._overlay_activity(row, value)
+        # 尚未寫入資料庫的新用戶
+        for (g, u), (m, v) in pending.items():
+            result.append({"guild_id": g, "user_id": u, "last_message_time": m, "last_voice_time": v})
+        return result
             
     async def get_inactive_users(
         self, 
@@ -487,7 +1820,7 @@ class DBManager:
         message_threshold: Optional[int] = None, 
         voice_threshold: Optional[int] = None,
         require_both: bool = False
-    ) -> List[aiosqlite.Row]:
+    ) -> List[Mapping[str, Any]]:
         """
         獲取指定伺服器中的非活躍用戶。
         
@@ -498,10 +1831,8 @@ class DBManager:
             require_both: 若為 True，則同時滿足兩個條件才視為非活躍；若為 False，則滿足其一即視為非活躍
             
         回傳:
-            符合非活躍條件的用戶記錄列表。
+            符合非活躍條件的用戶記錄列表，已合併記憶體中尚未寫入的活動時間。
         """
-        await self.connect()
-        
         query_parts = ["SELECT * FROM anti_dive WHERE guild_id = ?"]
         params = [guild_id]
         
@@ -526,10 +1857,200 @@ class DBManager:
         elif voice_condition:
             query_parts.append(f"AND {voice_condition}")
         
-        cursor = await self.conn.execute(" ".join(query_parts), tuple(params))
-        result = await cursor.fetchall()
-        return result
+        async with self._reader() as conn:
+            cursor = await conn.execute(" ".join(query_parts), tuple(params))
+            result: List[Any] = list(await cursor.fetchall())
+
+            pending = {key[1]: value for key, value in self._activity.items() if key[0] == guild_id}
+            if not pending:
+                return result
+            existing = await self._existing_activity_users(conn, guild_id, list(pending))
+
+        # 已在結果中的用戶：疊加較新的時間後重新判斷
+        merged: List[Any] = []
+        for row in result:
+            value = pending.pop(row["user_id"], None)
+            if value is None:
+                merged.append(row)
+                continue
+            row = self._overlay_activity(row, value)
+            if self._is_inactive(row, message_threshold, voice_threshold, require_both):
+                merged.append(row)
+
+        # 不在結果中的用戶：活動時間只會變新，資料庫已有紀錄者必定仍為活躍，
+        # 只需判斷尚未寫入資料庫的新用戶
+        for uid, (m, v) in pending.items():
+            if uid in existing:
+                continue
+            row = {"guild_id": guild_id, "user_id": uid, "last_message_time": m, "last_voice_time": v}
+            if self._is_inactive(row, message_threshold, voice_threshold, require_both):
+                merged.append(row)
+        return merged
         
+    # --------- member_snapshot ---------
+    async def sync_member_snapshot(self, *, guild_id: int, user_ids: Iterable[int]) -> Tuple[int, int]:
+        """
+        以目前的成員列表覆寫伺服器的成員快照。
+        成員 ID 先載入暫存表，再以兩條集合運算補上新成員、移除已離開的成員，整批一個交易。
+        回傳:
+            (新增數量, 移除數量)
+        """
+        async with self.engine.transaction() as conn:
+            await conn.execute("DROP TABLE IF EXISTS temp.member_snapshot_sync")
+            await conn.execute("CREATE TEMP TABLE member_snapshot_sync (user_id INTEGER PRIMARY KEY)")
+            try:
+                await conn.executemany(
+                    "INSERT OR IGNORE INTO temp.member_snapshot_sync VALUES (?)",
+                    [(user_id,) for user_id in user_ids],
+                )
+                cursor = await conn.execute(
+                    """
+                    DELETE FROM member_snapshot WHERE guild_id = ?
+                      AND user_id NOT IN (SELECT user_id FROM temp.member_snapshot_sync)
+                    """,
+                    (guild_id,),
+                )
+                removed = cursor.rowcount
+                cursor = await conn.execute(
+                    "INSERT OR IGNORE INTO member_snapshot (guild_id, user_id) "
+                    "SELECT ?, user_id FROM temp.member_snapshot_sync",
+                    (guild_id,),
+                )
+                added = cursor.rowcount
+            finally:
+                await conn.execute("DROP TABLE IF EXISTS temp.member_snapshot_sync")
+        return added, removed
+
+    async def add_member_snapshot(self, *, guild_id: int, user_id: int) -> None:
+        """成員加入時加入快照。"""
+        async with self.engine.transaction() as conn:
+            await conn.execute(
+                "INSERT OR IGNORE INTO member_snapshot (guild_id, user_id) VALUES (?, ?)",
+                (guild_id, user_id),
+            )
+
+    async def remove_member_snapshot(self, *, guild_id: int, user_id: int) -> None:
+        """成員離開時從快照移除。"""
+        async with self.engine.transaction() as conn:
+            await conn.execute(
+                "DELETE FROM member_snapshot WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+            )
+
+    async def list_dive_members(
+        self,
+        *,
+        guild_id: int,
+        threshold: int,
+        after: Optional[Tuple[int, int]] = None,
+        limit: int = 100,
+    ) -> List[aiosqlite.Row]:
+        """
+        以成員快照與 anti_dive 查詢潛水成員，依最後活動時間 (最久沒活動的在前) 分頁。
+
+        一次查詢涵蓋三種情況：
+        - 在伺服器中但 anti_dive 沒有紀錄的成員 (最後活動視為 0)
+        - 最後活動 (訊息與語音取較新者) 早於 threshold 的成員
+        - anti_dive 有紀錄但已不在成員快照中 (已離開) 且早於 threshold 的用戶
+
+        參數:
+            guild_id: 伺服器 ID
+            threshold: 最後活動早於此時間戳即視為潛水
+            after: 上一頁最後一列的 (last_activity, user_id)，None 代表第一頁
+            limit: 每頁筆數
+        回傳:
+            包含 user_id、last_message_time、last_voice_time、last_activity、status 的列表，
+            依 (last_activity, user_id) 排序。status 為 "never" (沒有活動紀錄或只有初始值)、
+            "inactive" 或 "departed" (已離開伺服器)。
+        """
+        # 記憶體中尚未寫入的活動時間只會讓用戶變活躍，先寫入再查詢
+        if self._activity:
+            await self.flush_activity()
+        after_activity, after_user = after if after is not None else (-1, 0)
+        expr = _LAST_ACTIVITY_EXPR.replace("last_", "a.last_")
+        # 兩個子查詢各自依索引順序輸出，UNION ALL 以合併排序取前 limit 筆；
+        # 沒有紀錄的成員最後活動皆為 0，先依主鍵取 limit 筆，避免整批排序
+        sql = f"""
+            SELECT * FROM (
+                SELECT s.user_id, NULL AS last_message_time, NULL AS last_voice_time,
+                       0 AS last_activity, 'never' AS status
+                FROM member_snapshot AS s
+                WHERE s.guild_id = :guild_id AND :threshold > 0
+                  AND s.user_id > CASE
+                      WHEN :after_activity < 0 THEN -1
+                      WHEN :after_activity = 0 THEN :after_user
+                      ELSE 9223372036854775807
+                  END
+                  AND NOT EXISTS (
+                      SELECT 1 FROM anti_dive AS a WHERE a.guild_id = s.guild_id AND a.user_id = s.user_id
+                  )
+                ORDER BY s.user_id
+                LIMIT :limit
+            )
+            UNION ALL
+            SELECT a.user_id, a.last_message_time, a.last_voice_time, {expr} AS last_activity,
+                   CASE
+                       WHEN s.user_id IS NULL THEN 'departed'
+                       WHEN {expr} <= 1 THEN 'never'
+                       ELSE 'inactive'
+                   END AS status
+            FROM anti_dive AS a
+            LEFT JOIN member_snapshot AS s ON s.guild_id = a.guild_id AND s.user_id = a.user_id
+            WHERE a.guild_id = :guild_id AND {expr} < :threshold
+              AND {expr} >= :after_activity AND ({expr} > :after_activity OR a.user_id > :after_user)
+            ORDER BY last_activity, user_id
+            LIMIT :limit
+        """
+        params = {
+            "guild_id": guild_id,
+            "threshold": threshold,
+            "after_activity": after_activity,
+            "after_user": after_user,
+            "limit": limit,
+        }
+        async with self._reader() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def count_dive_members(self, *, guild_id: int, threshold: int) -> Dict[str, int]:
+        """
+        統計 list_dive_members 各狀態的數量。
+        回傳:
+            {"never": ..., "inactive": ..., "departed": ...}
+        """
+        if self._activity:
+            await self.flush_activity()
+        expr = _LAST_ACTIVITY_EXPR.replace("last_", "a.last_")
+        counts = {"never": 0, "inactive": 0, "departed": 0}
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                f"""
+                SELECT CASE
+                           WHEN s.user_id IS NULL THEN 'departed'
+                           WHEN {expr} <= 1 THEN 'never'
+                           ELSE 'inactive'
+                       END AS status, COUNT(*)
+                FROM anti_dive AS a
+                LEFT JOIN member_snapshot AS s ON s.guild_id = a.guild_id AND s.user_id = a.user_id
+                WHERE a.guild_id = ? AND {expr} < ?
+                GROUP BY status
+                """,
+                (guild_id, threshold),
+            )
+            for status, count in await cursor.fetchall():
+                counts[status] = count
+            if threshold > 0:
+                cursor = await conn.execute(
+                    """
+                    SELECT COUNT(*) FROM member_snapshot AS s
+                    WHERE s.guild_id = ? AND NOT EXISTS (
+                        SELECT 1 FROM anti_dive AS a WHERE a.guild_id = s.guild_id AND a.user_id = s.user_id
+                    )
+                    """,
+                    (guild_id,),
+                )
+                counts["never"] += (await cursor.fetchone())[0]
+        return counts
+
     async def delete_user_activity(self, *, guild_id: int, user_id: int) -> None:
         """
         刪除指定用戶的活動記錄。
@@ -538,9 +2059,90 @@ class DBManager:
             guild_id: 伺服器 ID
             user_id: 用戶 ID
         """
-        await self.connect()
-        await self.conn.execute(
-            "DELETE FROM anti_dive WHERE guild_id = ? AND user_id = ?",
-            (guild_id, user_id)
+        self._activity.pop((guild_id, user_id), None)
+        async with self.engine.transaction() as conn:
+            await conn.execute(
+                "DELETE FROM anti_dive WHERE guild_id = ? AND user_id = ?",
+                (guild_id, user_id)
+            )
+
+    # --------- message_cache ---------
+    async def cache_message(
+        self,
+        *,
+        message_id: int,
+        guild_id: int,
+        channel_id: int,
+        author_id: int,
+        content: str,
+        attachments: Iterable[str] = (),
+    ) -> None:
+        """
+        記錄一則訊息的內容。
+        資料會先放入寫入緩衝，由背景任務批次寫入。
+        """
+        self._enqueue(
+            "message_cache",
+            (
+                _MESSAGE_CACHE_INSERT_SQL,
+                (message_id, guild_id, channel_id, author_id, content, "\n".join(attachments)),
+            ),
         )
-        await self.conn.commit()
+
+    async def update_cached_message(self, *, message_id: int, content: str, attachments: Iterable[str] = ()) -> None:
+        """以編輯後的內容更新訊息快取，沒有紀錄則不做任何事。"""
+        self._enqueue("message_cache", (_MESSAGE_CACHE_EDIT_SQL, (content, "\n".join(attachments), message_id)))
+
+    async def delete_cached_messages(self, message_ids: Iterable[int]) -> None:
+        """移除已刪除訊息的快取內容。"""
+        for message_id in message_ids:
+            self._enqueue("message_cache", (_MESSAGE_CACHE_DELETE_SQL, (message_id,)))
+
+    async def get_cached_messages(self, message_ids: Iterable[int]) -> Dict[int, aiosqlite.Row]:
+        """
+        查詢訊息快取 (尚在寫入緩衝中的資料不會被查到)。
+        回傳:
+            message_id -> 資料列，沒有紀錄的訊息不會出現在結果中。
+        """
+        ids = list(message_ids)
+        found: Dict[int, aiosqlite.Row] = {}
+        async with self._reader() as conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cursor = await conn.execute(
+                    f"SELECT * FROM message_cache WHERE message_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for row in await cursor.fetchall():
+                    found[row["message_id"]] = row
+        return found
+
+    async def get_previous_cached_message(self, *, channel_id: int, message_id: int) -> Optional[aiosqlite.Row]:
+        """查詢同一頻道中 message_id 之前最近的一則快取訊息。"""
+        async with self._reader() as conn:
+            cursor = await conn.execute(
+                "SELECT * FROM message_cache WHERE channel_id = ? AND message_id < ? "
+                "ORDER BY message_id DESC LIMIT 1",
+                (channel_id, message_id),
+            )
+            return await cursor.fetchone()
+
+    async def prune_message_cache(self, *, before_id: int, chunk_size: int = 5000) -> int:
+        """
+        刪除 message_id 小於 before_id 的訊息快取 (以 discord.utils.time_snowflake 換算時間)。
+        每次交易最多刪除 chunk_size 筆，避免長時間佔用寫入連線。
+        回傳:
+            刪除的筆數。
+        """
+        removed = 0
+        while True:
+            async with self.engine.transaction() as conn:
+                cursor = await conn.execute(
+                    "DELETE FROM message_cache WHERE message_id IN ("
+                    "SELECT message_id FROM message_cache WHERE message_id < ? LIMIT ?)",
+                    (before_id, chunk_size),
+                )
+                deleted = cursor.rowcount
+            removed += deleted
+            if deleted < chunk_size:
+                return removed
@@ -0,0 +1,172 @@
+import bisect
+import functools
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# 直方圖的桶上限 (秒)：0.1 ms 起每個桶乘以 √2，到約 105 秒，超過的落在最後的 +Inf 桶
+_BUCKETS: Tuple[float, ...] = tuple(0.0001 * 2 ** (i / 2) for i in range(41))
+
+_PROMETHEUS_METRIC = "bot_operation_latency_seconds"
+
+
+class Histogram:
+    """固定桶的延遲直方圖，記錄與估算百分位數都只需常數時間與記憶體"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """以桶內線性內插估算百分位數 (q 介於 0 與 1 之間)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            if seen + count >= rank:
+                lower = _BUCKETS[index - 1] if index > 0 else 0.0
+                upper = _BUCKETS[index] if index < len(_BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class Instrumentation:
+    """
+    延遲量測。
+
+    以 (類別, 名稱) 為單位記錄延遲直方圖，類別包括:
+    - listener: 各擴充的事件處理器 (例如 VoiceLogger.on_voice_state_update)
+    - command: 斜線指令 (從互動建立到指令完成或失敗，名稱附上結果；包含 gateway 傳遞的延遲)
+    - db: DBManager / TempVoiceDatabase 的查詢方法
+    - rest: 日誌訊息的 REST 發送
+    enabled 為 False 時包裝過的函式只多一次屬性判斷；
+    設定中停用時 Bot 不會包裝任何函式，完全沒有額外開銷。
+    """
+
+    def __init__(self, *, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        # 原始事件處理器 -> 包裝後的函式，移除事件處理器時使用
+        self._listeners: Dict[Callable[..., Awaitable[Any]], Callable[..., Awaitable[Any]]] = {}
+        self.started_at = time.time()
+
+    def record(self, kind: str, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        histogram = self._histograms.get((kind, name))
+        if histogram is None:
+            histogram = self._histograms[(kind, name)] = Histogram()
+        histogram.observe(seconds)
+
+    def wrap(self, kind: str, name: str, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """包裝協程函式，記錄每次呼叫的耗時 (包含拋出例外的呼叫)"""
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return await func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.record(kind, name, time.perf_counter() - start)
+
+        return wrapper
+
+    def wrap_listener(self, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """包裝事件處理器，名稱為 類別.方法 (例如 VoiceLogger.on_voice_state_update)"""
+        wrapper = self._listeners.get(func)
+        if wrapper is None:
+            wrapper = self._listeners[func] = self.wrap("listener", func.__qualname__, func)
+        return wrapper
+
+    def unwrap_listener(self, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """取回包裝後的事件處理器並停止追蹤，沒有包裝過則回傳原函式"""
+        return self._listeners.pop(func, func)
+
+    def instrument(self, obj: Any, *, kind: str = "db", prefix: Optional[str] = None) -> None:
+        """將物件所有公開的協程方法換成記錄耗時的版本 (只影響這個實例)"""
+        prefix = prefix or type(obj).__name__
+        for name, _ in inspect.getmembers(type(obj), inspect.iscoroutinefunction):
+            if name.startswith("_"):
+                continue
+            setattr(obj, name, self.wrap(kind, f"{prefix}.{name}", getattr(obj, name)))
+
+    def reset(self) -> None:
+        self._histograms.clear()
+        self.started_at = time.time()
+
+    def summary(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        取得各項目的統計。
+        回傳:
+            dict 的 list，包含 kind、name、count、total、p50、p95、p99、max (秒)。
+        """
+        rows = []
+        for (k, name), h in self._histograms.items():
+            if kind is not None and k != kind:
+                continue
+            rows.append({
+                "kind": k,
+                "name": name,
+                "count": h.count,
+                "total": h.total,
+                "p50": h.percentile(0.50),
+                "p95": h.percentile(0.95),
+                "p99": h.percentile(0.99),
+                "max": h.max,
+            })
+        return rows
+
+    def top(self, *, kind: Optional[str] = None, sort: str = "p95", limit: int = 10) -> List[Dict[str, Any]]:
+        """依 sort 欄位 (p50、p95、p99、max、total、count) 由大到小排序的前 limit 項"""
+        return sorted(self.summary(kind), key=lambda row: row[sort], reverse=True)[:limit]
+
+    def snapshot(self) -> List[Tuple[str, str, List[int], int, float]]:
+        """複製所有直方圖的計數 (kind, name, counts, count, total)，複製後可在其他執行緒格式化"""
+        return [(kind, name, list(h.counts), h.count, h.total) for (kind, name), h in self._histograms.items()]
+
+    def to_prometheus(self) -> str:
+        """以 Prometheus 文字格式輸出所有直方圖"""
+        return render_prometheus(self.snapshot())
+
+
+def render_prometheus(snapshot: List[Tuple[str, str, List[int], int, float]]) -> str:
+    """將 Instrumentation.snapshot 的結果格式化為 Prometheus 文字格式"""
+    lines = [
+        f"# HELP {_PROMETHEUS_METRIC} Latency of bot listeners, commands, database queries and REST sends.",
+        f"# TYPE {_PROMETHEUS_METRIC} histogram",
+    ]
+    for kind, name, counts, count, total in sorted(snapshot):
+        labels = f'kind="{escape_label(kind)}",name="{escape_label(name)}"'
+        cumulative = 0
+        for bound, bucket in zip(_BUCKETS, counts):
+            cumulative += bucket
+            lines.append(f'{_PROMETHEUS_METRIC}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'{_PROMETHEUS_METRIC}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"{_PROMETHEUS_METRIC}_sum{{{labels}}} {total:.9g}")
+        lines.append(f"{_PROMETHEUS_METRIC}_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    """Prometheus 標籤值的跳脫"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
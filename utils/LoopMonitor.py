@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# 專案根目錄與擴充目錄，用於從堆疊中找出專案自己的程式碼
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+_COGS_DIR = _PROJECT_ROOT / "cogs"
+
+
+def _describe(frame) -> str:
+    code = frame.f_code
+    try:
+        path = Path(code.co_filename).resolve().relative_to(_PROJECT_ROOT).as_posix()
+    except ValueError:
+        path = code.co_filename
+    return f"{path}:{frame.f_lineno} {getattr(code, 'co_qualname', code.co_name)}"
+
+
+class LoopMonitor:
+    """
+    事件迴圈延遲監控。
+
+    - 事件迴圈中的心跳每 interval 秒醒來一次，以實際多睡的時間量測排程延遲
+    - 監控執行緒 (watchdog) 在心跳逾時超過 threshold 秒時擷取事件迴圈執行緒當下的堆疊，
+      記錄正在執行的擴充方法 (例如 AntiDive.check_dive)，
+      即使事件迴圈一直沒有恢復也能在日誌中看到卡住的位置
+    - 心跳恢復後記錄一次阻塞 (持續時間、位置)，保留最近 max_stalls 筆供 /ping 與 /metrics 查看
+    事件迴圈被 CPU 工作卡住太久時 gateway 心跳送不出去，Discord 會中斷連線。
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.25,
+        threshold: float = 0.5,
+        watchdog: bool = True,
+        max_stalls: int = 20,
+        window: float = 60.0,
+    ):
+        """
+        參數:
+            interval: 心跳間隔 (秒)
+            threshold: 延遲超過此值 (秒) 視為阻塞
+            watchdog: 是否啟動監控執行緒擷取阻塞時的堆疊
+            max_stalls: 保留的阻塞紀錄筆數
+            window: 統計最大延遲的時間範圍 (秒)
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.watchdog = watchdog
+        self.lag = 0.0
+        self._samples: Deque[float] = deque(maxlen=max(1, int(window / interval)))
+        self._stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self._stall_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # 心跳預計醒來的時間 (time.monotonic)，由監控執行緒讀取
+        self._deadline = 0.0
+        # 監控執行緒為 _deadline 那次心跳擷取到的堆疊
+        self._capture: Optional[Dict[str, Any]] = None
+        self._captured_for = 0.0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """在事件迴圈中呼叫"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._deadline = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-monitor")
+        if self.watchdog:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-monitor-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._deadline = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._deadline)
+            self.lag = lag
+            self._samples.append(lag)
+            if lag > self.threshold:
+                self._record_stall(lag)
+
+    def _record_stall(self, lag: float) -> None:
+        with self._lock:
+            capture = self._capture if self._captured_for == self._deadline else None
+            self._capture = None
+        stall: Dict[str, Any] = {"at": time.time() - lag, "duration": lag, "location": None, "cog": None}
+        if capture is not None:
+            stall.update(capture)
+        self._stall_count += 1
+        self._stalls.append(stall)
+        log.warning(
+            f"事件迴圈阻塞 {lag:.2f} 秒"
+            + (f"，位置: {stall['cog'] or stall['location']}" if capture is not None else "")
+        )
+
+    def _watch(self) -> None:
+        """監控執行緒：心跳逾時時擷取事件迴圈執行緒的堆疊 (每次阻塞只擷取一次)"""
+        check = min(self.interval, self.threshold) / 2
+        while not self._stopping.wait(check):
+            deadline = self._deadline
+            overdue = time.monotonic() - deadline
+            if overdue <= self.threshold or self._captured_for == deadline:
+                continue
+            capture = self._capture_stack()
+            if capture is None:
+                continue
+            with self._lock:
+                self._capture = capture
+                self._captured_for = deadline
+            log.warning(
+                f"事件迴圈已阻塞超過 {overdue:.2f} 秒，位置: {capture['cog'] or capture['location']}\n"
+                f"{capture['stack']}"
+            )
+
+    def _capture_stack(self) -> Optional[Dict[str, Any]]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        location = cog = None
+        for f, _ in traceback.walk_stack(frame):
+            path = Path(f.f_code.co_filename).resolve()
+            if path == Path(__file__).resolve() or _PROJECT_ROOT not in path.parents:
+                continue
+            if location is None:
+                location = _describe(f)
+            if _COGS_DIR in path.parents:
+                cog = _describe(f)
+                break
+        # 不在這裡查詢 asyncio.current_task：事件迴圈的工作表只能在事件迴圈執行緒中讀取
+        return {
+            "location": location,
+            "cog": cog,
+            "stack": "".join(traceback.format_stack(frame)),
+        }
+
+    @property
+    def stalls(self) -> List[Dict[str, Any]]:
+        """最近的阻塞紀錄 (由舊到新)，包含 at (Unix 時間)、duration、location、cog 與 stack"""
+        return list(self._stalls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        取得事件迴圈延遲的統計資料。
+        回傳:
+            dict，包含 lag (最近一次)、max_lag 與 avg_lag (統計範圍內)、stalls (累計阻塞次數)、
+            last_stall (最近一次阻塞，沒有則為 None)，延遲單位為秒。
+        """
+        samples = list(self._samples)
+        return {
+            "lag": self.lag,
+            "max_lag": max(samples, default=0.0),
+            "avg_lag": sum(samples) / len(samples) if samples else 0.0,
+            "stalls": self._stall_count,
+            "last_stall": self._stalls[-1] if self._stalls else None,
+        }
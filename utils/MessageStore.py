@@ -0,0 +1,210 @@
+import logging
+import zlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple, Union
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+class StoredMessage:
+    """
+    精簡的訊息紀錄，只保留日誌需要的欄位。
+    內容超過壓縮門檻時以 zlib 壓縮後的 bytes 保存，讀取 content 時才解壓縮。
+    """
+
+    __slots__ = ("id", "channel_id", "guild_id", "author_id", "_content", "attachments")
+
+    def __init__(
+        self,
+        message_id: int,
+        channel_id: int,
+        guild_id: int,
+        author_id: int,
+        content: Union[str, bytes],
+        attachments: Tuple[str, ...] = (),
+    ):
+        self.id = message_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self._content = content
+        self.attachments = attachments
+
+    @property
+    def content(self) -> str:
+        if isinstance(self._content, bytes):
+            return zlib.decompress(self._content).decode("utf-8")
+        return self._content
+
+    @property
+    def size(self) -> int:
+        """內容佔用的大約位元組數 (壓縮後)"""
+        if isinstance(self._content, bytes):
+            return len(self._content)
+        return len(self._content.encode("utf-8"))
+
+    @property
+    def created_at(self):
+        return discord.utils.snowflake_time(self.id)
+
+    @property
+    def jump_url(self) -> str:
+        return f"https://discord.com/channels/{self.guild_id}/{self.channel_id}/{self.id}"
+
+
+class MessageStore:
+    """
+    訊息內容快取。
+
+    訊息刪除/編輯事件需要原始內容與附近的訊息，discord.py 內建的訊息快取容量小且不分頻道，
+    未命中時只能呼叫 API。此快取為每個頻道保留一個固定長度的環狀緩衝區：
+    - 每個頻道最多保留 max_per_channel 則，超過時丟棄最舊的訊息
+    - 最多保留 max_channels 個頻道，超過時丟棄最久沒有新訊息的頻道
+    - 內容總大小超過 max_bytes 時，從最久沒有新訊息的頻道開始丟棄最舊的訊息
+    - 內容長度達 compress_threshold 位元組時壓縮保存，0 代表不壓縮
+    """
+
+    def __init__(
+        self,
+        *,
+        max_per_channel: int = 200,
+        max_channels: int = 500,
+        max_bytes: int = 32 * 1024 * 1024,
+        compress_threshold: int = 256,
+    ):
+        self.max_per_channel = max_per_channel
+        self.max_channels = max_channels
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        # 頻道 ID -> 由舊到新的訊息，依最近一次新增訊息的時間排序 (最久的在前)
+        self._channels: "OrderedDict[int, Deque[StoredMessage]]" = OrderedDict()
+        self._index: Dict[int, StoredMessage] = {}
+        self._bytes = 0
+        # 編輯/刪除時查詢原始內容的次數與命中次數
+        self._lookups = 0
+        self._hits = 0
+
+    def _pack(self, content: str) -> Union[str, bytes]:
+        if self.compress_threshold and len(content) * 3 >= self.compress_threshold:
+            encoded = content.encode("utf-8")
+            if len(encoded) >= self.compress_threshold:
+                compressed = zlib.compress(encoded)
+                if len(compressed) < len(encoded):
+                    return compressed
+        return content
+
+    def add(self, message: discord.Message) -> Optional[StoredMessage]:
+        """記錄一則新訊息，私訊不記錄"""
+        if message.guild is None or self.max_per_channel <= 0:
+            return None
+        if message.id in self._index:
+            return self.update(message)
+
+        record = StoredMessage(
+            message.id,
+            message.channel.id,
+            message.guild.id,
+            message.author.id,
+            self._pack(message.content or ""),
+            tuple(a.filename for a in message.attachments),
+        )
+        buffer = self._channels.get(record.channel_id)
+        if buffer is None:
+            buffer = self._channels[record.channel_id] = deque()
+            while len(self._channels) > self.max_channels:
+                self._drop_channel(next(iter(self._channels)))
+        else:
+            self._channels.move_to_end(record.channel_id)
+
+        if len(buffer) >= self.max_per_channel:
+            self._forget(buffer.popleft())
+        buffer.append(record)
+        self._index[record.id] = record
+        self._bytes += record.size
+        self._enforce_bytes()
+        return record
+
+    def update(self, message: discord.Message) -> Optional[StoredMessage]:
+        """
+        以編輯後的內容更新紀錄。
+        回傳:
+            編輯前的紀錄 (新物件)，若原本沒有記錄則為 None。
+        """
+        self._lookups += 1
+        record = self._index.get(message.id)
+        if record is None:
+            return None
+        self._hits += 1
+        previous = StoredMessage(
+            record.id, record.channel_id, record.guild_id, record.author_id, record._content, record.attachments
+        )
+        self._bytes -= record.size
+        record._content = self._pack(message.content or "")
+        record.attachments = tuple(a.filename for a in message.attachments)
+        self._bytes += record.size
+        self._enforce_bytes()
+        return previous
+
+    def get(self, message_id: int) -> Optional[StoredMessage]:
+        return self._index.get(message_id)
+
+    def remove(self, message_id: int) -> Optional[StoredMessage]:
+        """移除並回傳紀錄 (訊息被刪除時)"""
+        self._lookups += 1
+        record = self._index.get(message_id)
+        if record is None:
+            return None
+        self._hits += 1
+        buffer = self._channels.get(record.channel_id)
+        if buffer is not None:
+            try:
+                buffer.remove(record)
+            except ValueError:
+                pass
+            if not buffer:
+                del self._channels[record.channel_id]
+        self._forget(record)
+        return record
+
+    def previous(self, channel_id: int, message_id: int) -> Optional[StoredMessage]:
+        """同一頻道中 message_id 之前最近的一則訊息"""
+        buffer = self._channels.get(channel_id)
+        if not buffer:
+            return None
+        for record in reversed(buffer):
+            if record.id < message_id:
+                return record
+        return None
+
+    def remove_channel(self, channel_id: int) -> None:
+        """頻道被刪除時丟棄該頻道的所有紀錄"""
+        if channel_id in self._channels:
+            self._drop_channel(channel_id)
+
+    def _drop_channel(self, channel_id: int) -> None:
+        for record in self._channels.pop(channel_id):
+            self._forget(record)
+
+    def _forget(self, record: StoredMessage) -> None:
+        if self._index.get(record.id) is record:
+            del self._index[record.id]
+            self._bytes -= record.size
+
+    def _enforce_bytes(self) -> None:
+        while self._bytes > self.max_bytes and self._channels:
+            channel_id, buffer = next(iter(self._channels.items()))
+            self._forget(buffer.popleft())
+            if not buffer:
+                del self._channels[channel_id]
+
+    def get_stats(self) -> Dict[str, int]:
+        """快取的頻道數、訊息數、內容大小，以及編輯/刪除時的查詢與命中次數"""
+        return {
+            "channels": len(self._channels),
+            "messages": len(self._index),
+            "bytes": self._bytes,
+            "lookups": self._lookups,
+            "hits": self._hits,
+        }
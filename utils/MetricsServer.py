@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import discord
+from aiohttp import web
+
+from utils.Instrumentation import escape_label, render_prometheus
+
+log = logging.getLogger(__name__)
+
+# (指標名稱, 類型, 說明, [(標籤, 數值), ...])
+_Family = Tuple[str, str, str, List[Tuple[Tuple[Tuple[str, str], ...], float]]]
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _guild_id(obj: Any) -> Optional[int]:
+    """由事件的第一個參數取得伺服器 ID (成員、訊息、raw payload、伺服器本身等)"""
+    if isinstance(obj, discord.Guild):
+        return obj.id
+    guild_id = getattr(obj, "guild_id", None)
+    if isinstance(guild_id, int):
+        return guild_id
+    guild = getattr(obj, "guild", None)
+    return guild.id if isinstance(guild, discord.Guild) else None
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _render(families: List[_Family], histograms) -> str:
+    """將指標快照格式化為 Prometheus 文字格式 (在執行緒中執行)"""
+    lines: List[str] = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{key}="{escape_label(str(val))}"' for key, val in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    text = "\n".join(lines) + "\n"
+    if histograms is not None:
+        text += render_prometheus(histograms)
+    return text
+
+
+class MetricsServer:
+    """
+    本機的監控 HTTP 端點。
+
+    - GET /healthz: JSON 格式的健康狀態；機器人未就緒、事件迴圈延遲過高或資料庫寫入積壓過久時回應 503
+    - GET /metrics: Prometheus 文字格式的指標，包括 gateway 延遲、事件迴圈延遲、資料庫寫入佇列深度與最後寫入時間、
+      日誌發送佇列、快取命中率、各伺服器的事件數與 Instrumentation 的延遲直方圖
+    所有數值都取自記憶體中的統計，不查詢資料庫也不呼叫 Discord API；
+    事件迴圈中只複製計數，格式化成文字在執行緒中進行，抓取指標不會卡住事件處理。
+    """
+
+    def __init__(
+        self,
+        bot,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 9100,
+        max_lag: float = 1.0,
+        max_pending_age: float = 60.0,
+        max_event_series: int = 5000,
+    ):
+        """
+        參數:
+            bot: 機器人
+            host, port: 監聽的位址與埠，預設只接受本機連線
+            max_lag: 事件迴圈延遲超過此值 (秒) 時 /healthz 回報異常
+            max_pending_age: 資料庫寫入緩衝中最舊的資料超過此秒數未寫入時 /healthz 回報異常
+            max_event_series: 事件計數最多記錄的 (伺服器, 事件) 組合數
+        """
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.max_lag = max_lag
+        self.max_pending_age = max_pending_age
+        self.max_event_series = max_event_series
+        self._runner: Optional[web.AppRunner] = None
+        # (伺服器 ID, 事件名稱) -> 次數
+        self._events: Dict[Tuple[int, str], int] = {}
+        self._events_overflow = 0
+        self.started_at = time.time()
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/healthz", self._handle_healthz)
+        app.router.add_get("/metrics", self._handle_metrics)
+        # 抓取頻繁，不記錄每次請求
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info(f"監控端點已啟動: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def count_event(self, event_name: str, args: tuple) -> None:
+        """記錄一次事件 (由 Bot.dispatch 呼叫)，沒有所屬伺服器的事件不計"""
+        guild_id = _guild_id(args[0]) if args else None
+        if guild_id is None:
+            return
+        key = (guild_id, event_name)
+        count = self._events.get(key)
+        if count is not None:
+            self._events[key] = count + 1
+        elif len(self._events) < self.max_event_series:
+            self._events[key] = 1
+        else:
+            self._events_overflow += 1
+
+    def health(self) -> Tuple[bool, Dict[str, Any]]:
+        """
+        檢查健康狀態。
+        回傳:
+            (是否健康, 狀態 dict)
+        """
+        bot = self.bot
+        writer = bot.db_manager.get_writer_stats()
+        loop = bot.loop_monitor.get_stats()
+        latency = bot.latency
+        problems = []
+        if bot.is_closed():
+            problems.append("closed")
+        elif not bot.is_ready():
+            problems.append("not_ready")
+        if not math.isfinite(latency):
+            problems.append("gateway_disconnected")
+        if loop["lag"] > self.max_lag:
+            problems.append("event_loop_lag")
+        if writer["oldest_pending_age"] > self.max_pending_age:
+            problems.append("db_writer_backlog")
+        return not problems, {
+            "status": "ok" if not problems else "unhealthy",
+            "problems": problems,
+            "ready": bot.is_ready(),
+            "gateway_latency": latency if math.isfinite(latency) else None,
+            "event_loop_lag": loop["lag"],
+            "event_loop_stalls": loop["stalls"],
+            "db_queue_depth": writer["queue_depth"],
+            "db_oldest_pending_age": writer["oldest_pending_age"],
+            "db_last_flush_at": writer["last_flush_at"],
+            "outbound_queue_depth": bot.outbound.queue_depth,
+            "uptime": time.time() - self.started_at,
+        }
+
+    def _collect(self) -> List[_Family]:
+        """在事件迴圈中複製目前的統計數值 (只做常數時間或與項目數成正比的複製)"""
+        bot = self.bot
+        families: List[_Family] = []
+
+        def add(name: str, kind: str, help_text: str, value: float) -> None:
+            families.append((name, kind, help_text, [((), float(value))]))
+
+        def add_labeled(name: str, kind: str, help_text: str, label: str, values: Dict[Any, float]) -> None:
+            families.append((name, kind, help_text, [(((label, key),), float(v)) for key, v in values.items()]))
+
+        add("bot_ready", "gauge", "Whether the bot has finished connecting to the gateway.", bot.is_ready())
+        add("bot_start_time_seconds", "gauge", "Unix time the metrics server started.", self.started_at)
+        add("bot_guilds", "gauge", "Number of guilds the bot is in.", len(bot.guilds))
+        add("bot_gateway_latency_seconds", "gauge", "Gateway heartbeat latency.", bot.latency)
+        loop = bot.loop_monitor.get_stats()
+        add("bot_event_loop_lag_seconds", "gauge", "Most recent event loop lag sample.", loop["lag"])
+        add("bot_event_loop_lag_max_seconds", "gauge", "Largest event loop lag in the last minute.", loop["max_lag"])
+        add(
+            "bot_event_loop_stalls_total", "counter", "Times the event loop was blocked longer than the threshold.",
+            loop["stalls"],
+        )
+
+        writer = bot.db_manager.get_writer_stats()
+        add("bot_db_write_queue_depth", "gauge", "Rows waiting in the database write buffer.", writer["queue_depth"])
+        add_labeled(
+            "bot_db_write_queue_table_depth", "gauge", "Rows waiting in the database write buffer per table.",
+            "table", writer["queue_depth_by_table"],
+        )
+        add(
+            "bot_db_oldest_pending_age_seconds", "gauge", "Age of the oldest row waiting in the write buffer.",
+            writer["oldest_pending_age"],
+        )
+        add(
+            "bot_db_pending_activity", "gauge", "Member activity updates waiting to be written.",
+            writer["pending_activity"],
+        )
+        add("bot_db_flushes_total", "counter", "Write buffer flushes.", writer["flushes"])
+        add("bot_db_failed_flushes_total", "counter", "Write buffer flushes that failed.", writer["failed_flushes"])
+        add("bot_db_rows_flushed_total", "counter", "Rows written by the write buffer.", writer["rows_flushed"])
+        add(
+            "bot_db_last_flush_timestamp_seconds", "gauge", "Unix time of the last write buffer flush.",
+            writer["last_flush_at"] or 0.0,
+        )
+        add("bot_db_last_flush_latency_seconds", "gauge", "Duration of the last flush.", writer["last_flush_latency"])
+        add("bot_db_max_flush_latency_seconds", "gauge", "Longest flush so far.", writer["max_flush_latency"])
+
+        pool = bot.db_engine.get_pool_stats()
+        add("bot_db_read_pool_in_use", "gauge", "Read connections currently in use.", pool["in_use"])
+        add("bot_db_read_pool_waits_total", "counter", "Reads that had to wait for a connection.", pool["waits"])
+
+        outbound = bot.outbound.get_stats()
+        add_labeled(
+            "bot_outbound_queue_depth", "gauge", "Log messages waiting to be sent per priority.",
+            "priority", outbound["queue_depth_by_priority"],
+        )
+        add_labeled(
+            "bot_outbound_messages_total", "counter", "Log messages by outcome.",
+            "result", {result: outbound[result] for result in ("sent", "failed", "merged", "dropped")},
+        )
+        add(
+            "bot_outbound_max_queue_wait_seconds", "gauge", "Longest time a log message waited in the queue.",
+            outbound["max_queue_wait"],
+        )
+        if "delivery" in outbound:
+            delivery = outbound["delivery"]
+            add_labeled(
+                "bot_webhook_sends_total", "counter", "Log messages sent through webhooks or the fallback path.",
+                "path", {"webhook": delivery["webhook_sends"], "fallback": delivery["fallback_sends"]},
+            )
+
+        caches = {
+            "settings": bot.settings_cache.get_stats(),
+            "message_store": bot.message_store.get_stats(),
+        }
+        for cog in bot.cogs.values():
+            audit_log_cache = getattr(cog, "audit_log_cache", None)
+            if audit_log_cache is not None:
+                caches["audit_log"] = audit_log_cache.get_stats()
+        add_labeled(
+            "bot_cache_lookups_total", "counter", "Cache lookups.",
+            "cache", {name: stats["lookups"] for name, stats in caches.items()},
+        )
+        add_labeled(
+            "bot_cache_hits_total", "counter", "Cache hits.",
+            "cache", {name: stats["hits"] for name, stats in caches.items()},
+        )
+        add_labeled(
+            "bot_cache_hit_ratio", "gauge", "Cache hit ratio since start.",
+            "cache", {
+                name: stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+                for name, stats in caches.items()
+            },
+        )
+        add(
+            "bot_message_store_messages", "gauge", "Messages held in the message store.",
+            caches["message_store"]["messages"],
+        )
+        add(
+            "bot_message_store_bytes", "gauge", "Content bytes held in the message store.",
+            caches["message_store"]["bytes"],
+        )
+
+        families.append((
+            "bot_gateway_events_total", "counter", "Gateway events dispatched per guild and event.",
+            [
+                ((("guild", guild_id), ("event", event)), float(count))
+                for (guild_id, event), count in self._events.items()
+            ],
+        ))
+        add(
+            "bot_gateway_events_untracked_total", "counter",
+            "Events not counted per guild because the series limit was reached.", self._events_overflow,
+        )
+        return families
+
+    async def _handle_healthz(self, request: web.Request) -> web.Response:
+        healthy, body = self.health()
+        return web.json_response(body, status=200 if healthy else 503)
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        families = self._collect()
+        instrumentation = self.bot.instrumentation
+        histograms = instrumentation.snapshot() if instrumentation.enabled else None
+        text = await asyncio.to_thread(_render, families, histograms)
+        return web.Response(body=text.encode("utf-8"), headers={"Content-Type": _CONTENT_TYPE})
@@ -0,0 +1,307 @@
+import asyncio
+import enum
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, Optional, Sequence
+
+import discord
+
+if TYPE_CHECKING:
+    from utils.Instrumentation import Instrumentation
+    from utils.WebhookDelivery import WebhookDelivery
+
+log = logging.getLogger(__name__)
+
+# Discord 單則訊息的 embed 數量與總字數上限
+_MAX_EMBEDS_PER_MESSAGE = 10
+_MAX_MESSAGE_EMBED_CHARS = 6000
+
+_DROP_POLICIES = ("drop_oldest", "drop_newest")
+
+
+class Priority(enum.IntEnum):
+    """發送優先順序，數字越小越先發送"""
+    HIGH = 0    # 懲處等管理通知 (notify_channel)
+    NORMAL = 1  # 成員、訊息日誌
+    LOW = 2     # 語音日誌、定期報告等可以延後的訊息
+
+
+class _Outbound:
+    __slots__ = ("content", "embeds", "file", "priority", "queued_at")
+
+    def __init__(
+        self,
+        content: Optional[str],
+        embeds: List[discord.Embed],
+        file: Optional[discord.File],
+        priority: Priority,
+    ):
+        self.content = content
+        self.embeds = embeds
+        self.file = file
+        self.priority = priority
+        self.queued_at = time.monotonic()
+
+    @property
+    def mergeable(self) -> bool:
+        """只有 embed 的訊息可以與相鄰的訊息合併"""
+        return self.content is None and self.file is None and bool(self.embeds)
+
+
+class _ChannelQueue:
+    """單一頻道的待發送訊息，每個優先順序一條佇列，並以 token bucket 控制發送速度"""
+
+    __slots__ = ("channel", "lanes", "worker", "tokens", "refilled_at")
+
+    def __init__(self, channel: discord.abc.Messageable, rate: int):
+        self.channel = channel
+        self.lanes: List[Deque[_Outbound]] = [deque() for _ in Priority]
+        self.worker: Optional[asyncio.Task] = None
+        self.tokens = float(rate)
+        self.refilled_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self.lanes)
+
+
+class OutboundScheduler:
+    """
+    日誌訊息的集中發送排程器。
+
+    事件處理器呼叫 submit 後立即返回，訊息由背景工作依頻道依序發送，
+    緩慢或被限速的 REST 請求不會卡住 gateway 事件的處理。
+    - 每個頻道一條佇列與一個背景工作；Discord 發送訊息的速率限制以頻道為單位，
+      各頻道以 token bucket (每 per 秒 rate 則) 控制發送速度，一個頻道被限速不影響其他頻道
+    - 同一頻道中 HIGH 優先於 NORMAL 優先於 LOW
+    - 相鄰且只有 embed 的同優先訊息會合併成一則 (最多 10 個 embed)，減少請求數
+    - 每個頻道最多 max_per_channel 則、全部最多 max_total 則；超過時依 drop_policy
+      丟棄最舊的低優先訊息 (drop_oldest) 或拒絕新的訊息 (drop_newest)，不會為了較低優先的訊息丟棄較高優先的訊息
+    - 設定 delivery (WebhookDelivery) 時經由 webhook 發送，不與指令回覆共用機器人的速率限制
+    """
+
+    def __init__(
+        self,
+        *,
+        max_per_channel: int = 200,
+        max_total: int = 5000,
+        drop_policy: str = "drop_oldest",
+        merge: bool = True,
+        rate: int = 5,
+        per: float = 5.0,
+        delivery: Optional["WebhookDelivery"] = None,
+        instrumentation: Optional["Instrumentation"] = None,
+    ):
+        """
+        參數:
+            max_per_channel: 每個頻道最多暫存的訊息數。
+            max_total: 所有頻道合計最多暫存的訊息數。
+            drop_policy: 超過上限時的處理方式，drop_oldest 或 drop_newest。
+            merge: 是否合併相鄰的 embed 訊息。
+            rate, per: 每個頻道每 per 秒最多發送 rate 則訊息。
+            delivery: webhook 發送後端，None 代表以一般訊息發送。
+            instrumentation: 記錄每次發送延遲的量測物件 (可選)。
+        """
+        if drop_policy not in _DROP_POLICIES:
+            raise ValueError(f"未知的 drop_policy: {drop_policy}，可用: {', '.join(_DROP_POLICIES)}")
+        self.max_per_channel = max_per_channel
+        self.max_total = max_total
+        self.drop_policy = drop_policy
+        self.merge = merge
+        self.rate = rate
+        self.per = per
+        self.delivery = delivery
+        self.instrumentation = instrumentation
+        self._queues: Dict[int, _ChannelQueue] = {}
+        self._depth = 0
+        self._closing = False
+        self._stats: Dict[str, Any] = {
+            "submitted": 0,
+            "sent": 0,
+            "merged": 0,
+            "dropped": 0,
+            "failed": 0,
+            "last_send_latency": 0.0,
+            "max_send_latency": 0.0,
+            "total_send_latency": 0.0,
+            "max_queue_wait": 0.0,
+            "total_queue_wait": 0.0,
+        }
+
+    def submit(
+        self,
+        channel: discord.abc.Messageable,
+        *,
+        content: Optional[str] = None,
+        embed: Optional[discord.Embed] = None,
+        embeds: Optional[Sequence[discord.Embed]] = None,
+        file: Optional[discord.File] = None,
+        priority: Priority = Priority.NORMAL,
+    ) -> bool:
+        """
+        將訊息排入發送佇列，立即返回。
+        回傳:
+            是否已排入佇列 (因容量上限或排程器已關閉而被丟棄時為 False)。
+        """
+        if self._closing:
+            self._stats["dropped"] += 1
+            log.warning(f"發送排程已關閉，丟棄送往頻道 {channel.id} 的訊息")
+            return False
+        self._stats["submitted"] += 1
+        items = list(embeds or ())
+        if embed is not None:
+            items.append(embed)
+        item = _Outbound(content, items, file, priority)
+
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = _ChannelQueue(channel, self.rate)
+        queue.channel = channel
+
+        if len(queue) >= self.max_per_channel and not self._make_room([queue], priority):
+            return self._reject(channel)
+        if self._depth >= self.max_total and not self._make_room(self._queues.values(), priority):
+            return self._reject(channel)
+
+        queue.lanes[priority].append(item)
+        self._depth += 1
+        if queue.worker is None or queue.worker.done():
+            queue.worker = asyncio.create_task(self._run(channel.id), name=f"outbound-{channel.id}")
+        return True
+
+    def _reject(self, channel: discord.abc.Messageable) -> bool:
+        self._stats["dropped"] += 1
+        log.warning(f"發送佇列已滿，丟棄送往頻道 {channel.id} 的訊息")
+        return False
+
+    def _make_room(self, queues: Iterable[_ChannelQueue], priority: Priority) -> bool:
+        """依 drop_policy 丟棄一則優先順序不高於 priority 的最舊訊息，成功時回傳 True"""
+        if self.drop_policy == "drop_newest":
+            return False
+        queues = list(queues)
+        for lane in range(len(Priority) - 1, priority - 1, -1):
+            candidates = [q for q in queues if q.lanes[lane]]
+            if not candidates:
+                continue
+            oldest = min(candidates, key=lambda q: q.lanes[lane][0].queued_at)
+            oldest.lanes[lane].popleft()
+            self._depth -= 1
+            self._stats["dropped"] += 1
+            return True
+        return False
+
+    def _next(self, queue: _ChannelQueue) -> Optional[_Outbound]:
+        """取出最高優先的訊息，並合併其後可合併的訊息"""
+        for lane in queue.lanes:
+            if not lane:
+                continue
+            item = lane.popleft()
+            self._depth -= 1
+            if self.merge and item.mergeable:
+                size = sum(len(e) for e in item.embeds)
+                while lane and lane[0].mergeable:
+                    following = lane[0]
+                    extra = sum(len(e) for e in following.embeds)
+                    if (
+                        len(item.embeds) + len(following.embeds) > _MAX_EMBEDS_PER_MESSAGE
+                        or size + extra > _MAX_MESSAGE_EMBED_CHARS
+                    ):
+                        break
+                    lane.popleft()
+                    self._depth -= 1
+                    item.embeds = item.embeds + following.embeds
+                    size += extra
+                    self._stats["merged"] += 1
+            return item
+        return None
+
+    async def _acquire(self, queue: _ChannelQueue) -> None:
+        """token bucket：每 per 秒補充 rate 個發送額度"""
+        now = time.monotonic()
+        queue.tokens = min(float(self.rate), queue.tokens + (now - queue.refilled_at) * self.rate / self.per)
+        queue.refilled_at = now
+        if queue.tokens < 1:
+            await asyncio.sleep((1 - queue.tokens) * self.per / self.rate)
+            queue.tokens = 1.0
+            queue.refilled_at = time.monotonic()
+        queue.tokens -= 1
+
+    async def _run(self, channel_id: int) -> None:
+        """單一頻道的背景發送工作，佇列清空後結束"""
+        queue = self._queues[channel_id]
+        while True:
+            item = self._next(queue)
+            if item is None:
+                # 取出與移除之間沒有 await，不會與 submit 交錯
+                if self._queues.get(channel_id) is queue:
+                    del self._queues[channel_id]
+                return
+            await self._acquire(queue)
+            started = time.monotonic()
+            wait = started - item.queued_at
+            try:
+                if self.delivery is not None:
+                    await self.delivery.send(queue.channel, content=item.content, embeds=item.embeds, file=item.file)
+                elif item.file is not None:
+                    await queue.channel.send(content=item.content, embeds=item.embeds, file=item.file)
+                else:
+                    await queue.channel.send(content=item.content, embeds=item.embeds)
+                self._stats["sent"] += 1
+            except discord.Forbidden:
+                self._stats["failed"] += 1
+                log.warning(f"沒有權限發送訊息到頻道 {channel_id}")
+            except Exception as _:
+                self._stats["failed"] += 1
+                log.exception(f"發送訊息到頻道 {channel_id} 時發生錯誤")
+            latency = time.monotonic() - started
+            if self.instrumentation is not None:
+                self.instrumentation.record("rest", f"outbound.send[{item.priority.name}]", latency)
+            stats = self._stats
+            stats["last_send_latency"] = latency
+            stats["max_send_latency"] = max(stats["max_send_latency"], latency)
+            stats["total_send_latency"] += latency
+            stats["max_queue_wait"] = max(stats["max_queue_wait"], wait)
+            stats["total_queue_wait"] += wait
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """停止接受新訊息，並在 timeout 秒內盡量送完佇列中的訊息"""
+        self._closing = True
+        workers = [q.worker for q in self._queues.values() if q.worker is not None and not q.worker.done()]
+        if workers:
+            _, pending = await asyncio.wait(workers, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                log.warning(f"關閉時仍有 {self._depth} 則訊息未發送")
+        if self.delivery is not None:
+            await self.delivery.close()
+
+    @property
+    def closing(self) -> bool:
+        """是否已停止接受新訊息 (close 已被呼叫)"""
+        return self._closing
+
+    @property
+    def queue_depth(self) -> int:
+        """目前所有頻道尚未發送的訊息數"""
+        return self._depth
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        取得發送排程的統計資料。
+        回傳:
+            dict，包含 queue_depth、queue_depth_by_priority、channels、submitted、sent、merged、dropped、failed、
+            avg/max/last_send_latency 與 avg/max_queue_wait 等欄位 (延遲單位為秒)。
+        """
+        stats = dict(self._stats)
+        attempts = stats["sent"] + stats["failed"]
+        stats["queue_depth"] = self._depth
+        stats["queue_depth_by_priority"] = {
+            p.name: sum(len(q.lanes[p]) for q in self._queues.values()) for p in Priority
+        }
+        stats["channels"] = len(self._queues)
+        stats["avg_send_latency"] = stats["total_send_latency"] / attempts if attempts else 0.0
+        stats["avg_queue_wait"] = stats["total_queue_wait"] / attempts if attempts else 0.0
+        if self.delivery is not None:
+            stats["delivery"] = self.delivery.get_stats()
+        return stats
@@ -1,8 +1,15 @@
+import asyncio
+import inspect
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Union
+
 import discord
 
-from typing import List
 from discord.ui import View, button
 
+log = logging.getLogger(__name__)
+
 """
 Paginator 分頁器類別
 
@@ -62,4 +69,192 @@ class Paginator(View):
             if hasattr(self, "message"):
                 await self.message.edit(view=self)
         except:
-            pass
\ No newline at end of file
+            pass
+
+"""
+KeysetPageSource / LazyPaginator 延遲載入的分頁器
+
+作用：
+Paginator 需要事先建好所有 embed，資料量大時第一頁要等全部查詢、組裝完成才能顯示。
+LazyPaginator 改為向頁面來源 (KeysetPageSource) 逐頁取資料，切換到該頁時才組裝 embed，
+並以 LRU 快取保留最近幾頁與預先載入的下一頁；頁數以一次 COUNT 估算，顯示為「N/~M」。
+第一頁的延遲只取決於每頁筆數，與紀錄總數無關。
+
+傳入參數：
+- KeysetPageSource(fetch, key, per_page, count)
+  - fetch(after, limit): 回傳排在 after (上一頁最後一筆的 key) 之後的最多 limit 筆資料，after 為 None 代表第一頁
+  - key(row): 取出一筆資料的分頁鍵，例如 (punished_at, punish_id)
+  - count(): 回傳總筆數 (可選)，只用於顯示頁數
+- LazyPaginator(source, render, cache_size)
+  - render(rows, page_index): 將一頁資料組成 embed，可為 async 函式
+
+使用方式範例：
+source = KeysetPageSource(
+    lambda after, limit: db.list_punishments(guild_id=gid, user_id=uid, before=after, limit=limit),
+    key=lambda r: (r["punished_at"], r["punish_id"]),
+    per_page=5,
+    count=lambda: db.count_punishments(guild_id=gid, user_id=uid),
+)
+paginator = LazyPaginator(source, render)
+embed = await paginator.first_page()   # 沒有任何資料時為 None
+paginator.message = await interaction.followup.send(embed=embed, view=paginator, ephemeral=True)
+"""
+
+class KeysetPageSource:
+    def __init__(
+        self,
+        fetch: Callable[[Optional[Any], int], Awaitable[List[Any]]],
+        *,
+        key: Callable[[Any], Any],
+        per_page: int,
+        count: Optional[Callable[[], Awaitable[int]]] = None,
+    ):
+        self.fetch = fetch
+        self.key = key
+        self.per_page = per_page
+        self._count = count
+        # cursors[i] 為第 i 頁的起點 (上一頁最後一筆的 key)；只能依序往後取得
+        self._cursors: List[Optional[Any]] = [None]
+        # 已確定的最後一頁 (取到不足一頁或沒有下一筆時)
+        self.last_page: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def get_page(self, index: int) -> List[Any]:
+        """
+        取得第 index 頁 (從 0 開始) 的資料。
+        尚未走過的頁面會從最後一個已知起點依序往後讀取，超出範圍時回傳空列表。
+        """
+        async with self._lock:
+            while len(self._cursors) <= index:
+                if self.last_page is not None:
+                    return []
+                await self._fetch(len(self._cursors) - 1)
+            return await self._fetch(index)
+
+    async def _fetch(self, index: int) -> List[Any]:
+        # 多取一筆判斷是否還有下一頁
+        rows = list(await self.fetch(self._cursors[index], self.per_page + 1))
+        has_next = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if has_next:
+            if len(self._cursors) == index + 1:
+                self._cursors.append(self.key(rows[-1]))
+        else:
+            self.last_page = index if rows or index == 0 else index - 1
+            del self._cursors[index + 1:]
+        return rows
+
+    async def estimate_pages(self) -> Optional[int]:
+        """以 COUNT 估算總頁數，沒有提供 count 時回傳 None。"""
+        if self._count is None:
+            return None
+        total = await self._count()
+        return max(1, -(-total // self.per_page))
+
+
+class LazyPaginator(View):
+    def __init__(
+        self,
+        source: KeysetPageSource,
+        render: Callable[[List[Any], int], Union[discord.Embed, Awaitable[discord.Embed]]],
+        *,
+        cache_size: int = 5,
+        timeout: float = 120,
+    ):
+        super().__init__(timeout=timeout)
+        self.source = source
+        self.render = render
+        self.cache_size = cache_size
+        self.current = 0
+        self.estimated_pages: Optional[int] = None
+        self._cache: "OrderedDict[int, discord.Embed]" = OrderedDict()
+        self._prefetch: Optional[asyncio.Task] = None
+        self.page_indicator = discord.ui.Button(label="1", style=discord.ButtonStyle.secondary, disabled=True)
+        self.add_item(self.page_indicator)
+
+    async def first_page(self) -> Optional[discord.Embed]:
+        """載入第一頁並估算頁數，沒有任何資料時回傳 None。"""
+        embed, self.estimated_pages = await asyncio.gather(self._get(0), self.source.estimate_pages())
+        if embed is None:
+            return None
+        self._refresh_buttons()
+        self._schedule_prefetch(1)
+        return embed
+
+    async def _get(self, index: int) -> Optional[discord.Embed]:
+        """取得第 index 頁的 embed，優先使用快取。"""
+        embed = self._cache.get(index)
+        if embed is not None:
+            self._cache.move_to_end(index)
+            return embed
+        rows = await self.source.get_page(index)
+        if not rows:
+            return None
+        embed = self.render(rows, index)
+        if inspect.isawaitable(embed):
+            embed = await embed
+        self._cache[index] = embed
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return embed
+
+    def _schedule_prefetch(self, index: int) -> None:
+        """背景預先載入下一頁，讓翻頁時不必等待查詢。"""
+        if index in self._cache or (self.source.last_page is not None and index > self.source.last_page):
+            return
+        if self._prefetch is not None and not self._prefetch.done():
+            return
+
+        async def prefetch() -> None:
+            try:
+                await self._get(index)
+                self._refresh_buttons()
+            except Exception:
+                log.exception("預先載入分頁時發生錯誤")
+
+        self._prefetch = asyncio.create_task(prefetch())
+
+    def _refresh_buttons(self) -> None:
+        last = self.source.last_page
+        self.previous.disabled = self.current == 0
+        self.next.disabled = last is not None and self.current >= last
+        if last is not None:
+            self.page_indicator.label = f"{self.current + 1}/{last + 1}"
+        elif self.estimated_pages is not None:
+            self.page_indicator.label = f"{self.current + 1}/~{max(self.estimated_pages, self.current + 2)}"
+        else:
+            self.page_indicator.label = f"{self.current + 1}"
+
+    @button(label="◀️", style=discord.ButtonStyle.primary, disabled=True)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.current - 1)
+
+    @button(label="▶️", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.current + 1)
+
+    async def _show(self, interaction: discord.Interaction, index: int):
+        index = max(0, index)
+        embed = await self._get(index)
+        if embed is None:
+            # 資料在瀏覽期間減少，停在目前已知的最後一頁
+            index = self.source.last_page or 0
+            embed = await self._get(index)
+        self.current = index
+        self._refresh_buttons()
+        if embed is None:
+            await interaction.response.edit_message(view=self)
+        else:
+            await interaction.response.edit_message(embed=embed, view=self)
+        self._schedule_prefetch(index + 1)
+
+    async def on_timeout(self):
+        if self._prefetch is not None:
+            self._prefetch.cancel()
+        for child in self.children:
+            child.disabled = True
+        try:
+            if hasattr(self, "message"):
+                await self.message.edit(view=self)
+        except:
+            pass
@@ -0,0 +1,167 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import AbstractSet, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import discord
+
+log = logging.getLogger(__name__)
+
+# Discord 只允許批次刪除 14 天內的訊息，每次最多 100 則
+BULK_DELETE_MAX_AGE = timedelta(days=14)
+BULK_DELETE_LIMIT = 100
+# 預留時間，避免訊息在刪除過程中超過 14 天導致整批失敗
+BULK_DELETE_MARGIN = timedelta(minutes=5)
+
+# 指定使用者時最多往回掃描的訊息數，避免使用者很少發言時掃完整個頻道
+DEFAULT_SCAN_LIMIT = 5000
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+async def collect_messages(
+    channel: discord.abc.Messageable,
+    *,
+    limit: int,
+    users: Optional[AbstractSet[int]] = None,
+    after: Optional[discord.abc.Snowflake] = None,
+    before: Optional[discord.abc.Snowflake] = None,
+    scan_limit: Optional[int] = DEFAULT_SCAN_LIMIT,
+) -> Tuple[List[discord.Message], bool]:
+    """
+    由新到舊收集 (after, before) 之間 (不含兩端) 的訊息。
+
+    範圍交給 channel.history 的 before/after 參數，只拉取需要的頁面；
+    每頁到達時即依 users 過濾，收集到 limit 則就停止，不再拉取下一頁。
+
+    Args:
+        channel: 要收集的頻道
+        limit: 最多收集幾則 (過濾後)
+        users: 只收集這些使用者的訊息，None 或空集合代表不限
+        after: 下界 (不含)，例如目標訊息
+        before: 上界 (不含)，例如指令本身的 snowflake，避免收集到指令之後的新訊息
+        scan_limit: 指定 users 時最多掃描的訊息數 (過濾前)，None 代表不限；
+            未指定 users 時掃描數量就是 limit
+
+    Returns:
+        (符合條件的訊息 (由新到舊), 是否已掃描完整個範圍)；
+        因收集到 limit 則或達到 scan_limit 而提前停止時為 False，此時 after 與其後的部分訊息並未掃描
+    """
+    messages: List[discord.Message] = []
+    if limit <= 0:
+        return messages, False
+    if not users:
+        scan_limit = limit
+
+    scanned = 0
+    async for msg in channel.history(limit=scan_limit, before=before, after=after, oldest_first=False):
+        scanned += 1
+        if users and msg.author.id not in users:
+            continue
+        messages.append(msg)
+        if len(messages) >= limit:
+            return messages, False
+    # 剛好掃描 scan_limit 則時無法確定範圍內是否還有訊息，視為未掃描完
+    return messages, scan_limit is None or scanned < scan_limit
+
+
+def split_by_bulk_age(
+    messages: Sequence[discord.abc.Snowflake], now: Optional[datetime] = None
+) -> Tuple[List[discord.abc.Snowflake], List[discord.abc.Snowflake]]:
+    """
+    依訊息 ID (snowflake) 內含的建立時間，將訊息分為可批次刪除與只能逐則刪除兩組。
+
+    Returns:
+        (14 天內可批次刪除的訊息, 超過 14 天的訊息)，各自保持原本順序
+    """
+    now = now or discord.utils.utcnow()
+    cutoff = discord.utils.time_snowflake(now - BULK_DELETE_MAX_AGE + BULK_DELETE_MARGIN)
+    bulk = [m for m in messages if m.id > cutoff]
+    single = [m for m in messages if m.id <= cutoff]
+    return bulk, single
+
+
+class _Progress:
+    """依時間節流的進度回報，最多每 interval 秒呼叫一次回呼。"""
+
+    def __init__(self, callback: Optional[ProgressCallback], total: int, interval: float):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._last = time.monotonic()
+
+    async def advance(self, count: int) -> None:
+        self.done += count
+        if self.callback is None or self.done >= self.total:
+            return
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            await self.callback(self.done, self.total)
+        except discord.HTTPException:
+            log.debug("更新刪除進度失敗", exc_info=True)
+
+
+async def purge_messages(
+    channel: discord.abc.Messageable,
+    messages: Sequence[discord.Message],
+    *,
+    progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 2.0,
+) -> Tuple[int, int]:
+    """
+    刪除指定的訊息。
+
+    14 天內的訊息以 channel.delete_messages 每 100 則一次批次刪除；
+    超過 14 天的訊息只能逐則刪除，速率限制交由 discord.py 依回應標頭等待，不另外固定休息。
+    批次刪除失敗時 (例如其中有訊息已被刪除) 改為逐則刪除該批訊息。
+
+    Args:
+        channel: 訊息所在的頻道
+        messages: 要刪除的訊息
+        progress: 進度回呼 (已處理數量, 總數)，依時間節流，完成時不會呼叫 (由呼叫端顯示結果)
+        progress_interval: 兩次進度回呼之間最少間隔的秒數
+
+    Returns:
+        (成功數量, 失敗數量)
+    """
+    bulk, single = split_by_bulk_age(messages)
+    tracker = _Progress(progress, len(messages), progress_interval)
+    success = failed = 0
+
+    for i in range(0, len(bulk), BULK_DELETE_LIMIT):
+        chunk = bulk[i:i + BULK_DELETE_LIMIT]
+        try:
+            await channel.delete_messages(chunk)
+            success += len(chunk)
+        except discord.Forbidden:
+            failed += len(chunk)
+        except discord.HTTPException as e:
+            log.warning(f"批次刪除 {len(chunk)} 則訊息失敗，改為逐則刪除: {e}")
+            ok, bad = await _delete_each(chunk)
+            success += ok
+            failed += bad
+        await tracker.advance(len(chunk))
+
+    for msg in single:
+        ok, bad = await _delete_each([msg])
+        success += ok
+        failed += bad
+        await tracker.advance(1)
+
+    return success, failed
+
+
+async def _delete_each(messages: Sequence[discord.Message]) -> Tuple[int, int]:
+    """逐則刪除，回傳 (成功數量, 失敗數量)。"""
+    success = failed = 0
+    for msg in messages:
+        try:
+            await msg.delete()
+            success += 1
+        except (discord.Forbidden, discord.HTTPException):
+            failed += 1
+    return success, failed
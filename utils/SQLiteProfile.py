@@ -0,0 +1,169 @@
+import logging
+import os
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+import aiosqlite
+
+log = logging.getLogger(__name__)
+
+_JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+_SYNCHRONOUS = {"off", "normal", "full", "extra"}
+_TEMP_STORE = {"default", "file", "memory"}
+
+
+class SQLiteProfile:
+    """
+    SQLite 連線調校設定。
+
+    於建立連線時套用 journal_mode、synchronous、mmap_size、cache_size、
+    temp_store 與 busy_timeout，並提供 PRAGMA optimize 的執行間隔。
+    PRAGMA 不支援參數綁定，因此所有值在建立時即檢查合法性。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        journal_mode: str = "wal",
+        synchronous: str = "normal",
+        mmap_size: int = 0,
+        cache_size: int = -2000,
+        temp_store: str = "default",
+        busy_timeout: int = 5000,
+        optimize_interval: int = 3600,
+    ) -> None:
+        """
+        參數:
+            name: 設定名稱 (僅用於記錄)
+            journal_mode: 日誌模式，建議使用 wal 讓讀取不會被寫入阻擋
+            synchronous: 同步等級，wal 模式下 normal 只在 checkpoint 時 fsync
+            mmap_size: 記憶體映射大小 (bytes)，0 代表停用
+            cache_size: 頁面快取大小，負值代表 KiB
+            temp_store: 暫存資料表/索引存放位置
+            busy_timeout: 資料庫被鎖定時的等待毫秒數
+            optimize_interval: 定期執行 PRAGMA optimize 的間隔秒數，0 代表只在關閉時執行
+        """
+        journal_mode = str(journal_mode).lower()
+        synchronous = str(synchronous).lower()
+        temp_store = str(temp_store).lower()
+        if journal_mode not in _JOURNAL_MODES:
+            raise ValueError(f"無效的 journal_mode: {journal_mode}")
+        if synchronous not in _SYNCHRONOUS:
+            raise ValueError(f"無效的 synchronous: {synchronous}")
+        if temp_store not in _TEMP_STORE:
+            raise ValueError(f"無效的 temp_store: {temp_store}")
+
+        self.name = name
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = int(mmap_size)
+        self.cache_size = int(cache_size)
+        self.temp_store = temp_store
+        self.busy_timeout = int(busy_timeout)
+        self.optimize_interval = int(optimize_interval)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "temp_store": self.temp_store,
+            "busy_timeout": self.busy_timeout,
+            "optimize_interval": self.optimize_interval,
+        }
+
+    def with_overrides(self, **overrides: Any) -> "SQLiteProfile":
+        """回傳套用覆寫值後的新設定。"""
+        values = self.as_dict()
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return SQLiteProfile(self.name, **values)
+
+    async def apply(self, conn: aiosqlite.Connection) -> None:
+        """於新建立的連線上套用所有 PRAGMA。"""
+        # busy_timeout 先設定，切換 journal_mode 時才不會因鎖定而失敗
+        await conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        await self.apply_schema(conn, "main")
+        await conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+
+    async def apply_schema(self, conn: aiosqlite.Connection, schema: str) -> None:
+        """
+        套用以 schema 為單位的 PRAGMA (journal_mode、synchronous、mmap_size、cache_size)。
+        以 ATTACH DATABASE 掛載的資料庫需要個別套用。
+        """
+        async with conn.execute(f"PRAGMA {schema}.journal_mode = {self.journal_mode}") as cursor:
+            row = await cursor.fetchone()
+            actual = str(row[0]).lower() if row else None
+        if actual != self.journal_mode:
+            # 例如 :memory: 資料庫無法使用 wal
+            log.warning(f"SQLite {schema}.journal_mode 設定為 {self.journal_mode}，實際為 {actual}")
+        await conn.execute(f"PRAGMA {schema}.synchronous = {self.synchronous}")
+        await conn.execute(f"PRAGMA {schema}.mmap_size = {self.mmap_size}")
+        await conn.execute(f"PRAGMA {schema}.cache_size = {self.cache_size}")
+
+    async def apply_reader(self, conn: aiosqlite.Connection, schemas: Iterable[str] = ("main",)) -> None:
+        """
+        於唯讀連線上套用 PRAGMA。
+        journal_mode 與 synchronous 由寫入連線決定，這裡只設定快取相關項目並禁止寫入。
+        """
+        await conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        for schema in schemas:
+            await conn.execute(f"PRAGMA {schema}.mmap_size = {self.mmap_size}")
+            await conn.execute(f"PRAGMA {schema}.cache_size = {self.cache_size}")
+        await conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+        await conn.execute("PRAGMA query_only = 1")
+
+    @staticmethod
+    async def optimize(conn: aiosqlite.Connection) -> None:
+        """執行 PRAGMA optimize，讓查詢規劃器取得最新的統計資料。"""
+        await conn.execute("PRAGMA optimize")
+
+    def __repr__(self) -> str:
+        return f"SQLiteProfile({self.name!r}, {self.as_dict()!r})"
+
+
+# 預設提供的設定
+PROFILES: Dict[str, SQLiteProfile] = {
+    # SQLite 原始預設值，僅供比較
+    "default": SQLiteProfile(
+        "default", journal_mode="delete", synchronous="full",
+        mmap_size=0, cache_size=-2000, temp_store="default", busy_timeout=5000,
+    ),
+    # WAL + 完整 fsync，斷電時也不會遺失已提交的交易
+    "safe": SQLiteProfile(
+        "safe", journal_mode="wal", synchronous="full",
+        mmap_size=64 * 1024 * 1024, cache_size=-16000, temp_store="memory", busy_timeout=5000,
+    ),
+    # WAL + synchronous=NORMAL：斷電時可能遺失最後幾筆交易，但資料庫不會損毀
+    "balanced": SQLiteProfile(
+        "balanced", journal_mode="wal", synchronous="normal",
+        mmap_size=256 * 1024 * 1024, cache_size=-64000, temp_store="memory", busy_timeout=5000,
+    ),
+    # 不 fsync，只適合可以接受遺失資料的環境
+    "fast": SQLiteProfile(
+        "fast", journal_mode="wal", synchronous="off",
+        mmap_size=1024 * 1024 * 1024, cache_size=-256000, temp_store="memory", busy_timeout=5000,
+    ),
+}
+
+
+def load_profile(cfg: Optional[Mapping[str, Any]] = None) -> SQLiteProfile:
+    """
+    從 config.json 的 "sqlite" 區塊與環境變數讀取連線設定。
+
+    - "profile" / SQLITE_PROFILE: 預設設定名稱 (default / safe / balanced / fast)
+    - 其餘欄位 (journal_mode、synchronous、mmap_size、cache_size、temp_store、
+      busy_timeout、optimize_interval) 可個別覆寫，
+      環境變數為 SQLITE_ 加上大寫欄位名稱，例如 SQLITE_SYNCHRONOUS，優先於 config.json。
+    """
+    section = dict((cfg or {}).get("sqlite", {}))
+    name = os.getenv("SQLITE_PROFILE", section.pop("profile", "balanced"))
+    if name not in PROFILES:
+        raise ValueError(f"未知的 SQLite 設定: {name}")
+
+    overrides: Dict[str, Any] = {}
+    for key in PROFILES[name].as_dict():
+        value = os.getenv(f"SQLITE_{key.upper()}", section.get(key))
+        if value is not None:
+            overrides[key] = value
+    return PROFILES[name].with_overrides(**overrides)
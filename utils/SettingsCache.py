@@ -0,0 +1,114 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+class SettingsCache:
+    """
+    伺服器設定快取。
+
+    以 guild_id 為鍵快取 server_settings 的內容，並快取已解析的日誌頻道物件，
+    讓高頻率的事件處理器 (訊息編輯/刪除、語音狀態、成員事件) 不需要每次都查詢 SQLite。
+
+    失效方式:
+    - DBManager.set_settings 寫入後會通知此快取清除該伺服器 (write-through invalidation)
+    - 頻道被刪除時呼叫 evict_channel 移除已失效的頻道物件
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db_manager = bot.db_manager
+        self._settings: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._channels: Dict[Tuple[int, str], Optional[discord.TextChannel]] = {}
+        # 每次失效遞增，避免載入途中被清除的舊資料寫回快取 (全部清除時遞增 _global_generation)
+        self._generation: Dict[int, int] = {}
+        self._global_generation = 0
+        self._stats = {"lookups": 0, "hits": 0}
+        self.db_manager.add_settings_listener(self.invalidate)
+
+    async def get_settings(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        """
+        取得伺服器設定，未命中時才查詢資料庫。
+        回傳:
+            設定 dict，若伺服器沒有設定則為 None。
+        """
+        if guild_id in self._settings:
+            return self._settings[guild_id]
+
+        generation = self._generation_of(guild_id)
+        row = await self.db_manager.get_settings(guild_id)
+        settings = dict(row) if row else None
+        if self._generation_of(guild_id) == generation:
+            self._settings[guild_id] = settings
+        return settings
+
+    def _generation_of(self, guild_id: int) -> Tuple[int, int]:
+        return self._global_generation, self._generation.get(guild_id, 0)
+
+    async def get_log_channel(self, guild_id: int, log_type: str) -> Optional[discord.TextChannel]:
+        """
+        取得指定類型的日誌頻道。
+        參數:
+            guild_id: 伺服器 ID
+            log_type: server_settings 的欄位名稱，例如 "voice_log_channel"
+        回傳:
+            文字頻道物件，未設定或無法存取時為 None。
+        """
+        key = (guild_id, log_type)
+        self._stats["lookups"] += 1
+        if key in self._channels:
+            self._stats["hits"] += 1
+            return self._channels[key]
+
+        generation = self._generation_of(guild_id)
+        settings = await self.get_settings(guild_id)
+        # 讀取設定途中快取被清除時，結果可能來自舊的設定，只回傳不快取
+        current = self._generation_of(guild_id) == generation
+        channel_id = settings.get(log_type) if settings else None
+        if not channel_id:
+            # 未設定的結果也快取起來，直到設定變更
+            if current:
+                self._channels[key] = None
+            return None
+
+        channel = self.bot.get_channel(channel_id)
+        if not channel or not isinstance(channel, discord.TextChannel):
+            # 頻道可能尚未載入 (例如 on_ready 之前)，不快取，下次再解析
+            return None
+
+        if current:
+            self._channels[key] = channel
+        return channel
+
+    def invalidate(self, guild_id: Optional[int] = None) -> None:
+        """
+        清除快取。
+        參數:
+            guild_id: 要清除的伺服器 ID，None 代表全部清除。
+        """
+        if guild_id is None:
+            self._global_generation += 1
+            self._settings.clear()
+            self._channels.clear()
+            return
+
+        self._generation[guild_id] = self._generation.get(guild_id, 0) + 1
+        self._settings.pop(guild_id, None)
+        for key in [key for key in self._channels if key[0] == guild_id]:
+            del self._channels[key]
+
+    def evict_channel(self, channel_id: int) -> None:
+        """移除已刪除頻道的快取物件，設定本身保留。"""
+        for key, channel in list(self._channels.items()):
+            if channel is not None and channel.id == channel_id:
+                del self._channels[key]
+                log.info(f"日誌頻道 {channel_id} 已被刪除，已從設定快取移除")
+
+    def get_stats(self) -> Dict[str, int]:
+        """日誌頻道的查詢次數、命中次數與快取的伺服器數"""
+        stats = dict(self._stats)
+        stats["guilds"] = len(self._settings)
+        return stats
@@ -113,6 +113,27 @@ def format_seconds(seconds: int) -> str:
 
 
 
+def parse_datetime_string(time_str: str, tz: str = cfg["timezone"]) -> int:
+    """
+    將日期時間字串 (以 tz 時區解讀) 轉換為 UNIX 時間戳。
+    
+    支援格式:
+    - "2025-01-31 21:30:00"
+    - "2025-01-31 21:30"
+    - "2025-01-31" (當天 00:00)
+    
+    Raises:
+        ValueError: 如果格式無效
+    """
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            dt = datetime.strptime(time_str.strip(), fmt)
+        except ValueError:
+            continue
+        return int(dt.replace(tzinfo=ZoneInfo(tz)).timestamp())
+    raise ValueError(f"無效的日期時間格式: {time_str}")
+
+
 def date_format(unix_time):
     """ 將unix時間轉為 Y-m-d H:M:S 的形式 """
     return datetime.fromtimestamp(unix_time, ZoneInfo(cfg["timezone"])).strftime("%Y-%m-%d %H:%M:%S")
\ No newline at end of file
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import discord
+
+log = logging.getLogger(__name__)
+
+
+class WebhookDelivery:
+    """
+    以 webhook 發送日誌訊息。
+
+    機器人以一般訊息發送日誌時，與同一頻道中指令回覆的訊息共用速率限制；
+    webhook 有自己的速率限制，大量日誌不會拖慢 /ban、/mute 等指令的回覆。
+    - 每個日誌頻道第一次發送時建立 (或沿用先前建立的) webhook 並快取
+    - 所有 webhook 請求共用一個 aiohttp 連線池
+    - 沒有管理 webhook 的權限、頻道不支援 webhook 或 webhook 失效時，改用一般訊息發送，
+      retry_after 秒後才再次嘗試建立 webhook
+    """
+
+    def __init__(self, bot, *, name: str = "日誌", retry_after: float = 600.0, pool_size: int = 10):
+        """
+        參數:
+            bot: 機器人，用於取得名稱與頭像
+            name: 建立的 webhook 名稱，也用來辨識先前由機器人建立的 webhook
+            retry_after: 無法使用 webhook 的頻道，多久之後再重新嘗試 (秒)
+            pool_size: aiohttp 連線池的連線數上限
+        """
+        self.bot = bot
+        self.name = name
+        self.retry_after = retry_after
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._webhooks: Dict[int, discord.Webhook] = {}
+        # 頻道 ID -> 可以再次嘗試建立 webhook 的時間
+        self._unavailable: Dict[int, float] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._stats = {"webhook_sends": 0, "fallback_sends": 0, "webhooks_created": 0, "webhook_errors": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+        return self._session
+
+    async def _get_webhook(self, channel: discord.abc.Messageable) -> Optional[discord.Webhook]:
+        """取得頻道的 webhook，無法使用時回傳 None"""
+        webhook = self._webhooks.get(channel.id)
+        if webhook is not None:
+            return webhook
+        if not isinstance(channel, (discord.TextChannel, discord.VoiceChannel, discord.StageChannel)):
+            return None
+        if time.monotonic() < self._unavailable.get(channel.id, 0.0):
+            return None
+
+        # 同一頻道同時只建立一次
+        async with self._locks.setdefault(channel.id, asyncio.Lock()):
+            webhook = self._webhooks.get(channel.id)
+            if webhook is not None:
+                return webhook
+            try:
+                existing = None
+                for hook in await channel.webhooks():
+                    if hook.name == self.name and hook.token and hook.user and hook.user.id == self.bot.user.id:
+                        existing = hook
+                        break
+                if existing is None:
+                    existing = await channel.create_webhook(name=self.name, reason="日誌訊息發送")
+                    self._stats["webhooks_created"] += 1
+            except (discord.Forbidden, discord.HTTPException) as e:
+                log.warning(f"無法在頻道 {channel.id} 使用 webhook，改用一般訊息發送: {e}")
+                self._unavailable[channel.id] = time.monotonic() + self.retry_after
+                return None
+            webhook = discord.Webhook.partial(existing.id, existing.token, session=self._get_session())
+            self._webhooks[channel.id] = webhook
+            return webhook
+
+    async def send(
+        self,
+        channel: discord.abc.Messageable,
+        *,
+        content: Optional[str] = None,
+        embeds: Optional[List[discord.Embed]] = None,
+        file: Optional[discord.File] = None,
+    ) -> None:
+        """經由 webhook 發送訊息 (一次最多 10 個 embed)，無法使用 webhook 時以一般訊息發送"""
+        kwargs: Dict[str, Any] = {"embeds": embeds or []}
+        if content is not None:
+            kwargs["content"] = content
+        if file is not None:
+            kwargs["file"] = file
+
+        webhook = await self._get_webhook(channel)
+        if webhook is not None:
+            user = self.bot.user
+            try:
+                await webhook.send(
+                    username=user.display_name if user else None,
+                    avatar_url=user.display_avatar.url if user else None,
+                    allowed_mentions=discord.AllowedMentions.none(),
+                    **kwargs,
+                )
+                self._stats["webhook_sends"] += 1
+                return
+            except (discord.NotFound, discord.Forbidden) as e:
+                # webhook 被刪除或 token 失效，下次重新建立
+                self._stats["webhook_errors"] += 1
+                self._webhooks.pop(channel.id, None)
+                log.warning(f"頻道 {channel.id} 的 webhook 已失效，改用一般訊息發送: {e}")
+                if file is not None:
+                    file.reset()
+            except discord.HTTPException as e:
+                # 伺服器錯誤、webhook 的速率限制或請求內容 (名稱、頭像) 被拒絕，這次改用一般訊息，webhook 保留
+                self._stats["webhook_errors"] += 1
+                log.warning(f"經由 webhook 發送到頻道 {channel.id} 失敗 ({e.status})，改用一般訊息發送: {e}")
+                if file is not None:
+                    file.reset()
+
+        await channel.send(**kwargs)
+        self._stats["fallback_sends"] += 1
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """webhook 發送、改用一般訊息發送、建立 webhook 與 webhook 失效的次數"""
+        stats = dict(self._stats)
+        stats["webhooks"] = len(self._webhooks)
+        return stats